@@ -3,7 +3,7 @@ from django.contrib.admin import SimpleListFilter
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 
-from blogging.models import Post, PostInteraction, Followers
+from blogging.models import Post, PostInteraction, Followers, UserStats, ArchivedPost
 
 admin.site.unregister(User)
 
@@ -13,14 +13,22 @@ class UserAdmin(admin.ModelAdmin):
     list_display = ('id', 'username', 'email', 'first_name', 'last_name', 'followers',
                     'following', 'is_staff')
     list_filter = ('is_staff', 'is_superuser', 'is_active')
+    list_select_related = ('stats',)
 
     @classmethod
     def followers(cls, obj):
-        return obj.followers.filter(is_active=True).count()
+        return UserStats.get_count(obj, 'followers_count')
 
     @classmethod
     def following(cls, obj):
-        return obj.following.filter(is_active=True).count()
+        return UserStats.get_count(obj, 'following_count')
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'followers_count', 'following_count')
+    raw_id_fields = ('user',)
+    readonly_fields = ('followers_count', 'following_count')
 
 
 @admin.register(Followers)
@@ -51,11 +59,34 @@ class PostAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'headline', 'parent', 'is_active', 'is_deleted', 'created_at',
                     'updated_at')
     raw_id_fields = ('parent',)
-    readonly_fields = ('slug',)
+    readonly_fields = ('slug', 'likes_count', 'shares_count', 'reposts_count', 'comments_count')
     list_filter = (PostCommentFilter, 'is_active')
+    search_fields = ('headline', 'body')
+
+    def get_search_results(self, request, queryset, search_term):
+        # matched through the full-text index rather than LIKE scans of headline and body
+        if not search_term.strip():
+            return queryset, False
+        return queryset.search(search_term), False
 
 
 @admin.register(PostInteraction)
 class PostInteractionAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'post', 'activity', 'created_at')
     list_filter = ('activity',)
+
+
+@admin.register(ArchivedPost)
+class ArchivedPostAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'headline', 'parent', 'is_deleted', 'created_at', 'archived_at')
+    list_filter = ('is_deleted',)
+
+    # archived threads are moved by `manage.py archive_posts` only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
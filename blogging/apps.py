@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BloggingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blogging'
+
+    def ready(self):
+        import blogging.signals  # noqa: F401
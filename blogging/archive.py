@@ -0,0 +1,125 @@
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import DateTimeField, Exists, OuterRef, Q, Value
+from django.utils import timezone
+
+from blogging.models import Post, PostInteraction, ArchivedPost, ArchivedPostInteraction, \
+    posts_archived
+
+
+class PostArchive:
+    """
+    Moves cold threads out of the posts and interactions tables, keeping them (and their indexes)
+    small: a thread (top-level post with all its comments and their interactions) is archived
+    once soft-deleted, or when nothing in it was created or updated since the cutoff. Whole
+    threads move together so comment counters and parent / root references stay consistent.
+
+    Rows are copied with INSERT ... SELECT and removed with plain DELETEs (no model signals),
+    posts_archived being sent instead to sync the caches and timelines.
+    """
+    @staticmethod
+    def get_thread_ids(cutoff, after_id=0, limit=None):
+        """
+        returns the ids of the top-level posts above after_id whose threads are to be archived
+        """
+        recent_comments = Post.objects.filter(root_id=OuterRef('pk'), created_at__gte=cutoff)
+        recent_interactions = PostInteraction.objects.filter(
+            Q(post_id=OuterRef('pk')) | Q(post__root_id=OuterRef('pk')), created_at__gte=cutoff
+        )
+        cold = Q(updated_at__lt=cutoff) & ~Exists(recent_comments) & ~Exists(recent_interactions)
+        threads = Post.objects.filter(Q(is_deleted=True) | cold, parent__isnull=True,
+                                      pk__gt=after_id).order_by('pk').values_list('pk', flat=True)
+        return list(threads[:limit] if limit else threads)
+
+    @staticmethod
+    def get_threads(thread_ids):
+        return Post.objects.filter(Q(pk__in=thread_ids) | Q(root_id__in=thread_ids)).order_by()
+
+    @staticmethod
+    def get_interactions(thread_ids):
+        return PostInteraction.objects.filter(
+            Q(post_id__in=thread_ids) | Q(post__root_id__in=thread_ids)
+        ).order_by()
+
+    @staticmethod
+    def copy(queryset, archive_model, archived_at):
+        """
+        inserts the rows of queryset into the table of archive_model, returns the number of rows
+        """
+        fields = [field for field in archive_model._meta.concrete_fields
+                  if field.name != 'archived_at']
+        sql, params = queryset.annotate(
+            archived_at=Value(archived_at, output_field=DateTimeField())
+        ).values_list(*[field.attname for field in fields], 'archived_at').query.sql_with_params()
+
+        columns = ', '.join(connection.ops.quote_name(field.column)
+                            for field in [*fields, archive_model._meta.get_field('archived_at')])
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {connection.ops.quote_name(archive_model._meta.db_table)} "
+                           f"({columns}) {sql}", params)
+            return cursor.rowcount
+
+    @staticmethod
+    def delete(queryset):
+        """
+        deletes the rows of queryset with one DELETE, skipping model signals and cascades
+        """
+        meta = queryset.model._meta
+        sql, params = queryset.values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(meta.db_table)} WHERE "
+                           f"{connection.ops.quote_name(meta.pk.column)} IN ({sql})", params)
+            return cursor.rowcount
+
+    @staticmethod
+    def get_partition_bounds(month):
+        """
+        returns (name suffix, start, end) of the monthly partition of month (UTC)
+        """
+        end = (month + timedelta(days=32)).replace(day=1)
+        return f"y{month.year:04d}m{month.month:02d}", month, end
+
+    @classmethod
+    def ensure_partitions(cls, interactions):
+        """
+        creates the monthly partitions (postgres) of archived interactions the interactions of
+        the queryset fall into
+        """
+        if connection.vendor != 'postgresql':
+            return
+
+        quote_name, table = connection.ops.quote_name, ArchivedPostInteraction._meta.db_table
+        months = interactions.datetimes('created_at', 'month', tzinfo=dt_timezone.utc)
+        with connection.cursor() as cursor:
+            for month in months:
+                # partition bounds can't be bound parameters
+                suffix, start, end = cls.get_partition_bounds(month)
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {quote_name(f'{table}_{suffix}')} PARTITION OF "
+                    f"{quote_name(table)} FOR VALUES FROM ('{start.isoformat()}') "
+                    f"TO ('{end.isoformat()}')"
+                )
+
+    @classmethod
+    def archive(cls, thread_ids):
+        """
+        moves the threads of the top-level posts thread_ids to the archive tables, returns
+        (posts count, interactions count)
+        """
+        archived_at = timezone.now()
+        with transaction.atomic():
+            # locked, so no interaction or comment is added to the threads while they move
+            posts = list(cls.get_threads(thread_ids).select_for_update()
+                         .only('pk', 'user_id', 'parent_id', 'root_id', 'is_active', 'is_deleted'))
+            if not posts:
+                return 0, 0
+
+            interactions = cls.get_interactions(thread_ids)
+            cls.ensure_partitions(interactions)
+            cls.copy(cls.get_threads(thread_ids), ArchivedPost, archived_at)
+            interactions_count = cls.copy(interactions, ArchivedPostInteraction, archived_at)
+            cls.delete(interactions)
+            cls.delete(cls.get_threads(thread_ids))
+            posts_archived.send(sender=Post, posts=posts)
+        return len(posts), interactions_count
@@ -0,0 +1,117 @@
+import json
+import uuid
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+
+from blogging.models import PostInteraction
+from core.redis_helper import RedisInterface, AsyncRedisInterface
+
+
+class ActivityBuffer:
+    """
+    Write-behind buffer of post interactions (redis list).
+
+    Requests append interactions to the buffer and are acknowledged right away; workers
+    (`manage.py flush_activity_buffer`) move batches from the buffer to their own processing list,
+    insert them with PostInteraction.objects.ingest() and only then drop them from the processing
+    list. A worker that crashes picks its processing list up again when restarted, so every
+    interaction is delivered at least once, and the request id stored on each interaction makes
+    redeliveries no-ops.
+    """
+    BUFFER_KEY = 'activity:buffer'
+
+    @staticmethod
+    def get_processing_key(worker_id):
+        return f"activity:processing:{worker_id}"
+
+    @staticmethod
+    def get_messages(user_id, candidates):
+        return [
+            {'id': uuid.uuid4().hex, 'user': user_id, 'post': post_id, 'activity': activity}
+            for _, post_id, activity in candidates
+        ]
+
+    @classmethod
+    def push(cls, user_id, candidates):
+        """
+        buffers well-formed (index, post id, activity) interactions of user, returns their
+        request ids
+        """
+        messages = cls.get_messages(user_id, candidates)
+        RedisInterface.push_to_list(cls.BUFFER_KEY, *(json.dumps(message) for message in messages))
+        return [message['id'] for message in messages]
+
+    @classmethod
+    async def apush(cls, user_id, candidates):
+        messages = cls.get_messages(user_id, candidates)
+        await AsyncRedisInterface.push_to_list(cls.BUFFER_KEY,
+                                               *(json.dumps(message) for message in messages))
+        return [message['id'] for message in messages]
+
+    @classmethod
+    def get_size(cls):
+        return RedisInterface.get_list_length(cls.BUFFER_KEY)
+
+    @classmethod
+    def claim(cls, worker_id, count):
+        """
+        returns the messages left unacknowledged in worker's processing list by a previous run,
+        or moves the next `count` messages from the buffer to it
+        """
+        processing_key = cls.get_processing_key(worker_id)
+        values = RedisInterface.get_list_vals(processing_key, count) or \
+            RedisInterface.move_list_vals(cls.BUFFER_KEY, processing_key, count)
+        return [json.loads(value) for value in values]
+
+    @classmethod
+    def ack(cls, worker_id, count):
+        RedisInterface.trim_list(cls.get_processing_key(worker_id), count)
+
+    @classmethod
+    def flush(cls, worker_id, batch_size):
+        """
+        writes one batch of buffered interactions to the database,
+        returns (messages processed, interactions created, {request id: errors} of rejected ones)
+        """
+        messages = cls.claim(worker_id, batch_size)
+        claimed = len(messages)
+        if not claimed:
+            return 0, 0, {}
+
+        # drop messages delivered more than once, within the batch and across batches
+        messages = list({message['id']: message for message in messages}.values())
+        written = {request_id.hex for request_id in PostInteraction.objects.filter(
+            request_id__in=[message['id'] for message in messages]
+        ).values_list('request_id', flat=True)}
+
+        by_user = {}
+        for message in messages:
+            if message['id'] not in written:
+                by_user.setdefault(message['user'], []).append(message)
+
+        users = set(User.objects.filter(pk__in=list(by_user)).values_list('pk', flat=True))
+        created_count, rejected = 0, {}
+        for user_id, user_messages in by_user.items():
+            if user_id not in users:
+                rejected.update({message['id']: {'user': [f'Invalid pk "{user_id}" - object does '
+                                                          f'not exist.']}
+                                 for message in user_messages})
+                continue
+
+            try:
+                created, errors = PostInteraction.objects.ingest(
+                    user_id, user_messages,
+                    request_ids=[message['id'] for message in user_messages]
+                )
+            except IntegrityError:
+                # another worker wrote some of these meanwhile, the batch is retried (and
+                # deduplicated) on the next flush as it's still unacknowledged
+                return 0, created_count, rejected
+
+            created_count += len(created)
+            rejected.update({user_messages[index]['id']: item_errors
+                             for index, item_errors in errors.items()})
+
+        cls.ack(worker_id, claimed)
+        return claimed, created_count, rejected
@@ -0,0 +1,276 @@
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+
+from blogging.codecs import PayloadCodec
+from blogging.constants import POST_CACHE_TTL, TIMELINE_TTL, TIMELINE_STORE_TTL, \
+    RESPONSE_CACHE_TTL
+from core.db_router import ReplicaRouter
+from core.redis_helper import RedisInterface, AsyncRedisInterface
+
+
+def new_version():
+    """
+    version stamps are the time (ns) of the change, so they also serve as Last-Modified dates
+    """
+    return time.time_ns()
+
+
+class PostCache:
+    """
+    Serialized post payloads, cached per post (in the compact PayloadCodec encoding, stored as
+    raw bytes) and dropped whenever the post or its counters change
+    """
+    codec = None
+    LIST_VERSION_KEY = 'post:list:version'
+
+    @staticmethod
+    def get_key(post_id):
+        return f"post:{post_id}"
+
+    @classmethod
+    def get_codec(cls):
+        if cls.codec is None:
+            # imported here as the serializers module itself reads posts through this cache
+            from blogging.serializers import PostSerializer
+            cls.codec = PayloadCodec(PostSerializer.Meta.fields)
+        return cls.codec
+
+    @classmethod
+    def get_many(cls, post_ids):
+        """
+        returns {post_id: payload} for the cached posts among post_ids
+        """
+        cached = RedisInterface.get_redis_vals([cls.get_key(post_id) for post_id in post_ids],
+                                               raw=True)
+        return {payload['id']: payload for payload in cls.get_codec().decode_many(cached.values())}
+
+    @classmethod
+    async def aget_many(cls, post_ids):
+        cached = await AsyncRedisInterface.get_redis_vals([cls.get_key(post_id)
+                                                          for post_id in post_ids], raw=True)
+        return {payload['id']: payload for payload in cls.get_codec().decode_many(cached.values())}
+
+    @classmethod
+    def set_many(cls, payloads):
+        if ReplicaRouter.reads_from_replica():
+            # a replica may not have replayed the latest changes of posts yet
+            versions = cls.get_versions([payload['id'] for payload in payloads])
+            payloads = [payload for payload in payloads
+                        if ReplicaRouter.may_cache(versions[payload['id']] / 10 ** 9)]
+        codec = cls.get_codec()
+        RedisInterface.set_redis_vals(
+            {cls.get_key(payload['id']): codec.encode([payload]) for payload in payloads},
+            ttl=POST_CACHE_TTL, raw=True
+        )
+
+    @staticmethod
+    def get_version_key(post_id):
+        return f"post:{post_id}:version"
+
+    @classmethod
+    def get_versions(cls, post_ids):
+        """
+        returns {post_id: version stamp} of posts, the stamp changing whenever the post's payload
+        changes. Missing (expired) stamps are set to a new one.
+        """
+        versions = RedisInterface.get_redis_vals([cls.get_version_key(post_id)
+                                                  for post_id in post_ids])
+        return cls.complete_versions(post_ids, versions)
+
+    @classmethod
+    async def aget_versions(cls, post_ids):
+        versions = await AsyncRedisInterface.get_redis_vals([cls.get_version_key(post_id)
+                                                            for post_id in post_ids])
+        if len(versions) < len(set(post_ids)):
+            return await sync_to_async(cls.complete_versions)(post_ids, versions)
+        return cls.complete_versions(post_ids, versions)
+
+    @classmethod
+    def complete_versions(cls, post_ids, versions):
+        result = {}
+        for post_id in post_ids:
+            key = cls.get_version_key(post_id)
+            if key not in versions:
+                RedisInterface.add_redis_val(key, new_version(), ttl=POST_CACHE_TTL)
+                versions[key] = RedisInterface.get_redis_val(key)
+            result[post_id] = versions[key]
+        return result
+
+    @classmethod
+    def get_list_version(cls):
+        """
+        version stamp of the post list, changing whenever any post's payload changes
+        """
+        version = RedisInterface.get_redis_val(cls.LIST_VERSION_KEY)
+        if version is None:
+            RedisInterface.add_redis_val(cls.LIST_VERSION_KEY, new_version(), ttl=POST_CACHE_TTL)
+            version = RedisInterface.get_redis_val(cls.LIST_VERSION_KEY)
+        return version
+
+    @classmethod
+    def invalidate(cls, *post_ids):
+        post_ids = [post_id for post_id in post_ids if post_id]
+        RedisInterface.delete_redis_keys([cls.get_key(post_id) for post_id in post_ids])
+
+        version = new_version()
+        RedisInterface.set_redis_vals(
+            {cls.LIST_VERSION_KEY: version,
+             **{cls.get_version_key(post_id): version for post_id in post_ids}},
+            ttl=POST_CACHE_TTL
+        )
+
+
+class TimelineCache:
+    """
+    Cached timeline pages (post ids and cursor links) of a user.
+
+    Page keys embed the user's timeline version, which is bumped whenever the user's stored
+    timeline changes, so stale pages are never read again. Pages that merged in posts of
+    fan-out-on-read authors also record those authors' versions, and are discarded once any of
+    them changes.
+    """
+    @staticmethod
+    def get_version_key(user_id):
+        return f"timeline:{user_id}:version"
+
+    @staticmethod
+    def get_author_version_key(author_id):
+        return f"timeline:author:{author_id}:version"
+
+    @classmethod
+    def get_version(cls, user_id):
+        key = cls.get_version_key(user_id)
+        version = RedisInterface.get_redis_val(key)
+        if version is None:
+            RedisInterface.add_redis_val(key, new_version(), ttl=TIMELINE_STORE_TTL)
+            version = RedisInterface.get_redis_val(key)
+        return version
+
+    @classmethod
+    def bump(cls, user_ids):
+        version = new_version()
+        RedisInterface.set_redis_vals(
+            {cls.get_version_key(user_id): version for user_id in user_ids}, ttl=TIMELINE_STORE_TTL
+        )
+
+    @classmethod
+    def bump_author(cls, author_id):
+        RedisInterface.set_redis_val(cls.get_author_version_key(author_id), new_version(),
+                                     ttl=TIMELINE_STORE_TTL)
+
+    @classmethod
+    def get_author_versions(cls, author_ids):
+        versions = RedisInterface.get_redis_vals(
+            [cls.get_author_version_key(author_id) for author_id in author_ids]
+        )
+        return {author_id: versions.get(cls.get_author_version_key(author_id))
+                for author_id in author_ids}
+
+    @classmethod
+    async def aget_author_versions(cls, author_ids):
+        versions = await AsyncRedisInterface.get_redis_vals(
+            [cls.get_author_version_key(author_id) for author_id in author_ids]
+        )
+        return {author_id: versions.get(cls.get_author_version_key(author_id))
+                for author_id in author_ids}
+
+    @classmethod
+    def get_page_key(cls, user_id, page, version=None):
+        version = cls.get_version(user_id) if version is None else version
+        return f"timeline:{user_id}:v{version}:page:{page}"
+
+    @classmethod
+    async def aget_page(cls, user_id, page):
+        """
+        returns the cached page of user if it's fresh, None when it's missing or expired (for
+        get_or_build_page() to rebuild it). Authors' versions aren't checked, see is_current().
+        """
+        version = await AsyncRedisInterface.get_redis_val(cls.get_version_key(user_id))
+        if version is None:
+            return None
+
+        entry = await AsyncRedisInterface.get_redis_val(cls.get_page_key(user_id, page, version))
+        if entry is None or entry[2] <= time.time():
+            return None
+        return entry[0]
+
+    @classmethod
+    async def ais_current(cls, page):
+        """
+        whether the fan-out-on-read authors merged into page haven't posted since it was cached
+        """
+        authors = page['authors']
+        return not authors or await cls.aget_author_versions(list(authors)) == authors
+
+    @staticmethod
+    def get_stamp(user, page_cache_key, page, version, post_versions):
+        """
+        returns (ETag, Last-Modified timestamp) of a timeline page response, derived from the
+        version stamps of the timeline, of the authors merged in and of the posts on the page
+        """
+        versions = [stamp for stamp in (version, *page['authors'].values(),
+                                        *post_versions.values()) if stamp is not None]
+        etag = ResponseCache.get_etag(
+            user.id, user.username, user.email, user.first_name, user.last_name, page_cache_key,
+            *versions, *post_versions
+        )
+        return etag, max(versions) // 10 ** 9
+
+    @classmethod
+    def get_page_stamp(cls, user, page_cache_key, page):
+        return cls.get_stamp(user, page_cache_key, page, cls.get_version(user.id),
+                             PostCache.get_versions(page['post_ids']))
+
+    @classmethod
+    async def aget_page_stamp(cls, user, page_cache_key, page):
+        version = await AsyncRedisInterface.get_redis_val(cls.get_version_key(user.id))
+        if version is None:
+            version = await sync_to_async(cls.get_version)(user.id)
+        return cls.get_stamp(user, page_cache_key, page, version,
+                             await PostCache.aget_versions(page['post_ids']))
+
+    @classmethod
+    def get_or_build_page(cls, page_key, build, refresh=False):
+        """
+        returns the cached page at page_key, building it with build() -> (post_ids, authors,
+        links) when missing, stale or forced with refresh. Concurrent misses of the same page only
+        build it once.
+        """
+        def compute():
+            post_ids, authors, links = build()
+            return {'post_ids': post_ids, 'authors': cls.get_author_versions(authors), **links}
+
+        page = RedisInterface.get_or_compute(page_key, compute, ttl=TIMELINE_TTL, refresh=refresh)
+
+        authors = page['authors']
+        if authors and not refresh and cls.get_author_versions(list(authors)) != authors:
+            page = RedisInterface.get_or_compute(page_key, compute, ttl=TIMELINE_TTL, refresh=True)
+        return page
+
+
+class ResponseCache:
+    """
+    Pre-rendered JSON bodies of GET responses, keyed by their ETag. ETags are digests of the
+    version stamps of everything in the response, so a cached body is never stale.
+    """
+    @staticmethod
+    def get_etag(*parts):
+        return '"{}"'.format(hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest())
+
+    @staticmethod
+    def get_key(etag):
+        return f"response:{etag[1:-1]}"
+
+    @classmethod
+    def get_body(cls, etag):
+        return RedisInterface.get_redis_val(cls.get_key(etag))
+
+    @classmethod
+    async def aget_body(cls, etag):
+        return await AsyncRedisInterface.get_redis_val(cls.get_key(etag))
+
+    @classmethod
+    def set_body(cls, etag, body):
+        RedisInterface.set_redis_val(cls.get_key(etag), body, ttl=RESPONSE_CACHE_TTL)
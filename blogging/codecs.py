@@ -0,0 +1,85 @@
+import json
+import struct
+import zlib
+from itertools import repeat
+
+FORMAT_VERSION = 1
+COMPRESSION_THRESHOLD = 1024      # bytes, encoded rows larger than this are zlib compressed
+FLAG_COMPRESSED = 0x01
+
+
+class PayloadCodec:
+    """
+    Compact cache encoding of serialized rows sharing a fixed list of fields.
+
+    Encoded values are a header (format version, flags, crc32 of the field names) followed by a
+    JSON array of rows, each row being the list of its values in field order, so field names are
+    never stored. Bodies above COMPRESSION_THRESHOLD bytes are zlib compressed.
+    Values written with another format version or another field list decode to None, so a change
+    of either across a deploy is read as a cache miss.
+
+    Encoded values are meant to be cached as is (RedisInterface raw=True), not pickled again, and
+    a batch of them decoded at once with decode_many().
+    """
+    header = struct.Struct('!BBI')
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.schema = zlib.crc32(','.join(self.fields).encode())
+        # headers of the values decode_many() accepts, uncompressed and compressed
+        self.prefixes = (self.header.pack(FORMAT_VERSION, 0, self.schema),
+                         self.header.pack(FORMAT_VERSION, FLAG_COMPRESSED, self.schema))
+
+    def encode(self, rows):
+        body = json.dumps([[row[field] for field in self.fields] for row in rows],
+                          separators=(',', ':'), ensure_ascii=False).encode()
+        flags = 0
+        if len(body) > COMPRESSION_THRESHOLD:
+            body = zlib.compress(body, 1)
+            flags |= FLAG_COMPRESSED
+        return self.header.pack(FORMAT_VERSION, flags, self.schema) + body
+
+    def get_body(self, data):
+        """
+        returns the JSON array of rows of an encoded value, None if it's not one of this codec
+        """
+        if not isinstance(data, bytes) or len(data) < self.header.size:
+            return None
+
+        version, flags, schema = self.header.unpack_from(data)
+        if version != FORMAT_VERSION or schema != self.schema:
+            return None
+
+        body = data[self.header.size:]
+        return zlib.decompress(body) if flags & FLAG_COMPRESSED else body
+
+    def decode(self, data):
+        body = self.get_body(data)
+        if body is None:
+            return None
+        return [dict(zip(self.fields, values)) for values in json.loads(body)]
+
+    def decode_many(self, values):
+        """
+        returns the rows of all the encoded values (values of another codec are skipped), parsing
+        their bodies as one JSON array
+        """
+        size, plain, compressed = self.header.size, self.prefixes[0], self.prefixes[1]
+        bodies = []
+        for data in values:
+            if not isinstance(data, bytes):
+                continue
+            prefix = data[:size]
+            if prefix == plain:
+                body = data[size + 1:-1]
+            elif prefix == compressed:
+                body = zlib.decompress(data[size:])[1:-1]
+            else:
+                continue
+            if body:
+                bodies.append(body)
+
+        if not bodies:
+            return []
+        return list(map(dict, map(zip, repeat(self.fields),
+                                  json.loads(b'[' + b','.join(bodies) + b']'))))
@@ -1 +1,26 @@
-TIMELINE_TTL = 60                 # 1 minute
+TIMELINE_TTL = 60 * 60 * 6        # 6 hours, cached pages are invalidated when their posts change
+POST_CACHE_TTL = 60 * 60 * 6      # 6 hours, cached post payloads are invalidated on change
+RESPONSE_CACHE_TTL = 60 * 10      # 10 minutes, pre-rendered bodies are keyed by their ETag
+
+TIMELINE_PAGE_SIZE = 50           # default number of posts per timeline page
+TIMELINE_MAX_PAGE_SIZE = 100      # upper bound for the `page_size` query param
+TIMELINE_MAX_LENGTH = 800         # post ids kept in each user's timeline store
+TIMELINE_STORE_TTL = 60 * 60 * 24 * 7     # 1 week, idle timelines get rebuilt on next read
+FANOUT_FOLLOWER_LIMIT = 10000     # authors above this are merged into timelines at read time
+FOLLOW_BATCH_MAX_SIZE = 100       # users accepted per /api/follow/bulk/ request
+FOLLOW_GRAPH_TTL = 60 * 60 * 24   # 1 day, idle adjacency sets get reloaded on next read
+INTERACTION_BATCH_MAX_SIZE = 500  # interactions accepted per /api/activity/batch/ request
+THREAD_PAGE_SIZE = 10             # default number of replies listed per comment thread level
+THREAD_MAX_PAGE_SIZE = 100        # upper bound for the `page_size` query param of threads
+THREAD_MAX_DEPTH = 10             # deepest reply level returned by /api/posts/{id}/thread/
+SEARCH_PAGE_SIZE = 20             # default number of results per /api/posts/search/ page
+SEARCH_MAX_PAGE_SIZE = 100        # upper bound for the `page_size` query param of search
+TRENDING_WINDOWS = {'1h': 60 * 60, '6h': 60 * 60 * 6, '24h': 60 * 60 * 24}
+TRENDING_DEFAULT_WINDOW = '6h'
+TRENDING_BUCKET_SIZE = 60 * 5     # 5 minutes, granularity of the trending windows
+TRENDING_REFRESH_INTERVAL = 60    # seconds a materialized trending ranking is served for
+TRENDING_MAX_LENGTH = 1000        # posts kept in each trending ranking
+TRENDING_PAGE_SIZE = 20           # default number of posts per /api/trending/ page
+TRENDING_MAX_PAGE_SIZE = 100      # upper bound for the `page_size` query param of trending
+ARCHIVE_AFTER_DAYS = 365          # threads without activity for this long are moved to the archive
+ARCHIVE_BATCH_SIZE = 500          # threads archived per transaction by `manage.py archive_posts`
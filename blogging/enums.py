@@ -32,3 +32,8 @@ class Interaction(BaseEnum):
     like = "Like"
     share = "Share"
     repost = "Repost"
+
+
+class ThreadOrdering(BaseEnum):
+    recent = "Recent"
+    likes = "Likes"
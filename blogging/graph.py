@@ -0,0 +1,139 @@
+from blogging.constants import FOLLOW_GRAPH_TTL, FANOUT_FOLLOWER_LIMIT
+from blogging.models import Followers, UserStats
+from core.redis_helper import RedisInterface
+
+
+class FollowGraph:
+    """
+    Follow graph adjacency sets (redis sets of user ids), loaded from Followers on first use and
+    patched as follows are activated / deactivated.
+
+    Loaded sets hold the LOADED member (no user has id 0), so an expired set, or one recreated by a
+    patch racing with its expiry, reads as not loaded and is reloaded from the database.
+    Followers of authors above FANOUT_FOLLOWER_LIMIT aren't kept in redis, they are read from the
+    (user, is_active, following_user) index instead.
+    """
+    LOADED = 0
+
+    @staticmethod
+    def get_following_key(user_id):
+        return f"follow-graph:{user_id}:following"
+
+    @staticmethod
+    def get_followers_key(user_id):
+        return f"follow-graph:{user_id}:followers"
+
+    @staticmethod
+    def get_following_ids(user_id):
+        return Followers.objects.filter(following_user_id=user_id, is_active=True) \
+            .values_list('user_id', flat=True)
+
+    @staticmethod
+    def get_follower_ids(user_id):
+        return Followers.objects.filter(user_id=user_id, is_active=True) \
+            .values_list('following_user_id', flat=True)
+
+    @staticmethod
+    def is_big(user_id):
+        return UserStats.objects.filter(pk=user_id,
+                                        followers_count__gt=FANOUT_FOLLOWER_LIMIT).exists()
+
+    @classmethod
+    def load(cls, key, user_ids):
+        user_ids = set(user_ids)
+        RedisInterface.replace_set(key, [cls.LOADED, *user_ids], ttl=FOLLOW_GRAPH_TTL)
+        return user_ids
+
+    @classmethod
+    def get_members(cls, key, user_ids):
+        members = {int(member) for member in RedisInterface.get_set_members(key)}
+        if cls.LOADED not in members:
+            return cls.load(key, user_ids)
+
+        return members - {cls.LOADED}
+
+    @classmethod
+    def get_following(cls, user_id):
+        """
+        returns ids of the users followed by user
+        """
+        return cls.get_members(cls.get_following_key(user_id), cls.get_following_ids(user_id))
+
+    @classmethod
+    def get_followers(cls, user_id):
+        """
+        returns ids of the users following user
+        """
+        if cls.is_big(user_id):
+            return set(cls.get_follower_ids(user_id))
+
+        return cls.get_members(cls.get_followers_key(user_id), cls.get_follower_ids(user_id))
+
+    @classmethod
+    def is_following(cls, user_id, author_id):
+        key = cls.get_following_key(user_id)
+        loaded, following = RedisInterface.are_set_members(key, cls.LOADED, author_id)
+        if not loaded:
+            return author_id in cls.load(key, cls.get_following_ids(user_id))
+
+        return following
+
+    @classmethod
+    def is_mutual(cls, user_id, other_user_id):
+        return cls.is_following(user_id, other_user_id) and \
+            cls.is_following(other_user_id, user_id)
+
+    @classmethod
+    def get_mutual(cls, user_id):
+        """
+        returns ids of the users both following and followed by user
+        """
+        if cls.is_big(user_id):
+            return set(cls.get_follower_ids(user_id).filter(
+                following_user_id__in=list(cls.get_following(user_id))
+            ))
+
+        members = {int(member) for member in RedisInterface.get_sets_intersection(
+            cls.get_following_key(user_id), cls.get_followers_key(user_id)
+        )}
+        if cls.LOADED not in members:
+            return cls.get_following(user_id) & cls.get_followers(user_id)
+
+        return members - {cls.LOADED}
+
+    @classmethod
+    def iter_followers(cls, user_id, chunk_size=1000):
+        """
+        yields ids of the users following user in chunks of about chunk_size ids, an id may be
+        repeated if the followers change meanwhile
+        """
+        if cls.is_big(user_id):
+            last_id = 0
+            while True:
+                chunk = list(cls.get_follower_ids(user_id).filter(following_user_id__gt=last_id)
+                             .order_by('following_user_id')[:chunk_size])
+                if not chunk:
+                    return
+                yield chunk
+                last_id = chunk[-1]
+
+        key = cls.get_followers_key(user_id)
+        if not RedisInterface.are_set_members(key, cls.LOADED)[0]:
+            cls.load(key, cls.get_follower_ids(user_id))
+
+        for members in RedisInterface.scan_set(key, chunk_size):
+            chunk = [int(member) for member in members if int(member) != cls.LOADED]
+            if chunk:
+                yield chunk
+
+    @classmethod
+    def follow(cls, user_id, author_id):
+        RedisInterface.add_to_set(cls.get_following_key(user_id), author_id, ttl=FOLLOW_GRAPH_TTL)
+        if not cls.is_big(author_id):
+            RedisInterface.add_to_set(cls.get_followers_key(author_id), user_id,
+                                      ttl=FOLLOW_GRAPH_TTL)
+
+    @classmethod
+    def unfollow(cls, user_id, author_id):
+        RedisInterface.remove_from_set(cls.get_following_key(user_id), author_id)
+        RedisInterface.remove_from_set(cls.get_followers_key(author_id), user_id)
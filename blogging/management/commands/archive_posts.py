@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blogging.archive import PostArchive
+from blogging.constants import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Moves soft-deleted threads and threads without activity (posts, comments or " \
+           "interactions) for --older-than days to the archive tables, with their comments and " \
+           "interactions. Archived posts stay readable through the post detail and thread " \
+           "endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=ARCHIVE_AFTER_DAYS,
+                            help="days without activity after which a thread is archived")
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+                            help="number of threads archived per transaction")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="only report the number of threads to archive")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+        if options['dry_run']:
+            threads = len(PostArchive.get_thread_ids(cutoff))
+            self.stdout.write(self.style.SUCCESS(f"found {threads} threads to archive"))
+            return
+
+        last_id, threads, posts, interactions = 0, 0, 0, 0
+        while True:
+            thread_ids = PostArchive.get_thread_ids(cutoff, last_id, options['batch_size'])
+            if not thread_ids:
+                break
+
+            archived_posts, archived_interactions = PostArchive.archive(thread_ids)
+            last_id = thread_ids[-1]
+            threads += len(thread_ids)
+            posts += archived_posts
+            interactions += archived_interactions
+
+        self.stdout.write(self.style.SUCCESS(
+            f"archived {threads} threads: {posts} posts and comments, {interactions} interactions"
+        ))
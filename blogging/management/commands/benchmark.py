@@ -0,0 +1,199 @@
+import json
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, close_old_connections
+from django.test import Client
+from django.urls import reverse
+
+from blogging.enums import Interaction
+from blogging.models import Post, PostInteraction, Followers
+from core.instrumentation import MetricsRegistry
+
+# metrics compared to the baseline, and whether higher values are better
+COMPARED_METRICS = {'p50_ms': False, 'p99_ms': False, 'avg_queries': False,
+                    'new_connections': False, 'throughput_rps': True}
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the timeline, post list, interaction and follow endpoints in-process " \
+           "(no server) against the configured database and cache, e.g. a dataset of " \
+           "`manage.py generate_dataset`: latency percentiles, queries per request and " \
+           "throughput, optionally saved as JSON and compared to a baseline. The interaction " \
+           "and follow scenarios write to the database. DB connections are recycled between " \
+           "requests as by the request handlers, --conn-max-age 0 measures the cost of opening " \
+           "a connection per request."
+
+    scenarios = ('timeline', 'posts', 'activity', 'follow')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', choices=self.scenarios,
+                            default=list(self.scenarios))
+        parser.add_argument('--requests', type=int, default=500, help="requests per scenario")
+        parser.add_argument('--warmup', type=int, default=50,
+                            help="requests per scenario made before measuring")
+        parser.add_argument('--users', type=int, default=20,
+                            help="number of users the requests are spread over")
+        parser.add_argument('--host', default='localhost', help="Host header of the requests")
+        parser.add_argument('--conn-max-age', type=int,
+                            help="overrides the CONN_MAX_AGE of the databases (seconds)")
+        parser.add_argument('--seed', type=int, help="seed of the random generator")
+        parser.add_argument('--output', help="path of the JSON file results are saved to")
+        parser.add_argument('--baseline', help="path of a JSON results file to compare to")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="relative change of a metric reported as a regression "
+                                 "(timings of successive runs commonly vary by 10-15%%)")
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help="exit with an error status when a regression is found")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.random = random.Random()
+        self.post_ids = []
+        self.user_ids = []
+
+    def get_clients(self, count, host):
+        """
+        returns (user, client logged in as user) of the users following the most users
+        """
+        users = list(User.objects.filter(is_active=True, stats__following_count__gt=0)
+                     .order_by('-stats__following_count')[:count])
+        if not users:
+            raise CommandError("no user follows anyone, generate a dataset first "
+                               "(`manage.py generate_dataset`)")
+
+        clients = []
+        for user in users:
+            client = Client(HTTP_HOST=host)
+            client.force_login(user)
+            clients.append((user, client))
+        return clients
+
+    def request_timeline(self, client, user):
+        return client.get(reverse('retrieve_user_timeline'))
+
+    def request_posts(self, client, user):
+        return client.get(reverse('post-list'), {'page': self.random.randint(1, 5)})
+
+    def request_activity(self, client, user):
+        return client.post(reverse('postinteraction-list'), {
+            'post': self.random.choice(self.post_ids),
+            'activity': self.random.choice(Interaction.names()),
+        }, content_type='application/json')
+
+    def request_follow(self, client, user):
+        user_id = self.random.choice(self.user_ids)
+        while user_id == user.id:
+            user_id = self.random.choice(self.user_ids)
+        return client.post(reverse('follow_user'), {'user_id': user_id},
+                           content_type='application/json')
+
+    def run_scenario(self, name, clients, requests, warmup):
+        request = getattr(self, f"request_{name}")
+        for _ in range(warmup):
+            user, client = self.random.choice(clients)
+            request(client, user)
+
+        MetricsRegistry.reset()
+        latencies, errors = [], 0
+        start = time.perf_counter()
+        for _ in range(requests):
+            user, client = self.random.choice(clients)
+            request_start = time.perf_counter()
+            # as done on request_started / request_finished, which the test client skips
+            close_old_connections()
+            response = request(client, user)
+            close_old_connections()
+            latencies.append((time.perf_counter() - request_start) * 1000)
+            errors += response.status_code >= 400
+        elapsed = time.perf_counter() - start
+
+        views = MetricsRegistry.get_snapshot().values()
+        centiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+        return {
+            'requests': requests,
+            'errors': errors,
+            'throughput_rps': round(requests / elapsed, 1),
+            'p50_ms': round(centiles[49], 2),
+            'p95_ms': round(centiles[94], 2),
+            'p99_ms': round(centiles[98], 2),
+            'avg_queries': round(sum(view['avg_queries'] * view['requests'] for view in views) /
+                                 max(sum(view['requests'] for view in views), 1), 2),
+            'max_queries': max((view['max_queries'] for view in views), default=0),
+            'new_connections': round(sum(view['avg_new_connections'] * view['requests']
+                                         for view in views) /
+                                     max(sum(view['requests'] for view in views), 1), 2),
+        }
+
+    def compare(self, results, baseline, threshold):
+        """
+        prints the changes from baseline, returns the regressed (scenario, metric) pairs
+        """
+        regressions = []
+        self.stdout.write(f"\n{'scenario':<12}{'metric':<16}{'baseline':>12}{'current':>12}"
+                          f"{'change':>10}")
+        for name, metrics in results['scenarios'].items():
+            base = baseline.get('scenarios', {}).get(name)
+            if base is None:
+                continue
+
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                before, after = base[metric], metrics[metric]
+                change = (after - before) / before if before else 0.0
+                regressed = (-change if higher_is_better else change) > threshold
+                line = f"{name:<12}{metric:<16}{before:>12}{after:>12}{change:>+10.1%}"
+                if regressed:
+                    regressions.append((name, metric))
+                    line = self.style.ERROR(f"{line}  regression")
+                self.stdout.write(line)
+        return regressions
+
+    def handle(self, *args, **options):
+        self.random.seed(options['seed'])
+        if options['conn_max_age'] is not None:
+            for alias in connections:
+                connections[alias].settings_dict['CONN_MAX_AGE'] = options['conn_max_age']
+            # reopened with the new max age
+            connections.close_all()
+        clients = self.get_clients(options['users'], options['host'])
+        # top-level posts, as comments can only be liked
+        self.post_ids = list(Post.objects.filter(is_active=True, parent__isnull=True)
+                             .order_by('-pk').values_list('pk', flat=True)[:10000])
+        self.user_ids = list(User.objects.order_by('-pk').values_list('pk', flat=True)[:10000])
+
+        results = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'dataset': {'users': User.objects.count(), 'posts': Post.objects.count(),
+                        'follows': Followers.objects.count(),
+                        'interactions': PostInteraction.objects.count()},
+            'scenarios': {},
+        }
+        self.stdout.write(f"{'scenario':<12}{'requests':>10}{'errors':>8}{'req/s':>10}"
+                          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}"
+                          f"{'connects':>10}")
+        for name in options['scenarios']:
+            metrics = results['scenarios'][name] = self.run_scenario(
+                name, clients, options['requests'], options['warmup']
+            )
+            self.stdout.write(f"{name:<12}{metrics['requests']:>10}{metrics['errors']:>8}"
+                              f"{metrics['throughput_rps']:>10.1f}{metrics['p50_ms']:>9.1f}"
+                              f"{metrics['p95_ms']:>9.1f}{metrics['p99_ms']:>9.1f}"
+                              f"{metrics['avg_queries']:>9.1f}{metrics['new_connections']:>10.2f}")
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"results saved to {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = self.compare(results, json.load(baseline), options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} regressions from {options['baseline']}")
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blogging.buffer import ActivityBuffer
+
+
+class Command(BaseCommand):
+    help = "Drains post interactions buffered by the write-behind mode of /api/activity/ into " \
+           "the database, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--worker-id', default='default',
+                            help="unique per concurrently running worker, a restarted worker "
+                                 "must reuse its id to pick up its unacknowledged batch")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="interactions written per transaction")
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="seconds to sleep when the buffer is empty")
+        parser.add_argument('--once', action='store_true',
+                            help="exit once the buffer is empty")
+
+    def handle(self, *args, **options):
+        processed_total, created_total = 0, 0
+
+        while True:
+            processed, created, rejected = ActivityBuffer.flush(options['worker_id'],
+                                                                options['batch_size'])
+            processed_total += processed
+            created_total += created
+
+            for request_id, errors in rejected.items():
+                self.stderr.write(f"dropped interaction {request_id}: {errors}")
+
+            if not processed:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"processed {processed_total} buffered interactions, created {created_total}"
+        ))
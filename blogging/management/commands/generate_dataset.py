@@ -0,0 +1,237 @@
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import transaction, connection
+from django.db.models import Max
+from django.utils import timezone
+
+from blogging.enums import Interaction
+from blogging.models import Post, PostInteraction, Followers, UserStats, INTERACTION_COUNTERS
+
+WORDS = (
+    "time people year way day thing world life hand part child eye place work week case point "
+    "number group problem fact water city music game food coffee morning code release bug team "
+    "weekend travel book movie photo idea question story news update launch design data cloud"
+).split()
+
+ACTIVITY_WEIGHTS = {Interaction.like.name: 70, Interaction.share.name: 15,
+                    Interaction.repost.name: 15}
+REPLY_RATIO = 0.2                 # share of comments that get a reply
+
+
+class Command(BaseCommand):
+    help = "Generates a synthetic social network with bulk_create: users, a follower graph with " \
+           "power-law popularity, posts, comments and replies spread over the last days, and " \
+           "interactions, with consistent post counters and user stats"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--follows', type=float, default=20,
+                            help="average number of users each user follows")
+        parser.add_argument('--posts', type=float, default=10,
+                            help="average number of top-level posts per user")
+        parser.add_argument('--comments', type=float, default=2,
+                            help="average number of comments per post")
+        parser.add_argument('--interactions', type=float, default=5,
+                            help="average number of interactions per post / comment")
+        parser.add_argument('--alpha', type=float, default=1.1,
+                            help="exponent of the power-law popularity of users")
+        parser.add_argument('--days', type=int, default=30,
+                            help="posts are spread over this many past days")
+        parser.add_argument('--prefix', default='synthetic', help="prefix of the usernames")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="number of rows inserted per query")
+        parser.add_argument('--seed', type=int, help="seed of the random generator")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.random = random.Random()
+        self.options = {}
+        self.user_ids = []
+        self.next_post_id = 1
+        self.now = timezone.now()
+
+    @staticmethod
+    @contextmanager
+    def keep_timestamps(*models):
+        """
+        lets bulk_create store the auto_now / auto_now_add fields values set on the rows
+        """
+        fields = [field for model in models for field in model._meta.concrete_fields
+                  if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+        flags = [(field.auto_now, field.auto_now_add) for field in fields]
+        for field in fields:
+            field.auto_now = field.auto_now_add = False
+        try:
+            yield
+        finally:
+            for field, (auto_now, auto_now_add) in zip(fields, flags):
+                field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+    def get_count(self, average, maximum):
+        # heavy tailed (pareto, shape 2) counts averaging `average`
+        return min(int(average / 2 * self.random.paretovariate(2)), maximum)
+
+    def get_text(self, min_words, max_words):
+        return ' '.join(self.random.choices(WORDS, k=self.random.randint(min_words, max_words)))
+
+    def get_later_time(self, created_at):
+        return created_at + (self.now - created_at) * self.random.random()
+
+    def create_users(self):
+        prefix = self.options['prefix']
+        if User.objects.filter(username__startswith=f"{prefix}-").exists():
+            raise CommandError(f'users prefixed with "{prefix}-" already exist, pick another '
+                               f'--prefix')
+
+        password = make_password(None)
+        users = User.objects.bulk_create([
+            User(username=f"{prefix}-{i}", email=f"{prefix}-{i}@example.com", password=password,
+                 first_name=self.random.choice(WORDS).title())
+            for i in range(self.options['users'])
+        ], batch_size=self.options['batch_size'])
+        # most popular first, the popularity of the i-th user being proportional to
+        # 1 / (i + 1) ** alpha
+        self.user_ids = self.random.sample([user.pk for user in users], len(users))
+
+    def create_follows(self):
+        """
+        each user follows users drawn by popularity, returns {user id: followers count}
+        """
+        popularity = list(accumulate(1 / (rank + 1) ** self.options['alpha']
+                                     for rank in range(len(self.user_ids))))
+        rows, followers, following = [], Counter(), Counter()
+        for follower_id in self.user_ids:
+            count = self.get_count(self.options['follows'], len(self.user_ids) - 1)
+            followed = set(self.random.choices(self.user_ids, cum_weights=popularity, k=count))
+            followed.discard(follower_id)
+            rows.extend(Followers(user_id=user_id, following_user_id=follower_id, is_active=True)
+                        for user_id in followed)
+            followers.update(followed)
+            following[follower_id] = len(followed)
+
+        with transaction.atomic():
+            Followers.objects.bulk_create(rows, batch_size=self.options['batch_size'])
+            UserStats.objects.bulk_create([
+                UserStats(user_id=user_id, followers_count=followers[user_id],
+                          following_count=following[user_id]) for user_id in self.user_ids
+            ], batch_size=self.options['batch_size'])
+        return followers
+
+    def build_post(self, user_id, created_at, parent=None):
+        """
+        returns an unsaved post with its id and like / share / repost counters set (the
+        interactions are created afterwards, see build_interactions()), counting it as a comment
+        of parent
+        """
+        post = Post(pk=self.next_post_id, user_id=user_id, created_at=created_at,
+                    updated_at=created_at)
+        self.next_post_id += 1
+        if parent is None:
+            post.headline, post.body = self.get_text(2, 6).capitalize(), self.get_text(8, 40)
+            activities = self.random.choices(list(ACTIVITY_WEIGHTS), ACTIVITY_WEIGHTS.values(),
+                                             k=self.get_count(self.options['interactions'],
+                                                              len(self.user_ids)))
+        else:
+            post.body, post.parent_id, post.root_id = self.get_text(3, 20), parent.pk, \
+                parent.root_id or parent.pk
+            parent.comments_count += 1
+            # comments can only be liked
+            activities = [Interaction.like.name] * self.get_count(self.options['interactions'],
+                                                                  len(self.user_ids))
+
+        for activity, count in Counter(activities).items():
+            setattr(post, INTERACTION_COUNTERS[activity], count)
+        post.slug = post.make_slug()
+        return post
+
+    def generate_posts(self):
+        """
+        yields threads of posts, comments and replies, each parent before its comments
+        """
+        for user_id in self.user_ids:
+            for _ in range(self.get_count(self.options['posts'], 10 ** 6)):
+                created_at = self.now - timedelta(
+                    seconds=self.random.uniform(0, self.options['days'] * 86400)
+                )
+                post = self.build_post(user_id, created_at)
+                thread = []
+                for _ in range(self.get_count(self.options['comments'], 10 ** 6)):
+                    comment = self.build_post(self.random.choice(self.user_ids),
+                                              self.get_later_time(created_at), parent=post)
+                    thread.append(comment)
+                    if self.random.random() < REPLY_RATIO:
+                        thread.append(self.build_post(self.random.choice(self.user_ids),
+                                                      self.get_later_time(comment.created_at),
+                                                      parent=comment))
+                yield post
+                yield from thread
+
+    def build_interactions(self, posts):
+        """
+        returns the interactions counted by the counters of posts, by distinct users
+        """
+        return [
+            PostInteraction(user_id=user_id, post_id=post.pk, activity=activity,
+                            created_at=self.get_later_time(post.created_at))
+            for post in posts for activity, field in INTERACTION_COUNTERS.items()
+            for user_id in self.random.sample(self.user_ids, getattr(post, field))
+        ]
+
+    def insert_posts(self, posts):
+        with transaction.atomic():
+            Post.objects.bulk_create(posts)
+            interactions = PostInteraction.objects.bulk_create(
+                self.build_interactions(posts), batch_size=self.options['batch_size']
+            )
+        return len(interactions)
+
+    def create_posts(self):
+        """
+        returns (posts count, comments count, interactions count)
+        """
+        self.next_post_id = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        counts = Counter()
+        batch = []
+        with self.keep_timestamps(Post, PostInteraction):
+            for post in self.generate_posts():
+                batch.append(post)
+                counts['comments' if post.parent_id else 'posts'] += 1
+                if len(batch) == self.options['batch_size']:
+                    counts['interactions'] += self.insert_posts(batch)
+                    batch = []
+            if batch:
+                counts['interactions'] += self.insert_posts(batch)
+
+        # post ids were set explicitly, move the id sequence (postgres) past them
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Post]):
+                cursor.execute(sql)
+        return counts['posts'], counts['comments'], counts['interactions']
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random.seed(options['seed'])
+        self.now = timezone.now()
+        start = time.monotonic()
+
+        self.create_users()
+        followers = self.create_follows()
+        self.stdout.write(f"{len(self.user_ids)} users, {sum(followers.values())} follows, "
+                          f"most followed user has {max(followers.values(), default=0)} followers")
+
+        posts, comments, interactions = self.create_posts()
+        elapsed = time.monotonic() - start
+        rows = len(self.user_ids) + sum(followers.values()) + posts + comments + interactions
+        self.stdout.write(self.style.SUCCESS(
+            f"{posts} posts, {comments} comments, {interactions} interactions, {rows} rows in "
+            f"{elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)"
+        ))
@@ -0,0 +1,43 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blogging.models import Post
+
+
+class Command(BaseCommand):
+    help = "Imports posts from a JSON lines file, one {\"user\": id, \"body\": str, " \
+           "\"headline\": str, \"parent\": id} object per line, with Post.objects.bulk_import()"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="path of the JSON lines file, - for stdin")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="number of posts inserted per transaction")
+
+    @staticmethod
+    def read_posts(lines):
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+
+            try:
+                row = json.loads(line)
+                yield Post(user_id=row['user'], body=row['body'], headline=row.get('headline'),
+                           parent_id=row.get('parent'), is_active=row.get('is_active', True))
+            except (ValueError, KeyError, TypeError) as exc:
+                raise CommandError(f"invalid post on line {number}: {exc!r}")
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        if options['file'] == '-':
+            count = Post.objects.bulk_import(self.read_posts(sys.stdin), options['batch_size'])
+        else:
+            with open(options['file']) as lines:
+                count = Post.objects.bulk_import(self.read_posts(lines), options['batch_size'])
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"imported {count} posts in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} posts/s)"
+        ))
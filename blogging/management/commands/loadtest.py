@@ -0,0 +1,94 @@
+import http.client
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Measures throughput and latency of concurrent GET requests to endpoints of a running " \
+           "server, e.g. the sync and async timeline views of the app served by an ASGI server " \
+           "(`uvicorn core.asgi:application`)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--username', required=True, help="user the requests are made as")
+        parser.add_argument('--paths', nargs='+',
+                            default=['/api/timeline/', '/api/async/timeline/'])
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help="number of concurrent clients")
+        parser.add_argument('--duration', type=float, default=10, help="seconds per path")
+
+    @staticmethod
+    def get_session_cookie(username):
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'user "{username}" does not exist')
+
+        # a session logged in as user, as BasicAuthentication would hash the password per request
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+
+    @staticmethod
+    def run_client(url, path, cookie, deadline, latencies, errors, lock):
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else \
+            http.client.HTTPConnection
+        connection = connection_class(url.hostname, url.port, timeout=30)
+        client_latencies, client_errors = [], 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'Cookie': cookie})
+                response = connection.getresponse()
+                response.read()
+                if response.status == 200:
+                    client_latencies.append(time.perf_counter() - start)
+                else:
+                    client_errors += 1
+            except (OSError, http.client.HTTPException):
+                client_errors += 1
+                connection.close()
+
+        connection.close()
+        with lock:
+            latencies.extend(client_latencies)
+            errors[0] += client_errors
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['base_url'])
+        cookie = self.get_session_cookie(options['username'])
+        concurrency = options['concurrency']
+
+        self.stdout.write(f"{concurrency} concurrent clients, {options['duration']}s per path")
+        self.stdout.write(f"{'path':<32}{'requests':>10}{'errors':>8}{'req/s':>10}"
+                          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for path in options['paths']:
+            latencies, errors, lock = [], [0], threading.Lock()
+            start = time.monotonic()
+            deadline = start + options['duration']
+            with ThreadPoolExecutor(concurrency) as executor:
+                for _ in range(concurrency):
+                    executor.submit(self.run_client, url, path, cookie, deadline, latencies,
+                                    errors, lock)
+            elapsed = time.monotonic() - start
+
+            if len(latencies) > 1:
+                centiles = statistics.quantiles(latencies, n=100)
+                p50, p95, p99 = (centiles[i] * 1000 for i in (49, 94, 98))
+            else:
+                p50 = p95 = p99 = float('nan')
+            self.stdout.write(f"{path:<32}{len(latencies):>10}{errors[0]:>8}"
+                              f"{len(latencies) / elapsed:>10.1f}{p50:>9.1f}{p95:>9.1f}"
+                              f"{p99:>9.1f}")
@@ -0,0 +1,85 @@
+import pickle
+import random
+import string
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blogging.codecs import PayloadCodec
+from blogging.models import Post
+from blogging.serializers import PostSerializer
+
+
+def dumps(value):
+    # same serialization django-redis applies to every cached value
+    return pickle.dumps(value, pickle.DEFAULT_PROTOCOL)
+
+
+class Command(BaseCommand):
+    help = "Compares bytes stored and decode time per cached timeline of pickled DRF payloads " \
+           "(django-redis' serializer) with the compact PayloadCodec encoding stored as raw bytes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=50, help="posts per timeline")
+        parser.add_argument('--body-length', type=int, default=280,
+                            help="average number of characters in a post body")
+        parser.add_argument('--iterations', type=int, default=500,
+                            help="decodes timed per encoding")
+
+    @staticmethod
+    def build_timeline(posts, body_length):
+        now = timezone.now()
+        words = [''.join(random.choices(string.ascii_lowercase, k=random.randint(2, 9)))
+                 for _ in range(500)]
+        timeline = []
+        for i in range(posts):
+            body = ''
+            while len(body) < random.randint(body_length // 2, body_length * 3 // 2):
+                body += random.choice(words) + ' '
+            timeline.append(Post(
+                id=1000000 + i, user=User(id=random.randint(1, 100000)), slug=f"post-{i}",
+                headline=' '.join(random.choices(words, k=6)) if i % 2 else None,
+                body=body.strip(), created_at=now - timedelta(minutes=i),
+                updated_at=now - timedelta(minutes=i), likes_count=random.randint(0, 5000),
+                shares_count=random.randint(0, 500), reposts_count=random.randint(0, 500),
+                comments_count=random.randint(0, 1000),
+            ))
+        return PostSerializer(timeline, many=True, read_only=True).data
+
+    def measure(self, name, stored, decode, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            decode(stored)
+        decode_us = (time.perf_counter() - start) / iterations * 1e6
+        size = sum(len(value) for value in stored) if isinstance(stored, list) else len(stored)
+        self.stdout.write(f"{name:<44}{size:>12}{decode_us:>16.1f}")
+        return size, decode_us
+
+    def handle(self, *args, **options):
+        timeline = self.build_timeline(options['posts'], options['body_length'])
+        codec = PayloadCodec(PostSerializer.Meta.fields)
+        iterations = options['iterations']
+
+        self.stdout.write(f"{options['posts']} posts per timeline, {iterations} iterations")
+        self.stdout.write(f"{'encoding':<44}{'bytes':>12}{'decode (us)':>16}")
+
+        whole, _ = self.measure(
+            "pickle, whole timeline", dumps(timeline), pickle.loads, iterations
+        )
+        baseline, baseline_us = self.measure(
+            "pickle, per post (PostCache without codec)", [dumps(payload) for payload in timeline],
+            lambda values: [pickle.loads(value) for value in values], iterations
+        )
+        per_post, per_post_us = self.measure(
+            "codec, per post, raw bytes (PostCache)",
+            [codec.encode([payload]) for payload in timeline], codec.decode_many, iterations
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"PostCache stores {per_post / baseline:.0%} of the bytes of pickled posts "
+            f"({per_post / whole:.0%} of a pickled whole timeline), decoded "
+            f"{baseline_us / per_post_us:.1f}x as fast"
+        ))
@@ -0,0 +1,57 @@
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blogging.cache import PostCache
+from blogging.models import Post, ENGAGEMENT_ANNOTATIONS
+
+
+class Command(BaseCommand):
+    help = "Recomputes the like/share/repost/comment counters stored on posts from the " \
+           "interaction and comment rows, repairing any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="number of posts checked per batch")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="only report the posts whose counters drifted")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id, checked, repaired = 0, 0, 0
+        while True:
+            with transaction.atomic():
+                posts = list(
+                    Post.objects.filter(pk__gt=last_id).order_by('pk')
+                    .select_for_update(of=('self',))
+                    .with_engagement().only('pk', *Post.COUNTER_FIELDS)[:batch_size]
+                )
+                if not posts:
+                    break
+
+                drifted = []
+                for post in posts:
+                    changed = False
+                    for field in Post.COUNTER_FIELDS:
+                        actual = getattr(post, ENGAGEMENT_ANNOTATIONS[field])
+                        if getattr(post, field) != actual:
+                            setattr(post, field, actual)
+                            changed = True
+                    if changed:
+                        drifted.append(post)
+
+                if drifted and not options['dry_run']:
+                    Post.objects.bulk_update(drifted, Post.COUNTER_FIELDS)
+                    # bulk_update() sends no signal, cached payloads are dropped here
+                    transaction.on_commit(partial(PostCache.invalidate,
+                                                  *[post.id for post in drifted]))
+
+            last_id = posts[-1].pk
+            checked += len(posts)
+            repaired += len(drifted)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"checked {checked} posts, {'found' if options['dry_run'] else 'repaired'} "
+            f"{repaired} with drifted counters"
+        ))
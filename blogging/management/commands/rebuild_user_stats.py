@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blogging.models import Followers, UserStats, count_subquery
+
+
+class Command(BaseCommand):
+    help = "Recomputes the follower/following counters of users from the follower rows, " \
+           "repairing any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="number of users checked per batch")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="only report the users whose counters drifted")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id, checked, repaired = 0, 0, 0
+        while True:
+            with transaction.atomic():
+                users = list(
+                    User.objects.filter(pk__gt=last_id).order_by('pk').annotate(
+                        followers_count=count_subquery(Followers.objects, 'user', is_active=True),
+                        following_count=count_subquery(Followers.objects, 'following_user',
+                                                       is_active=True),
+                    ).values('pk', *UserStats.COUNTER_FIELDS)[:batch_size]
+                )
+                if not users:
+                    break
+
+                stats = UserStats.objects.select_for_update().in_bulk(
+                    [user['pk'] for user in users]
+                )
+                drifted, missing = [], []
+                for user in users:
+                    actual = {field: user[field] for field in UserStats.COUNTER_FIELDS}
+                    user_stats = stats.get(user['pk'])
+                    if user_stats is None:
+                        if any(actual.values()):
+                            missing.append(UserStats(user_id=user['pk'], **actual))
+                        continue
+
+                    if any(getattr(user_stats, field) != count for field, count in actual.items()):
+                        for field, count in actual.items():
+                            setattr(user_stats, field, count)
+                        drifted.append(user_stats)
+
+                if not options['dry_run']:
+                    UserStats.objects.bulk_update(drifted, UserStats.COUNTER_FIELDS)
+                    UserStats.objects.bulk_create(missing, ignore_conflicts=True)
+
+            last_id = users[-1]['pk']
+            checked += len(users)
+            repaired += len(drifted) + len(missing)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"checked {checked} users, {'found' if options['dry_run'] else 'repaired'} "
+            f"{repaired} with drifted counters"
+        ))
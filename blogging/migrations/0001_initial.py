@@ -0,0 +1,89 @@
+# Generated by Django 4.2.3 on 2026-10-18 00:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Post',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.CharField(blank=True, help_text='text pattern to uniquely identify a post/comment', max_length=128, unique=True)),
+                ('headline', models.CharField(blank=True, help_text='short text describing post', max_length=250, null=True)),
+                ('body', models.TextField(help_text='actual content of the post', max_length=1000)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True, help_text='boolean indicating if actions (like/comment/share/repost) can be performed on the post')),
+                ('is_deleted', models.BooleanField(default=False, help_text='boolean indicating if post is hidden from the platform')),
+                ('likes_count', models.PositiveIntegerField(default=0, editable=False, help_text='number of likes on the post')),
+                ('shares_count', models.PositiveIntegerField(default=0, editable=False, help_text='number of shares of the post')),
+                ('reposts_count', models.PositiveIntegerField(default=0, editable=False, help_text='number of reposts of the post')),
+                ('comments_count', models.PositiveIntegerField(default=0, editable=False, help_text='number of active comments on the post')),
+                ('parent', models.ForeignKey(blank=True, db_index=False, help_text='if selected, indicates comment on the selected post', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='comments', to='blogging.post')),
+                ('user', models.ForeignKey(help_text='user who is creating the post', on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Followers',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(default=True, help_text='used to toggle follow/unfollow after once followed', verbose_name='is currently following')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('following_user', models.ForeignKey(db_index=False, help_text='user following another user', on_delete=django.db.models.deletion.PROTECT, related_name='following', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(db_index=False, help_text='user being followed', on_delete=django.db.models.deletion.PROTECT, related_name='followers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Follower',
+                'verbose_name_plural': 'Followers',
+            },
+        ),
+        migrations.CreateModel(
+            name='PostInteraction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity', models.CharField(choices=[('like', 'Like'), ('share', 'Share'), ('repost', 'Repost')], help_text='describes action taken on the post', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('request_id', models.UUIDField(blank=True, editable=False, help_text='id of the buffered request that created the interaction, if written behind', null=True, unique=True)),
+                ('post', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='interactions', to='blogging.post')),
+                ('user', models.ForeignKey(help_text='user taking action on the post', on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['post', 'activity'], name='interaction_post_activity_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deleted', False), ('parent__isnull', True)), fields=['user', '-updated_at', '-id'], name='post_live_timeline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('parent__isnull', True)), fields=['-created_at'], name='post_top_level_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['parent', 'is_active'], name='post_parent_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='followers',
+            index=models.Index(fields=['following_user', 'is_active', 'user'], name='followers_following_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='followers',
+            index=models.Index(fields=['user', 'is_active', 'following_user'], name='followers_followed_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='followers',
+            unique_together={('user', 'following_user')},
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.3 on 2026-10-18 00:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_user_stats(apps, schema_editor):
+    Followers = apps.get_model('blogging', 'Followers')
+    UserStats = apps.get_model('blogging', 'UserStats')
+    db_alias = schema_editor.connection.alias
+    stats = {}
+    for field, counter in (('user', 'followers_count'), ('following_user', 'following_count')):
+        counts = Followers.objects.using(db_alias).filter(is_active=True).values(field) \
+            .annotate(count=models.Count('pk')).values_list(field, 'count')
+        for user_id, count in counts:
+            setattr(stats.setdefault(user_id, UserStats(user_id=user_id)), counter, count)
+    UserStats.objects.using(db_alias).bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('blogging', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers_count', models.PositiveIntegerField(default=0, editable=False, help_text='number of users following the user')),
+                ('following_count', models.PositiveIntegerField(default=0, editable=False, help_text='number of users the user follows')),
+            ],
+            options={
+                'verbose_name': 'User stats',
+                'verbose_name_plural': 'User stats',
+            },
+        ),
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.3 on 2026-10-18 01:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_roots(apps, schema_editor):
+    posts = apps.get_model('blogging', 'Post').objects.using(schema_editor.connection.alias)
+    posts.filter(parent__isnull=False, parent__parent__isnull=True) \
+        .update(root=models.F('parent'))
+    # deeper comments inherit the root of their parent, one thread level per pass
+    while posts.filter(root__isnull=True, parent__root__isnull=False).update(
+        root=models.Subquery(posts.filter(pk=models.OuterRef('parent')).values('root'))
+    ):
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogging', '0002_user_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='root',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, help_text='top-level post of the thread of a comment', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='thread', to='blogging.post'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['root', 'is_active'], name='post_root_active_idx'),
+        ),
+        migrations.RunPython(fill_roots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.2.3 on 2026-10-18 01:04
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    "CREATE INDEX post_search_vector_idx ON blogging_post USING GIN (search_vector)",
+    """
+    CREATE FUNCTION blogging_post_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := setweight(to_tsvector('english', coalesce(NEW.headline, '')), 'A')
+            || setweight(to_tsvector('english', NEW.body), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER blogging_post_search_vector BEFORE INSERT OR UPDATE OF headline, body
+    ON blogging_post FOR EACH ROW EXECUTE FUNCTION blogging_post_search_vector()
+    """,
+    # fires the trigger on existing posts
+    "UPDATE blogging_post SET body = body",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP TRIGGER blogging_post_search_vector ON blogging_post",
+    "DROP FUNCTION blogging_post_search_vector()",
+    "DROP INDEX post_search_vector_idx",
+]
+
+# external content FTS5 table, kept in sync with blogging_post by triggers
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE blogging_post_fts USING fts5(
+        headline, body, content='blogging_post', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER blogging_post_fts_insert AFTER INSERT ON blogging_post BEGIN
+        INSERT INTO blogging_post_fts(rowid, headline, body)
+        VALUES (new.id, new.headline, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER blogging_post_fts_delete AFTER DELETE ON blogging_post BEGIN
+        INSERT INTO blogging_post_fts(blogging_post_fts, rowid, headline, body)
+        VALUES ('delete', old.id, old.headline, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER blogging_post_fts_update AFTER UPDATE OF headline, body ON blogging_post BEGIN
+        INSERT INTO blogging_post_fts(blogging_post_fts, rowid, headline, body)
+        VALUES ('delete', old.id, old.headline, old.body);
+        INSERT INTO blogging_post_fts(rowid, headline, body)
+        VALUES (new.id, new.headline, new.body);
+    END
+    """,
+    "INSERT INTO blogging_post_fts(blogging_post_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER blogging_post_fts_update",
+    "DROP TRIGGER blogging_post_fts_delete",
+    "DROP TRIGGER blogging_post_fts_insert",
+    "DROP TABLE blogging_post_fts",
+]
+
+
+def run_vendor_sql(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogging', '0003_post_root'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            run_vendor_sql({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run_vendor_sql({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.3 on 2026-10-18 01:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# archived interactions are insert only, range partitioned by month on postgres (the primary key
+# has to include the partition key), partitions being created by PostArchive.ensure_partitions()
+POSTGRES_FORWARD = [
+    "DROP TABLE blogging_archivedpostinteraction",
+    """
+    CREATE TABLE blogging_archivedpostinteraction (
+        id bigint NOT NULL,
+        activity varchar(20) NOT NULL,
+        created_at timestamp with time zone NOT NULL,
+        request_id uuid NULL,
+        archived_at timestamp with time zone NOT NULL,
+        post_id bigint NOT NULL,
+        user_id integer NOT NULL,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at)
+    """,
+    "CREATE INDEX archived_interaction_post_idx ON blogging_archivedpostinteraction "
+    "(post_id, activity)",
+]
+
+
+def partition_interactions(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in POSTGRES_FORWARD:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blogging', '0004_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPost',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('slug', models.CharField(max_length=128)),
+                ('headline', models.CharField(blank=True, max_length=250, null=True)),
+                ('body', models.TextField(max_length=1000)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('likes_count', models.PositiveIntegerField(default=0)),
+                ('shares_count', models.PositiveIntegerField(default=0)),
+                ('reposts_count', models.PositiveIntegerField(default=0)),
+                ('comments_count', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('parent', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='comments', to='blogging.archivedpost')),
+                ('root', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='thread', to='blogging.archivedpost')),
+                ('user', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedPostInteraction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('activity', models.CharField(choices=[('like', 'Like'), ('share', 'Share'), ('repost', 'Repost')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('request_id', models.UUIDField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('post', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='interactions', to='blogging.archivedpost')),
+                ('user', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['post', 'activity'], name='archived_interaction_post_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedpost',
+            index=models.Index(fields=['root', 'is_active'], name='archived_post_root_idx'),
+        ),
+        # reversed by dropping the table (DeleteModel)
+        migrations.RunPython(partition_interactions, migrations.RunPython.noop),
+    ]
@@ -1,21 +1,179 @@
+import secrets
+import string
+from collections import defaultdict
+
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction, connections, router
+from django.db.models import F, Q, Count, OuterRef, Subquery, Case, When, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Coalesce
+from django.contrib.postgres.search import SearchVectorField, SearchQuery, SearchRank
+from django.dispatch import Signal
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 
 from blogging.enums import Interaction
 
+INTERACTION_COUNTERS = {
+    Interaction.like.name: 'likes_count',
+    Interaction.share.name: 'shares_count',
+    Interaction.repost.name: 'reposts_count',
+}
+
+SLUG_TOKEN_DIGITS = string.digits + string.ascii_lowercase
+
+SEARCH_CONFIG = 'english'                   # postgres text search configuration of posts
+SEARCH_FTS_TABLE = 'blogging_post_fts'      # FTS5 index of posts on sqlite
+
+# sent with the created interactions after a bulk insert, which doesn't send post_save
+interactions_bulk_created = Signal()
+# sent with the created posts after a bulk import, which doesn't send post_save
+posts_bulk_created = Signal()
+# sent with the created / reactivated or deactivated rows after a follow upsert or unfollow
+follows_changed = Signal()
+# sent with the posts (of whole threads) moved to the archive tables, see blogging.archive
+posts_archived = Signal()
+
+ENGAGEMENT_ANNOTATIONS = {
+    'likes_count': 'num_likes',
+    'shares_count': 'num_shares',
+    'reposts_count': 'num_reposts',
+    'comments_count': 'num_comments',
+}
+
+
+def count_subquery(queryset, field, **filters):
+    """
+    correlated COUNT of queryset rows whose `field` points at the outer row
+    """
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        .annotate(count=Count('pk', filter=Q(**filters) if filters else None)).values('count')
+    ), 0)
+
+
+class UserStats(models.Model):
+    """
+    follower / following counters of a user, maintained by Followers.save() and .delete()
+    """
+    COUNTER_FIELDS = ('followers_count', 'following_count')
+
+    user = models.OneToOneField(User, primary_key=True, related_name='stats',
+                                on_delete=models.CASCADE)
+    followers_count = models.PositiveIntegerField(default=0, editable=False,
+                                                  help_text="number of users following the user")
+    following_count = models.PositiveIntegerField(default=0, editable=False,
+                                                  help_text="number of users the user follows")
+
+    def __str__(self):
+        return f"stats of user #{self.user_id}"
+
+    @staticmethod
+    def get_count(user, field):
+        # users without a stats row have never followed nor been followed by anyone
+        stats = getattr(user, 'stats', None)
+        return getattr(stats, field) if stats else 0
+
+    @classmethod
+    def update_counters(cls, deltas):
+        """
+        applies {user_id: {counter field: delta}}, creating the missing stats rows first
+        """
+        deltas = {user_id: counts for user_id, counts in deltas.items() if any(counts.values())}
+        if not deltas:
+            return
+
+        cls.objects.bulk_create([cls(user_id=user_id) for user_id in deltas],
+                                ignore_conflicts=True)
+        fields = {field for counts in deltas.values() for field in counts}
+        cls.objects.filter(pk__in=list(deltas)).update(**{
+            field: F(field) + Case(
+                *[When(pk=user_id, then=Value(counts[field]))
+                  for user_id, counts in deltas.items() if field in counts],
+                default=Value(0), output_field=models.IntegerField()
+            )
+            for field in fields
+        })
+
+    class Meta:
+        verbose_name = 'User stats'
+        verbose_name_plural = 'User stats'
+
+
+class FollowersQuerySet(models.QuerySet):
+    def upsert_sql(self, ops, user_ids):
+        table = ops.quote_name(self.model._meta.db_table)
+        return f"""
+            INSERT INTO {table} (user_id, following_user_id, is_active, created_at, updated_at)
+            SELECT id, %s, %s, %s, %s FROM {ops.quote_name(User._meta.db_table)}
+            WHERE id IN ({', '.join(['%s'] * len(user_ids))})
+            ON CONFLICT (user_id, following_user_id) DO UPDATE
+            SET is_active = EXCLUDED.is_active, updated_at = EXCLUDED.updated_at
+            WHERE {table}.is_active <> EXCLUDED.is_active
+            RETURNING id, user_id, following_user_id, is_active, created_at, updated_at
+        """
+
+    def deactivate_sql(self, ops, user_ids):
+        table = ops.quote_name(self.model._meta.db_table)
+        return f"""
+            UPDATE {table} SET is_active = %s, updated_at = %s
+            WHERE following_user_id = %s AND user_id IN ({', '.join(['%s'] * len(user_ids))})
+            AND is_active = %s
+            RETURNING id, user_id, following_user_id, is_active, created_at, updated_at
+        """
+
+    def follow(self, following_user_id, user_ids):
+        """
+        makes following_user follow users with a single INSERT ... ON CONFLICT DO UPDATE,
+        returns the rows created or reactivated. Unknown users, users already followed and
+        following_user itself are skipped.
+        """
+        user_ids = sorted(set(user_ids) - {following_user_id})
+        if not user_ids:
+            return []
+
+        db = router.db_for_write(self.model)
+        ops = connections[db].ops
+        now = ops.adapt_datetimefield_value(timezone.now())
+        return self.apply(db, self.upsert_sql(ops, user_ids),
+                          [following_user_id, True, now, now, *user_ids], 1)
+
+    def unfollow(self, following_user_id, user_ids):
+        """
+        makes following_user unfollow users with a single UPDATE, returns the rows deactivated
+        """
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return []
+
+        db = router.db_for_write(self.model)
+        ops = connections[db].ops
+        now = ops.adapt_datetimefield_value(timezone.now())
+        return self.apply(db, self.deactivate_sql(ops, user_ids),
+                          [False, now, following_user_id, *user_ids, True], -1)
+
+    def apply(self, db, sql, params, delta):
+        with transaction.atomic(using=db):
+            followers = list(self.raw(sql, params, using=db))
+            if followers:
+                UserStats.update_counters(Followers.get_stats_deltas(followers, delta))
+                follows_changed.send(sender=self.model, followers=followers)
+        return followers
+
 
 class Followers(models.Model):
+    # FK lookups are served by the unique / composite indexes declared in Meta
     user = models.ForeignKey(User, related_name='followers', on_delete=models.PROTECT,
-                             help_text="user being followed")
+                             db_index=False, help_text="user being followed")
     following_user = models.ForeignKey(User, related_name='following', on_delete=models.PROTECT,
-                                       help_text="user following another user")
+                                       db_index=False, help_text="user following another user")
     is_active = models.BooleanField(_("is currently following"), default=True,
                                     help_text="used to toggle follow/unfollow after once followed")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    objects = FollowersQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.user.username} followed by {self.following_user.username}"
@@ -24,17 +182,158 @@ class Followers(models.Model):
         if self.user == self.following_user:
             raise ValidationError("user and following_user can't be same")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_is_active = instance.__dict__.get('is_active')
+        return instance
+
     def save(self, *args, **kwargs):
         self.full_clean()
-        return super().save(*args, **kwargs)
+        was_active = False if self._state.adding else getattr(self, '_stored_is_active', None)
+
+        with transaction.atomic():
+            result = super().save(*args, **kwargs)
+            if was_active is not None and was_active != self.is_active:
+                self.update_stats(1 if self.is_active else -1)
+
+        self._stored_is_active = self.is_active
+        return result
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if self.is_active:
+                self.update_stats(-1)
+        return result
+
+    def update_stats(self, delta):
+        UserStats.update_counters(self.get_stats_deltas([self], delta))
+
+    @staticmethod
+    def get_stats_deltas(followers, delta):
+        deltas = defaultdict(lambda: defaultdict(int))
+        for follower in followers:
+            deltas[follower.user_id]['followers_count'] += delta
+            deltas[follower.following_user_id]['following_count'] += delta
+        return deltas
 
     class Meta:
         unique_together = ('user', 'following_user')
+        indexes = [
+            # who does X follow / who follows X, answered from the index alone
+            models.Index(fields=['following_user', 'is_active', 'user'],
+                         name='followers_following_idx'),
+            models.Index(fields=['user', 'is_active', 'following_user'],
+                         name='followers_followed_idx'),
+        ]
         verbose_name = 'Follower'
         verbose_name_plural = 'Followers'
 
 
+class PostQuerySet(models.QuerySet):
+    def with_engagement(self):
+        """
+        annotates like/share/repost/comment counts computed from the source tables
+        (num_likes, num_shares, num_reposts, num_comments). The counts are correlated subqueries,
+        so on a sliced queryset they are only computed for the rows returned.
+        """
+        return self.annotate(
+            **{
+                ENGAGEMENT_ANNOTATIONS[field]: count_subquery(
+                    PostInteraction.objects.all(), 'post', activity=activity
+                )
+                for activity, field in INTERACTION_COUNTERS.items()
+            },
+            num_comments=count_subquery(Post.objects.all(), 'parent', is_active=True),
+        )
+
+    def increment_counters(self, deltas):
+        """
+        applies {post_id: {counter field: delta}} to the stored counters in a single UPDATE
+        """
+        fields = {field for counts in deltas.values() for field in counts}
+        if not fields:
+            return 0
+
+        return self.filter(pk__in=list(deltas)).update(**{
+            field: F(field) + Case(
+                *[When(pk=post_id, then=Value(counts[field]))
+                  for post_id, counts in deltas.items() if field in counts],
+                default=Value(0), output_field=models.IntegerField()
+            )
+            for field in fields
+        })
+
+    def search(self, text):
+        """
+        full-text search of headline and body, annotating `rank` (higher is more relevant).
+        Uses the GIN indexed search_vector on postgres and the FTS5 index of posts on sqlite.
+        """
+        terms = text.split()
+        if not terms:
+            return self.none()
+
+        if connections[self.db].vendor == 'postgresql':
+            query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+            # ts_rank() returns a real, cast so ranks read back (and sent in cursors) compare equal
+            return self.filter(search_vector=query) \
+                .annotate(rank=Cast(SearchRank(F('search_vector'), query), models.FloatField()))
+
+        # quoted terms, all required, so user input can't be read as FTS5 query syntax
+        match = ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        return self.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {SEARCH_FTS_TABLE} WHERE {SEARCH_FTS_TABLE} "
+                          f"MATCH %s", [match])
+        ).annotate(rank=RawSQL(
+            f"SELECT -bm25({SEARCH_FTS_TABLE}, 2.0, 1.0) FROM {SEARCH_FTS_TABLE} "
+            f"WHERE {SEARCH_FTS_TABLE} MATCH %s AND rowid = {table}.id", [match],
+            output_field=models.FloatField()
+        ))
+
+    def bulk_import(self, posts, batch_size=1000):
+        """
+        inserts unsaved posts with bulk_create, batch_size posts per transaction, for loading large
+        amounts of posts. Slugs, thread roots and parents' comment counters are set as by save(),
+        but posts aren't validated with clean(). Parents of comments must already be stored.
+        returns the number of posts inserted
+        """
+        count = 0
+        batch = []
+        for post in posts:
+            batch.append(post)
+            if len(batch) == batch_size:
+                count += self.import_batch(batch)
+                batch = []
+        if batch:
+            count += self.import_batch(batch)
+        return count
+
+    def import_batch(self, posts):
+        parent_ids = {post.parent_id for post in posts if post.parent_id}
+        roots = dict(self.model.objects.filter(pk__in=parent_ids).values_list('id', 'root_id'))
+        comments = defaultdict(int)
+        for post in posts:
+            if post.parent_id:
+                post.root_id = roots.get(post.parent_id) or post.parent_id
+                if post.is_active:
+                    comments[post.parent_id] += 1
+            if not post.slug:
+                post.slug = post.make_slug()
+
+        with transaction.atomic():
+            created = self.model.objects.bulk_create(posts)
+            self.model.objects.increment_counters({
+                post_id: {'comments_count': count} for post_id, count in comments.items()
+            })
+            posts_bulk_created.send(sender=self.model, posts=created)
+        return len(created)
+
+
 class Post(models.Model):
+    COUNTER_FIELDS = ('likes_count', 'shares_count', 'reposts_count', 'comments_count')
+
     user = models.ForeignKey(User, on_delete=models.PROTECT,
                              help_text="user who is creating the post")
     slug = models.CharField(max_length=128, null=False, blank=True, unique=True,
@@ -51,28 +350,108 @@ class Post(models.Model):
     is_deleted = models.BooleanField(default=False, help_text="boolean indicating if post is "
                                                               "hidden from the platform")
     parent = models.ForeignKey(
-        'self', null=True, blank=True, related_name='comments',
-        on_delete=models.PROTECT, help_text="if selected, indicates comment on the selected post"
+        'self', null=True, blank=True, related_name='comments', on_delete=models.PROTECT,
+        db_index=False, help_text="if selected, indicates comment on the selected post"
+    )
+    root = models.ForeignKey(
+        'self', null=True, blank=True, related_name='thread', on_delete=models.PROTECT,
+        db_index=False, editable=False, help_text="top-level post of the thread of a comment"
     )
+    likes_count = models.PositiveIntegerField(default=0, editable=False,
+                                              help_text="number of likes on the post")
+    shares_count = models.PositiveIntegerField(default=0, editable=False,
+                                               help_text="number of shares of the post")
+    reposts_count = models.PositiveIntegerField(default=0, editable=False,
+                                                help_text="number of reposts of the post")
+    comments_count = models.PositiveIntegerField(default=0, editable=False,
+                                                 help_text="number of active comments on the post")
+    # written by a database trigger from headline and body, on postgres only (see search())
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return f"{'POST' if not self.parent else 'COMMENT'} #{self.id} - {self.user.username}"
 
     def clean(self):
-        if self.parent and self.headline:
+        if self.parent_id and self.headline:
             raise ValidationError(f"comment can't have headline")
 
-        if self.parent and not self.is_active:
+        if self.parent_id and not self.is_active:
             raise ValidationError(f"can't post comment on an inactive post")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_is_active = instance.__dict__.get('is_active')
+        instance._stored_parent_id = instance.__dict__.get('parent_id')
+        return instance
+
+    @staticmethod
+    def new_slug_token():
+        # 80 random bits in base 36, so slugs stay unique without knowing the post id
+        value, token = secrets.randbits(80), ''
+        while value:
+            value, digit = divmod(value, 36)
+            token = SLUG_TOKEN_DIGITS[digit] + token
+        return token or '0'
+
+    def make_slug(self):
+        return f"{slugify(self.body[:45])}-{self.new_slug_token()}" if not self.parent_id else \
+            f"thread-{self.parent_id}-comment-{self.new_slug_token()}"
+
+    def get_root_id(self):
+        if not self.parent_id:
+            return None
+
+        if Post.parent.is_cached(self):
+            return self.parent.root_id or self.parent_id
+
+        root_id = Post.objects.filter(pk=self.parent_id).values_list('root_id', flat=True).first()
+        return root_id or self.parent_id
+
     def save(self, *args, **kwargs):
-        super(Post, self).save(*args, **kwargs)
+        was_active = False if self._state.adding else getattr(self, '_stored_is_active', None)
+
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # counters are only ever written with F() updates and the search vector by a trigger,
+            # never from a (stale) instance
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS and
+                field.name != 'search_vector'
+            ]
 
+        if self._state.adding or self.parent_id != getattr(self, '_stored_parent_id', None):
+            self.root_id = self.get_root_id()
         if not self.slug:
-            self.slug = f"{slugify(self.body[:45])}-{self.id}" if not self.parent else \
-                f"thread-{self.parent.id}-comment-{self.id}"
+            self.slug = self.make_slug()
+
+        with transaction.atomic():
+            super(Post, self).save(*args, **kwargs)
+
+            # the active comment counts on its parent, which may have changed too
+            counted_on = getattr(self, '_stored_parent_id', None) if was_active else None
+            counts_on = self.parent_id if self.is_active else None
+            if was_active is not None and counted_on != counts_on:
+                if counted_on:
+                    Post.update_counter(counted_on, 'comments_count', -1)
+                if counts_on:
+                    Post.update_counter(counts_on, 'comments_count', 1)
+
+        self._stored_is_active = self.is_active
+        self._stored_parent_id = self.parent_id
 
-        super(Post, self).save(*args, **kwargs)
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if self.parent_id and self.is_active:
+                Post.update_counter(self.parent_id, 'comments_count', -1)
+        return result
+
+    @classmethod
+    def update_counter(cls, post_id, field, delta):
+        cls.objects.filter(pk=post_id).update(**{field: F(field) + delta})
 
     def get_comments(self):
         return self.comments.filter(is_active=True)
@@ -83,14 +462,105 @@ class Post(models.Model):
 
         return self.interactions.all()
 
+    class Meta:
+        indexes = [
+            # home timeline: live top-level posts of followed users, latest first
+            models.Index(fields=['user', '-updated_at', '-id'], name='post_live_timeline_idx',
+                         condition=Q(parent__isnull=True, is_active=True, is_deleted=False)),
+            # post list: top-level posts, latest first
+            models.Index(fields=['-created_at'], name='post_top_level_created_idx',
+                         condition=Q(parent__isnull=True)),
+            # active comments of a post
+            models.Index(fields=['parent', 'is_active'], name='post_parent_active_idx'),
+            # active comments of a whole thread
+            models.Index(fields=['root', 'is_active'], name='post_root_active_idx'),
+        ]
+
+
+class PostInteractionQuerySet(models.QuerySet):
+    @staticmethod
+    def validate_items(items):
+        """
+        checks the shape of {'post': id, 'activity': name} interaction items, returns
+        ([(item index, post id, activity)] of well-formed items, {item index: errors})
+        """
+        errors, candidates = {}, []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors[index] = {'non_field_errors': ["expected an object with post and activity"]}
+                continue
+
+            item_errors = {}
+            try:
+                post_id = int(item.get('post'))
+            except (TypeError, ValueError):
+                item_errors['post'] = ["A valid integer is required."]
+
+            activity = item.get('activity')
+            if not isinstance(activity, str) or not Interaction.has_name(activity):
+                item_errors['activity'] = [f'"{activity}" is not a valid choice.']
+
+            if item_errors:
+                errors[index] = item_errors
+            else:
+                candidates.append((index, post_id, activity))
+
+        return candidates, errors
+
+    def ingest(self, user_id, items, request_ids=None):
+        """
+        validates and inserts a batch of {'post': id, 'activity': name} interactions of user with
+        set-based queries: one SELECT of the posts, one bulk INSERT and one counters UPDATE.
+        request_ids (aligned with items) are stored on the created interactions, making retried
+        batches idempotent.
+        returns (created interactions, {item index: errors}) for the items that were rejected.
+        """
+        candidates, errors = self.validate_items(items)
+
+        posts = {
+            post_id: parent_id for post_id, parent_id in
+            Post.objects.filter(pk__in={post_id for _, post_id, _ in candidates}, is_active=True)
+            .values_list('pk', 'parent_id')
+        }
+
+        interactions, deltas = [], {}
+        for index, post_id, activity in candidates:
+            if post_id not in posts:
+                errors[index] = {'post': [f'Invalid pk "{post_id}" - object does not exist.']}
+            elif activity != Interaction.like.name and posts[post_id] is not None:
+                errors[index] = {'validation_errors': ["comments can only be liked and can't be "
+                                                       "shared or reposted"]}
+            else:
+                interactions.append(self.model(
+                    user_id=user_id, post_id=post_id, activity=activity,
+                    request_id=request_ids[index] if request_ids else None
+                ))
+                counts = deltas.setdefault(post_id, {})
+                field = INTERACTION_COUNTERS[activity]
+                counts[field] = counts.get(field, 0) + 1
+
+        with transaction.atomic():
+            created = self.bulk_create(interactions)
+            Post.objects.increment_counters(deltas)
+
+        if created:
+            interactions_bulk_created.send(sender=self.model, interactions=created)
+        return created, errors
+
 
 class PostInteraction(models.Model):
     user = models.ForeignKey(User, on_delete=models.PROTECT, help_text="user taking action on "
                                                                        "the post")
-    post = models.ForeignKey(Post, related_name='interactions', on_delete=models.PROTECT)
+    post = models.ForeignKey(Post, related_name='interactions', on_delete=models.PROTECT,
+                             db_index=False)
     activity = models.CharField(choices=Interaction.choices(), max_length=20,
                                 help_text="describes action taken on the post")
     created_at = models.DateTimeField(auto_now_add=True)
+    request_id = models.UUIDField(null=True, blank=True, unique=True, editable=False,
+                                  help_text="id of the buffered request that created the "
+                                            "interaction, if written behind")
+
+    objects = PostInteractionQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.post} - {self.activity}(d) by {self.user.username}"
@@ -102,6 +572,97 @@ class PostInteraction(models.Model):
         if not self.post.is_active:
             raise ValidationError(f"can't publish activity on an inactive post")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_post_id = instance.__dict__.get('post_id')
+        instance._stored_activity = instance.__dict__.get('activity')
+        return instance
+
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
+        stored = None if self._state.adding else \
+            (getattr(self, '_stored_post_id', None), getattr(self, '_stored_activity', None))
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if stored is None:
+                Post.update_counter(self.post_id, INTERACTION_COUNTERS[self.activity], 1)
+            elif None not in stored and stored != (self.post_id, self.activity):
+                # moved to another post and / or activity
+                Post.update_counter(stored[0], INTERACTION_COUNTERS[stored[1]], -1)
+                Post.update_counter(self.post_id, INTERACTION_COUNTERS[self.activity], 1)
+
+        self._stored_post_id = self.post_id
+        self._stored_activity = self.activity
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Post.update_counter(self.post_id, INTERACTION_COUNTERS[self.activity], -1)
+        return result
+
+    class Meta:
+        indexes = [
+            # interactions of a post by activity (also serves post FK lookups)
+            models.Index(fields=['post', 'activity'], name='interaction_post_activity_idx'),
+        ]
+
+
+class ArchivedPost(models.Model):
+    """
+    Post moved out of the posts table with its whole thread (see blogging.archive.PostArchive),
+    keeping its id and counters. Archived threads are read only.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, related_name='+', on_delete=models.PROTECT, db_index=False,
+                             db_constraint=False)
+    slug = models.CharField(max_length=128)
+    headline = models.CharField(max_length=250, null=True, blank=True)
+    body = models.TextField(max_length=1000)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    is_active = models.BooleanField(default=True)
+    is_deleted = models.BooleanField(default=False)
+    parent = models.ForeignKey('self', null=True, blank=True, related_name='comments',
+                               on_delete=models.DO_NOTHING, db_index=False, db_constraint=False)
+    root = models.ForeignKey('self', null=True, blank=True, related_name='thread',
+                             on_delete=models.DO_NOTHING, db_index=False, db_constraint=False)
+    likes_count = models.PositiveIntegerField(default=0)
+    shares_count = models.PositiveIntegerField(default=0)
+    reposts_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"ARCHIVED {'POST' if not self.parent_id else 'COMMENT'} #{self.id}"
+
+    class Meta:
+        indexes = [
+            # active comments of a whole thread
+            models.Index(fields=['root', 'is_active'], name='archived_post_root_idx'),
+        ]
+
+
+class ArchivedPostInteraction(models.Model):
+    """
+    Interaction moved to the archive with the thread of its post. On postgres the table is range
+    partitioned by month on created_at (see blogging.archive.PostArchive.ensure_partitions()).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, related_name='+', on_delete=models.PROTECT, db_index=False,
+                             db_constraint=False)
+    post = models.ForeignKey(ArchivedPost, related_name='interactions',
+                             on_delete=models.DO_NOTHING, db_index=False, db_constraint=False)
+    activity = models.CharField(choices=Interaction.choices(), max_length=20)
+    created_at = models.DateTimeField()
+    request_id = models.UUIDField(null=True, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"ARCHIVED {self.activity} #{self.id} of post #{self.post_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'activity'], name='archived_interaction_post_idx'),
+        ]
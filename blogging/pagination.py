@@ -0,0 +1,161 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+from blogging.constants import TIMELINE_PAGE_SIZE, TIMELINE_MAX_PAGE_SIZE, SEARCH_PAGE_SIZE, \
+    SEARCH_MAX_PAGE_SIZE
+from blogging.timeline import TimelineStore
+
+
+class TimelineCursorPagination:
+    """
+    Keyset pagination of a user's home timeline on (updated_at, id).
+
+    Cursors are opaque strings encoding the direction ('n'ext = older posts, 'p'revious = newer
+    posts) and the (updated_at, id) position of the last / first post of the current page.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.request = None
+        self.next_position = None
+        self.previous_position = None
+        self.fan_out_on_read_authors = []
+
+    @staticmethod
+    def encode_cursor(direction, position):
+        return urlsafe_b64encode(f"{direction}:{position[0]}:{position[1]}".encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, None
+
+        try:
+            direction, score, post_id = urlsafe_b64decode(encoded.encode()).decode().split(':')
+            if direction not in ('n', 'p'):
+                raise ValueError
+            return direction, (int(score), int(post_id))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return TIMELINE_PAGE_SIZE
+
+        return min(page_size, TIMELINE_MAX_PAGE_SIZE) if page_size > 0 else TIMELINE_PAGE_SIZE
+
+    def get_page_cache_key(self, request):
+        """
+        identifies the requested page among the cached pages of a timeline
+        """
+        return f"{request.query_params.get(self.cursor_query_param, '')}:" \
+               f"{self.get_page_size(request)}"
+
+    def paginate_timeline(self, user, request):
+        """
+        returns ids of the posts on the requested timeline page, newest first
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        direction, position = self.decode_cursor(request)
+        authors = self.fan_out_on_read_authors = \
+            TimelineStore.get_followed_fan_out_on_read_authors(user)
+
+        if direction == 'p':
+            entries = TimelineStore.get_entries(user, page_size + 1, after=position,
+                                                authors=authors)
+            has_more = len(entries) > page_size
+            page = entries[-page_size:]
+            self.previous_position = page[0] if page and has_more else None
+            self.next_position = page[-1] if page else None
+        else:
+            entries = TimelineStore.get_entries(user, page_size + 1, before=position,
+                                                authors=authors)
+            has_more = len(entries) > page_size
+            page = entries[:page_size]
+            self.next_position = page[-1] if page and has_more else None
+            self.previous_position = page[0] if page and direction else None
+
+        return [post_id for _, post_id in page]
+
+    def get_link(self, direction, position):
+        if position is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'update_cache')
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(direction, position))
+
+    def get_next_link(self):
+        return self.get_link('n', self.next_position)
+
+    def get_previous_link(self):
+        return self.get_link('p', self.previous_position)
+
+
+class PostSearchPagination:
+    """
+    Keyset pagination of full-text search results on (rank, id), most relevant first.
+    Cursors are opaque strings encoding the (rank, id) of the last result of the previous page.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.request = None
+        self.next_position = None
+
+    @staticmethod
+    def encode_cursor(position):
+        return urlsafe_b64encode(f"{position[0]!r}:{position[1]}".encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            rank, post_id = urlsafe_b64decode(encoded.encode()).decode().split(':')
+            return float(rank), int(post_id)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return SEARCH_PAGE_SIZE
+
+        return min(page_size, SEARCH_MAX_PAGE_SIZE) if page_size > 0 else SEARCH_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request):
+        """
+        returns the requested page of a queryset annotated with `rank`
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            rank, post_id = position
+            queryset = queryset.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=post_id))
+
+        results = list(queryset.order_by('-rank', '-id')[:page_size + 1])
+        page = results[:page_size]
+        self.next_position = (page[-1].rank, page[-1].id) if len(results) > page_size else None
+        return page
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param,
+                                   self.encode_cursor(self.next_position))
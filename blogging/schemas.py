@@ -2,7 +2,8 @@ import coreapi
 import coreschema
 from rest_framework.schemas import AutoSchema, ManualSchema
 
-from blogging.enums import Interaction
+from blogging.constants import TRENDING_WINDOWS
+from blogging.enums import Interaction, ThreadOrdering
 
 PostInteractionViewSetSchema = AutoSchema(
         manual_fields=[
@@ -43,6 +44,37 @@ FollowUserViewSchema = ManualSchema(
         encoding='application/json'
     )
 
+UnfollowUserViewSchema = ManualSchema(
+        fields=[
+            coreapi.Field(
+                name="user_id",
+                location='form',            # possible values: path, query, body, form
+                required=True,
+                schema=coreschema.Integer(description="user id to unfollow"),
+                type=int,
+                description='{"user_id": int}',
+                example='',
+            ),
+        ],
+        encoding='application/json'
+    )
+
+BulkFollowUserViewSchema = ManualSchema(
+        fields=[
+            coreapi.Field(
+                name="user_ids",
+                location='form',            # possible values: path, query, body, form
+                required=True,
+                schema=coreschema.Array(items=coreschema.Integer(),
+                                        description="user ids to follow"),
+                type=list,
+                description='{"user_ids": [int]}',
+                example='',
+            ),
+        ],
+        encoding='application/json'
+    )
+
 TimelineViewSchema = AutoSchema(
         manual_fields=[
             coreapi.Field(
@@ -54,5 +86,171 @@ TimelineViewSchema = AutoSchema(
                 description='',
                 example='',
             ),
+            coreapi.Field(
+                name="cursor",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.String(description="pagination cursor from `next` / "
+                                                     "`previous` links"),
+                type=str,
+                description='',
+                example='',
+            ),
+            coreapi.Field(
+                name="page_size",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.Integer(description="number of posts per page"),
+                type=int,
+                description='',
+                example='',
+            ),
+        ]
+    )
+
+ThreadViewSchema = AutoSchema(
+        manual_fields=[
+            coreapi.Field(
+                name="ordering",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.Enum(description="order of the replies of each level",
+                                       enum=ThreadOrdering.names()),
+                type=str,
+                description='',
+                example='',
+            ),
+            coreapi.Field(
+                name="page_size",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.Integer(description="number of replies per level"),
+                type=int,
+                description='',
+                example='',
+            ),
+            coreapi.Field(
+                name="offset",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.Integer(description="number of replies of the requested "
+                                                      "post / comment to skip"),
+                type=int,
+                description='',
+                example='',
+            ),
+            coreapi.Field(
+                name="depth",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.Integer(description="deepest reply level to return"),
+                type=int,
+                description='',
+                example='',
+            ),
+        ]
+    )
+
+PostSearchViewSchema = AutoSchema(
+        manual_fields=[
+            coreapi.Field(
+                name="q",
+                location='query',            # possible values: path, query, body, form
+                required=True,
+                schema=coreschema.String(description="words / \"phrases\" to search for"),
+                type=str,
+                description='',
+                example='',
+            ),
+            coreapi.Field(
+                name="user",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.Integer(description="author ID"),
+                type=int,
+                description='',
+                example='',
+            ),
+            coreapi.Field(
+                name="since",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.String(description="earliest creation date / datetime "
+                                                     "(ISO 8601)"),
+                type=str,
+                description='',
+                example='',
+            ),
+            coreapi.Field(
+                name="until",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.String(description="latest creation date / datetime "
+                                                     "(ISO 8601)"),
+                type=str,
+                description='',
+                example='',
+            ),
+            coreapi.Field(
+                name="type",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.Enum(description="search posts or comments only",
+                                       enum=['post', 'comment']),
+                type=str,
+                description='',
+                example='',
+            ),
+            coreapi.Field(
+                name="cursor",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.String(description="position of the requested page"),
+                type=str,
+                description='',
+                example='',
+            ),
+            coreapi.Field(
+                name="page_size",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.Integer(description="number of results per page"),
+                type=int,
+                description='',
+                example='',
+            ),
+        ]
+    )
+
+TrendingViewSchema = AutoSchema(
+        manual_fields=[
+            coreapi.Field(
+                name="window",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.Enum(description="time window the posts trend over",
+                                       enum=list(TRENDING_WINDOWS)),
+                type=str,
+                description='',
+                example='',
+            ),
+            coreapi.Field(
+                name="offset",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.Integer(description="number of trending posts to skip"),
+                type=int,
+                description='',
+                example='',
+            ),
+            coreapi.Field(
+                name="page_size",
+                location='query',            # possible values: path, query, body, form
+                required=False,
+                schema=coreschema.Integer(description="number of posts per page"),
+                type=int,
+                description='',
+                example='',
+            ),
         ]
     )
@@ -1,11 +1,16 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
+from blogging.cache import PostCache
+from blogging.constants import FOLLOW_BATCH_MAX_SIZE
 from blogging.enums import Interaction
-from blogging.models import Post, Followers, PostInteraction
+from blogging.models import Post, Followers, PostInteraction, UserStats, ENGAGEMENT_ANNOTATIONS
+from blogging.timeline import TimelineStore
+from core.instrumentation import InstrumentedSerializerMixin
 
 
-class UserSerializer(serializers.HyperlinkedModelSerializer):
+class UserSerializer(InstrumentedSerializerMixin, serializers.HyperlinkedModelSerializer):
     followers = serializers.SerializerMethodField()
     following = serializers.SerializerMethodField()
 
@@ -15,14 +20,14 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
 
     @classmethod
     def get_followers(cls, obj):
-        return obj.followers.filter(is_active=True).count()
+        return UserStats.get_count(obj, 'followers_count')
 
     @classmethod
     def get_following(cls, obj):
-        return obj.following.filter(is_active=True).count()
+        return UserStats.get_count(obj, 'following_count')
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     likes = serializers.SerializerMethodField()
     comment = serializers.SerializerMethodField()
     share = serializers.SerializerMethodField()
@@ -33,24 +38,29 @@ class PostSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'headline', 'body', 'parent', 'is_active', 'is_deleted',
                   'created_at', 'updated_at', 'likes', 'comment', 'share', 'repost')
 
+    @staticmethod
+    def get_count(obj, field):
+        # counts annotated by Post.objects.with_engagement() take precedence over stored counters
+        return getattr(obj, ENGAGEMENT_ANNOTATIONS[field], getattr(obj, field))
+
     @classmethod
     def get_likes(cls, obj):
-        return obj.get_interactions(activity=Interaction.like.name).count()
+        return cls.get_count(obj, 'likes_count')
 
     @classmethod
     def get_comment(cls, obj):
-        return obj.get_comments().count()
+        return cls.get_count(obj, 'comments_count')
 
     @classmethod
     def get_share(cls, obj):
-        return obj.get_interactions(activity=Interaction.share.name).count()
+        return cls.get_count(obj, 'shares_count')
 
     @classmethod
     def get_repost(cls, obj):
-        return obj.get_interactions(activity=Interaction.repost.name).count()
+        return cls.get_count(obj, 'reposts_count')
 
 
-class PostInteractionSerializer(serializers.ModelSerializer):
+class PostInteractionSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(
         required=True, queryset=User.objects.all()
     )
@@ -64,7 +74,7 @@ class PostInteractionSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class FollowUserSerializer(serializers.ModelSerializer):
+class FollowUserSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(
         required=True, queryset=User.objects.all()
     )
@@ -77,7 +87,21 @@ class FollowUserSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class TimelineSerializer(serializers.ModelSerializer):
+class FollowRequestSerializer(serializers.Serializer):
+    user_id = serializers.IntegerField(min_value=1)
+
+    def validate_user_id(self, value):
+        if value == self.context['request'].user.id:
+            raise serializers.ValidationError("user and following_user can't be same")
+        return value
+
+
+class BulkFollowRequestSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(child=serializers.IntegerField(min_value=1),
+                                     allow_empty=False, max_length=FOLLOW_BATCH_MAX_SIZE)
+
+
+class TimelineSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(
         write_only=True, required=True, queryset=User.objects.all()
     )
@@ -87,12 +111,38 @@ class TimelineSerializer(serializers.ModelSerializer):
         model = User
         fields = ('user', 'id', 'username', 'email', 'first_name', 'last_name', 'posts')
 
-    @classmethod
-    def get_posts(cls, obj):
-        following_users = list(
-            obj.following.filter(is_active=True).values_list('user_id', flat=True)
-        )
-        following_users.append(obj.id)
-        posts = Post.objects.filter(user_id__in=following_users, parent__isnull=True,
-                                    is_active=True, is_deleted=False).order_by('-updated_at')
-        return PostSerializer(posts, many=True, read_only=True).data
+    @staticmethod
+    def get_payloads(post_ids):
+        payloads = PostCache.get_many(post_ids)
+        missing = [post_id for post_id in post_ids if post_id not in payloads]
+        if missing:
+            posts = PostSerializer(TimelineStore.live_posts().filter(id__in=missing), many=True,
+                                   read_only=True).data
+            PostCache.set_many(posts)
+            payloads.update((post['id'], post) for post in posts)
+        return payloads
+
+    @staticmethod
+    async def ahydrate(post_ids, payloads):
+        """
+        async counterpart of get_payloads() completing the cached payloads read beforehand
+        """
+        missing = [post_id for post_id in post_ids if post_id not in payloads]
+        if missing:
+            posts = PostSerializer([post async for post in
+                                    TimelineStore.live_posts().filter(id__in=missing)],
+                                   many=True, read_only=True).data
+            await sync_to_async(PostCache.set_many)(posts)
+            payloads.update((post['id'], post) for post in posts)
+        return payloads
+
+    def get_posts(self, obj):
+        post_ids = self.context.get('post_ids')
+        if post_ids is None:
+            post_ids = TimelineStore.get_post_ids(obj)
+
+        payloads = self.context.get('payloads')
+        if payloads is None:
+            payloads = self.get_payloads(post_ids)
+
+        return [payloads[post_id] for post_id in post_ids if post_id in payloads]
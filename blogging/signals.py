@@ -0,0 +1,155 @@
+from collections import defaultdict
+from copy import copy
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from blogging.cache import PostCache, TimelineCache
+from blogging.graph import FollowGraph
+from blogging.models import Post, PostInteraction, Followers, interactions_bulk_created, \
+    follows_changed, posts_bulk_created, posts_archived
+from blogging.timeline import TimelineStore
+from blogging.trending import TrendingStore
+
+
+def sync_post(post, deleted=False):
+    """
+    patches cached post payloads and the stored timelines holding the post after it changed
+    """
+    PostCache.invalidate(post.id, post.parent_id)
+    if post.parent_id:
+        return
+
+    if not deleted and post.is_active and not post.is_deleted:
+        recipients, fan_out_on_read = TimelineStore.fan_out(post)
+    else:
+        recipients, fan_out_on_read = TimelineStore.remove(post)
+
+    TimelineCache.bump(recipients)
+    if fan_out_on_read:
+        TimelineCache.bump_author(post.user_id)
+
+
+def sync_imported_posts(posts):
+    PostCache.invalidate(*{post.parent_id for post in posts if post.parent_id})
+    TrendingStore.record([(post.root_id, TrendingStore.COMMENT, post.created_at, 1)
+                          for post in posts if post.parent_id and post.is_active])
+
+    by_author = defaultdict(list)
+    for post in posts:
+        if not post.parent_id and post.is_active and not post.is_deleted:
+            by_author[post.user_id].append(post)
+
+    for author_id, author_posts in by_author.items():
+        recipients, fan_out_on_read = TimelineStore.fan_out_many(author_id, author_posts)
+        TimelineCache.bump(recipients)
+        if fan_out_on_read:
+            TimelineCache.bump_author(author_id)
+
+
+def sync_archived_posts(posts):
+    PostCache.invalidate(*[post.id for post in posts if post.parent_id])
+    for post in posts:
+        if not post.parent_id:
+            sync_post(post, deleted=True)
+
+
+def get_root_ids(interactions):
+    """
+    returns {post id: id of the top-level post of its thread} of the posts of interactions
+    """
+    root_ids = {interaction.post_id: interaction.post.root_id or interaction.post_id
+                for interaction in interactions if PostInteraction.post.is_cached(interaction)}
+    missing = {interaction.post_id for interaction in interactions} - root_ids.keys()
+    if missing:
+        root_ids.update({post_id: root_id or post_id for post_id, root_id in
+                         Post.objects.filter(pk__in=missing).values_list('id', 'root_id')})
+    return root_ids
+
+
+def sync_interactions(interactions, sign=1):
+    PostCache.invalidate(*{interaction.post_id for interaction in interactions})
+    # interactions with comments count towards the trending score of their thread's post
+    root_ids = get_root_ids(interactions)
+    TrendingStore.record([
+        (root_ids.get(interaction.post_id, interaction.post_id), interaction.activity,
+         interaction.created_at, sign)
+        for interaction in interactions
+    ])
+
+
+def sync_follow(follower, deleted=False):
+    if not deleted and follower.is_active:
+        FollowGraph.follow(follower.following_user_id, follower.user_id)
+        TimelineStore.follow(follower.following_user_id, follower.user_id)
+    else:
+        FollowGraph.unfollow(follower.following_user_id, follower.user_id)
+        TimelineStore.unfollow(follower.following_user_id, follower.user_id)
+
+    TimelineCache.bump([follower.following_user_id])
+
+
+@receiver(post_save, sender=Post, dispatch_uid='post_saved')
+def post_saved(sender, instance, created=False, **kwargs):
+    transaction.on_commit(lambda: sync_post(instance))
+    if created and instance.parent_id and instance.is_active:
+        transaction.on_commit(lambda: TrendingStore.record(
+            [(instance.root_id, TrendingStore.COMMENT, instance.created_at, 1)]
+        ))
+
+
+@receiver(post_delete, sender=Post, dispatch_uid='post_deleted')
+def post_deleted(sender, instance, **kwargs):
+    # delete() clears the pk of instance before the transaction commits
+    post = copy(instance)
+    transaction.on_commit(lambda: sync_post(post, deleted=True))
+
+
+@receiver(posts_bulk_created, sender=Post, dispatch_uid='posts_imported')
+def posts_imported(sender, posts, **kwargs):
+    transaction.on_commit(lambda: sync_imported_posts(posts))
+
+
+@receiver(posts_archived, sender=Post, dispatch_uid='posts_archived')
+def posts_moved_to_archive(sender, posts, **kwargs):
+    transaction.on_commit(lambda: sync_archived_posts(posts))
+
+
+@receiver(post_save, sender=PostInteraction, dispatch_uid='interaction_saved')
+def interaction_saved(sender, instance, created=False, **kwargs):
+    if created:
+        transaction.on_commit(lambda: sync_interactions([instance]))
+    else:
+        # the interaction may have moved from another post (see PostInteraction.save())
+        post_ids = {instance.post_id, getattr(instance, '_stored_post_id', None)}
+        transaction.on_commit(lambda: PostCache.invalidate(*post_ids))
+
+
+@receiver(post_delete, sender=PostInteraction, dispatch_uid='interaction_deleted')
+def interaction_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: sync_interactions([instance], sign=-1))
+
+
+@receiver(interactions_bulk_created, sender=PostInteraction, dispatch_uid='interactions_created')
+def interactions_created(sender, interactions, **kwargs):
+    transaction.on_commit(lambda: sync_interactions(interactions))
+
+
+@receiver(post_save, sender=Followers, dispatch_uid='follow_saved')
+def follow_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: sync_follow(instance))
+
+
+@receiver(post_delete, sender=Followers, dispatch_uid='follow_deleted')
+def follow_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: sync_follow(instance, deleted=True))
+
+
+@receiver(follows_changed, sender=Followers, dispatch_uid='follows_changed')
+def follows_upserted(sender, followers, **kwargs):
+    def sync():
+        for follower in followers:
+            sync_follow(follower)
+
+    transaction.on_commit(sync)
@@ -1,3 +1,1097 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+import redis
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import permissions
+from rest_framework.test import APITestCase
+from rest_framework.throttling import UserRateThrottle
+
+from blogging.buffer import ActivityBuffer
+from blogging.cache import PostCache, TimelineCache, ResponseCache
+from blogging.codecs import PayloadCodec
+from blogging.enums import Interaction
+from blogging.graph import FollowGraph
+from blogging.models import Post, PostInteraction, Followers, UserStats, ArchivedPost, \
+    ArchivedPostInteraction, ENGAGEMENT_ANNOTATIONS
+from blogging.serializers import TimelineSerializer
+from blogging.timeline import TimelineStore
+from blogging.trending import TrendingStore
+from blogging.views import AsyncTimelineView
+from core.db_router import ReplicaHealth, ReplicaRouter
+from core.instrumentation import MetricsRegistry, QueryBudgetExceeded
+from core.local_cache import LocalCache, MISSING
+from core.redis_helper import RedisInterface
+
+
+class TimelineStoreTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author, self.reader, self.other = User.objects.bulk_create(
+            [User(username=name) for name in ('author', 'reader', 'other')]
+        )
+        self.follow(self.author)
+
+    def follow(self, author, is_active=True):
+        with self.captureOnCommitCallbacks(execute=True):
+            Followers.objects.update_or_create(user=author, following_user=self.reader,
+                                               defaults={'is_active': is_active})
+
+    def create_post(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post(user=user, body="post")
+            post.save()
+        return post
+
+    def get_stored_ids(self):
+        return [post_id for _, post_id in TimelineStore.get_stored_entries(self.reader.id, 10)]
+
+    def test_posts_fan_out_on_write(self):
+        TimelineStore.get_post_ids(self.reader)         # builds the stored timeline
+        first, second = self.create_post(self.author), self.create_post(self.author)
+        self.create_post(self.other)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(TimelineStore.get_post_ids(self.reader), [second.id, first.id])
+
+    def test_deleted_posts_are_removed(self):
+        first, second = self.create_post(self.author), self.create_post(self.author)
+        self.assertEqual(TimelineStore.get_post_ids(self.reader), [second.id, first.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.is_deleted = True
+            first.save()
+            second.delete()
+        self.assertEqual(TimelineStore.get_post_ids(self.reader), [])
+
+    def test_big_authors_fan_out_on_read(self):
+        TimelineStore.get_post_ids(self.reader)
+        with patch('blogging.graph.FANOUT_FOLLOWER_LIMIT', 0):
+            post = self.create_post(self.author)
+            self.assertEqual(self.get_stored_ids(), [])
+            self.assertEqual(TimelineStore.get_post_ids(self.reader), [post.id])
+
+        # back under the limit, the author's earlier posts are pushed with the next one
+        newer = self.create_post(self.author)
+        self.assertEqual(self.get_stored_ids(), [newer.id, post.id])
+        self.assertEqual(TimelineStore.get_post_ids(self.reader), [newer.id, post.id])
+
+    def test_follow_and_unfollow_update_stored_timeline(self):
+        self.follow(self.author, is_active=False)
+        post = self.create_post(self.author)
+        self.assertEqual(TimelineStore.get_post_ids(self.reader), [])
+
+        self.follow(self.author)
+        self.assertEqual(self.get_stored_ids(), [post.id])
+        self.follow(self.author, is_active=False)
+        self.assertEqual(self.get_stored_ids(), [])
+
+
+class TimelinePaginationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='reader')
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                Post(user=self.user, body=f"post {i}").save()
+
+    def get_page(self, url, params=None):
+        data = self.client.get(url, params).json()
+        return [post['body'] for post in data['posts']], data['next'], data['previous']
+
+    def test_next_and_previous_links(self):
+        posts, next_link, previous_link = self.get_page(reverse('retrieve_user_timeline'),
+                                                        {'page_size': 2})
+        self.assertEqual((posts, previous_link), (["post 4", "post 3"], None))
+        posts, next_link, previous_link = self.get_page(next_link)
+        self.assertEqual(posts, ["post 2", "post 1"])
+        posts, last_next_link, last_previous_link = self.get_page(next_link)
+        self.assertEqual((posts, last_next_link), (["post 0"], None))
+
+        # back towards newer posts, reversing direction
+        posts, next_link, previous_link = self.get_page(last_previous_link)
+        self.assertEqual(posts, ["post 2", "post 1"])
+        self.assertEqual(self.get_page(next_link)[0], ["post 0"])
+        posts, _, previous_link = self.get_page(previous_link)
+        self.assertEqual((posts, previous_link), (["post 4", "post 3"], None))
+
+    def test_invalid_cursor_is_not_found(self):
+        url = reverse('retrieve_user_timeline')
+        for cursor in ('not-a-cursor', urlsafe_b64encode(b"x:1:2").decode(),
+                       urlsafe_b64encode(b"n:score:2").decode()):
+            self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 404)
+
+
+class PostCountersTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='author')
+        self.first, self.second = [Post.objects.create(user=self.user, body=f"post {i}")
+                                   for i in range(2)]
+
+    def get_counters(self, post):
+        post.refresh_from_db()
+        return [getattr(post, field) for field in Post.COUNTER_FIELDS]
+
+    @staticmethod
+    def get_cached_likes(post):
+        return TimelineSerializer.get_payloads([post.id])[post.id]['likes']
+
+    def test_counters_follow_updated_parent_and_activity(self):
+        comment = Post.objects.create(user=self.user, body="comment", parent=self.first)
+        comment = Post.objects.get(pk=comment.pk)
+        comment.parent = self.second
+        comment.save()
+        self.assertEqual(self.get_counters(self.first), [0, 0, 0, 0])
+        self.assertEqual(self.get_counters(self.second), [0, 0, 0, 1])
+
+        comment.is_active = False
+        comment.save()
+        self.assertEqual(self.get_counters(self.second), [0, 0, 0, 0])
+
+        PostInteraction(user=self.user, post=self.first, activity=Interaction.like.name).save()
+        interaction = PostInteraction.objects.get()
+        interaction.post, interaction.activity = self.second, Interaction.share.name
+        interaction.save()
+        self.assertEqual(self.get_counters(self.first), [0, 0, 0, 0])
+        self.assertEqual(self.get_counters(self.second), [0, 1, 0, 0])
+
+    def test_rebuild_repairs_drifted_counters(self):
+        Post.objects.create(user=self.user, body="comment", parent=self.first)
+        PostInteraction(user=self.user, post=self.first, activity=Interaction.like.name).save()
+        Post.objects.filter(pk=self.first.pk).update(likes_count=5, comments_count=0)
+        Post.objects.filter(pk=self.second.pk).update(reposts_count=2)
+
+        call_command('rebuild_post_counters', dry_run=True, stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.get_counters(self.first), [5, 0, 0, 0])
+
+        self.assertEqual(self.get_cached_likes(self.first), 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_post_counters', batch_size=1, stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.get_counters(self.first), [1, 0, 0, 1])
+        self.assertEqual(self.get_counters(self.second), [0, 0, 0, 0])
+        self.assertEqual(self.get_cached_likes(self.first), 1)
+
+
+class CacheInvalidationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author, self.reader = User.objects.bulk_create(
+            [User(username=name) for name in ('author', 'reader')]
+        )
+        self.client.force_authenticate(self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            Followers.objects.create(user=self.author, following_user=self.reader)
+            self.post = Post(user=self.author, body="post")
+            self.post.save()
+
+    def get_timeline(self):
+        return self.client.get(reverse('retrieve_user_timeline')).json()['posts']
+
+    def assertInvalidated(self, change):
+        """
+        runs change, checking it drops the cached payload and bumps the version of the post
+        """
+        self.get_timeline()             # caches the page and the post payload
+        self.assertIn(self.post.id, PostCache.get_many([self.post.id]))
+        post_version = PostCache.get_versions([self.post.id])[self.post.id]
+        list_version = PostCache.get_list_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertEqual(PostCache.get_many([self.post.id]), {})
+        self.assertGreater(PostCache.get_versions([self.post.id])[self.post.id], post_version)
+        self.assertGreater(PostCache.get_list_version(), list_version)
+
+    def test_edit_invalidates_post_and_timeline(self):
+        timeline_version = TimelineCache.get_version(self.reader.id)
+        self.post.body = "edited"
+        self.assertInvalidated(self.post.save)
+
+        self.assertGreater(TimelineCache.get_version(self.reader.id), timeline_version)
+        self.assertEqual([post['body'] for post in self.get_timeline()], ["edited"])
+
+    def test_soft_delete_drops_post_from_timeline(self):
+        self.post.is_deleted = True
+        self.assertInvalidated(self.post.save)
+        self.assertEqual(self.get_timeline(), [])
+
+    def test_interaction_invalidates_post(self):
+        self.assertInvalidated(lambda: PostInteraction(
+            user=self.reader, post=self.post, activity=Interaction.like.name
+        ).save())
+        self.assertEqual(self.get_timeline()[0]['likes'], 1)
+
+
+class PostListQueryCountTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='author')
+        self.fan = User.objects.create(username='fan')
+        self.client.force_authenticate(self.user)
+
+    def create_posts(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                post = Post(user=self.user, headline=f"post {i}", body=f"body of post {i}")
+                post.save()
+                Post(user=self.fan, body=f"comment on post {i}", parent=post).save()
+                for activity in Interaction.names():
+                    PostInteraction(user=self.fan, post=post, activity=activity).save()
+
+    def test_with_engagement_annotates_counts(self):
+        self.create_posts(1)
+        post = Post.objects.with_engagement().get(parent__isnull=True)
+
+        self.assertEqual((post.num_likes, post.num_shares, post.num_reposts, post.num_comments),
+                         (1, 1, 1, 1))
+
+    def test_post_list_query_count_is_constant(self):
+        self.create_posts(2)
+        with self.assertNumQueries(2):          # pagination COUNT + page SELECT
+            response = self.client.get(reverse('post-list'))
+        self.assertEqual(len(response.json()['results']), 2)
+
+        self.create_posts(8)
+        with self.assertNumQueries(2) as queries:
+            response = self.client.get(reverse('post-list'))
+        self.assertEqual(len(response.json()['results']), 10)
+        # counts are read from the stored counters, not recomputed per row
+        self.assertNotIn(PostInteraction._meta.db_table, queries.captured_queries[-1]['sql'])
+        self.assertTrue(all(post['likes'] == post['comment'] == 1
+                            for post in response.json()['results']))
+
+    def test_unchanged_post_list_is_not_modified(self):
+        self.create_posts(1)
+        url = reverse('post-list')
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                             .status_code, 304)
+            self.assertEqual(self.client.get(url).content, response.content)   # pre-rendered
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PostInteraction(user=self.user, post=Post.objects.first(), activity='like').save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.json()['results'][0]['likes'], 2)
+
+
+class QueryPlanTestCase(TestCase):
+    """
+    guards the indexes the hot read paths rely on against query or schema changes
+    """
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f"user-{i}") for i in range(20)])
+        posts = Post.objects.bulk_create([Post(user=users[i % 20], slug=f"post-{i}", body="post")
+                                          for i in range(400)])
+        Post.objects.bulk_create([Post(user=users[0], slug=f"comment-{i}", body="comment",
+                                       parent=posts[0]) for i in range(40)])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user_ids = [user.id for user in users]
+
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_timeline_queries_use_indexes(self):
+        live_posts = TimelineStore.live_posts().order_by('-updated_at', '-id')
+        self.assertUsesIndex(live_posts.filter(user_id=self.user_ids[0]), 'post_live_timeline_idx')
+        self.assertUsesIndex(live_posts.filter(user_id__in=self.user_ids[:5]),
+                             'post_live_timeline_idx')
+        self.assertUsesIndex(Post.objects.filter(parent__isnull=True).order_by('-created_at')[:10],
+                             'post_top_level_created_idx')
+        self.assertUsesIndex(Post.objects.filter(parent_id=1, is_active=True),
+                             'post_parent_active_idx')
+
+    def test_follower_and_interaction_queries_use_indexes(self):
+        user_id = self.user_ids[0]
+        self.assertUsesIndex(Followers.objects.filter(user_id=user_id, is_active=True)
+                             .values_list('following_user_id'), 'followers_followed_idx')
+        self.assertUsesIndex(Followers.objects.filter(following_user_id=user_id, is_active=True)
+                             .values_list('user_id'), 'followers_following_idx')
+        self.assertUsesIndex(PostInteraction.objects.filter(post_id=1, activity='like'),
+                             'interaction_post_activity_idx')
+
+
+class PostCreateTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='author')
+
+    def test_post_is_stored_with_one_insert(self):
+        with self.assertNumQueries(3):          # savepoint + INSERT + release
+            post = Post.objects.create(user=self.user, body="Hello world")
+        self.assertRegex(post.slug, r'^hello-world-[0-9a-z]+$')
+
+        with self.assertNumQueries(4):          # + parent's comments counter
+            comment = Post.objects.create(user=self.user, body="comment", parent=post)
+        self.assertEqual((comment.root_id, Post.objects.get(pk=post.pk).comments_count),
+                         (post.id, 1))
+
+    def test_bulk_import(self):
+        post = Post.objects.create(user=self.user, body="post")
+        count = Post.objects.bulk_import(
+            [Post(user=self.user, body="same body") for _ in range(5)] +
+            [Post(user=self.user, body="comment", parent=post) for _ in range(2)], batch_size=3
+        )
+
+        self.assertEqual(count, 7)
+        self.assertEqual(Post.objects.filter(body="same body").values('slug').distinct().count(), 5)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(list(post.thread.values_list('root_id', flat=True)), [post.id] * 2)
+
+
+class CommentThreadTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='author')
+        self.client.force_authenticate(self.user)
+        self.post = Post(user=self.user, body="post")
+        self.post.save()
+        self.comments = []
+        parent = self.post
+        for depth in range(4):
+            for i in range(3):
+                comment = Post(user=self.user, body=f"comment {depth}.{i}", parent=parent)
+                comment.save()
+                self.comments.append(comment)
+            parent = comment
+
+    def add_level(self, depth, parent):
+        for i in range(3):
+            comment = Post(user=self.user, body=f"comment {depth}.{i}", parent=parent)
+            comment.save()
+        return comment
+
+    def test_thread_is_loaded_in_constant_queries(self):
+        url = reverse('post-thread', args=[self.post.id])
+        for depth in (4, 7):
+            parent = self.comments[-1]
+            for level in range(4, depth):
+                parent = self.add_level(level, parent)
+            with self.assertNumQueries(2):          # post + all comments of its thread
+                response = self.client.get(url, {'page_size': 2})
+
+            level, levels = response.data, 0
+            while level['replies']:
+                self.assertEqual((level['replies_count'], level['has_more']), (3, True))
+                self.assertEqual([reply['body'] for reply in level['replies']],
+                                 [f"comment {levels}.2", f"comment {levels}.1"])
+                level, levels = level['replies'][0], levels + 1
+            self.assertEqual(levels, depth)
+
+        with self.assertNumQueries(2):          # levels below depth aren't read
+            response = self.client.get(url, {'page_size': 2, 'depth': 2})
+        level = response.data['replies'][0]['replies'][0]
+        self.assertEqual((level['replies'], level['replies_count'], level['has_more']),
+                         ([], 3, True))
+
+    def test_thread_of_comment_ordered_by_likes(self):
+        liked = self.comments[3]
+        PostInteraction(user=self.user, post=liked, activity=Interaction.like.name).save()
+        response = self.client.get(reverse('post-thread', args=[self.comments[2].id]),
+                                   {'ordering': 'likes', 'page_size': 2, 'offset': 1})
+
+        self.assertEqual(response.data['id'], self.comments[2].id)
+        self.assertEqual([reply['body'] for reply in response.data['replies']],
+                         ["comment 1.2", "comment 1.1"])
+        self.assertFalse(response.data['has_more'])
+        self.assertEqual(self.client.get(reverse('post-thread', args=[self.post.id]),
+                                         {'ordering': 'oldest'}).status_code, 400)
+
+
+class PostSearchTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='writer')
+        self.other = User.objects.create(username='other')
+        self.client.force_authenticate(self.user)
+        self.headline = Post(user=self.user, headline="Postgres tuning", body="notes")
+        self.headline.save()
+        self.body = Post(user=self.other, headline="Notes", body="tuning postgres indexes")
+        self.body.save()
+        self.comment = Post(user=self.user, body="postgres tuning too", parent=self.headline)
+        self.comment.save()
+        Post(user=self.user, headline="Redis", body="caching").save()
+
+    def test_ranked_filtered_and_paginated(self):
+        url = reverse('post-search')
+        response = self.client.get(url, {'q': 'tuning postgres', 'type': 'post'})
+        self.assertEqual([post['id'] for post in response.data['results']],
+                         [self.headline.id, self.body.id])       # headline matches rank higher
+
+        response = self.client.get(url, {'q': 'tuning', 'user': self.user.id, 'page_size': 1})
+        ids = [response.data['results'][0]['id']]
+        response = self.client.get(response.data['next'])
+        ids.append(response.data['results'][0]['id'])
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(sorted(ids), [self.headline.id, self.comment.id])
+
+        response = self.client.get(url, {'q': 'postgres', 'since': '2000-13-01', 'type': 'all'})
+        self.assertEqual(set(response.data['errors']), {'since', 'type'})
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_pages_through_tied_ranks(self):
+        # ranks of float4 precision (ts_rank() on postgres) must round-trip through cursors
+        tied = [Post(user=self.other, headline="Replication", body="lag") for _ in range(5)]
+        for post in tied:
+            post.save()
+
+        url, ids = reverse('post-search'), []
+        response = self.client.get(url, {'q': 'replication lag', 'page_size': 2})
+        while True:
+            ids.extend(post['id'] for post in response.data['results'])
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(ids, sorted((post.id for post in tied), reverse=True))
+
+    def test_edits_are_reindexed(self):
+        self.body.body = "vacuum"
+        self.body.save()
+        self.assertEqual(list(Post.objects.search('indexes')), [])
+        self.assertEqual(list(Post.objects.search('"vacuum')), [self.body])
+
+
+class InteractionBatchTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='fan')
+        self.post = Post(user=self.user, body="post")
+        self.post.save()
+        self.comment = Post(user=self.user, body="comment", parent=self.post)
+        self.comment.save()
+        self.client.force_authenticate(self.user)
+
+    def test_batch_reports_errors_per_item(self):
+        response = self.client.post(reverse('postinteraction-batch'), [
+            {'post': self.post.id, 'activity': Interaction.like.name},
+            {'post': self.comment.id, 'activity': Interaction.share.name},
+            {'post': 0, 'activity': Interaction.like.name},
+            {'post': self.post.id, 'activity': 'poke'},
+            {'post': self.comment.id, 'activity': Interaction.like.name},
+        ], format='json')
+
+        self.assertEqual(response.data['status'], 'partial')
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['created', 'failed', 'failed', 'failed', 'created'])
+        self.post.refresh_from_db()
+        self.comment.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.comment.likes_count), (1, 1))
+
+    def test_batch_query_count_is_constant(self):
+        items = [{'post': self.post.id, 'activity': activity}
+                 for activity in Interaction.names() for _ in range(20)]
+        # posts SELECT, SAVEPOINT, bulk INSERT, counters UPDATE, RELEASE SAVEPOINT
+        with self.assertNumQueries(5):
+            self.client.post(reverse('postinteraction-batch'), items, format='json')
+
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.shares_count, self.post.reposts_count),
+                         (20, 20, 20))
+
+
+class UserStatsTestCase(APITestCase):
+    def setUp(self):
+        self.users = User.objects.bulk_create([User(username=f"user-{i}") for i in range(4)])
+        self.client.force_authenticate(self.users[0])
+
+    def follow(self, user):
+        return self.client.post(reverse('follow_user'), {'user_id': user.id}, format='json')
+
+    def test_follow_toggles_update_counters(self):
+        for user in self.users[1:]:
+            self.follow(user)
+        follower = Followers.objects.get(user=self.users[1])
+        follower.is_active = False
+        follower.save()
+        self.follow(self.users[1])
+        Followers.objects.get(user=self.users[2]).delete()
+
+        self.assertEqual(UserStats.objects.get(pk=self.users[0].pk).following_count, 2)
+        self.assertEqual([UserStats.get_count(user, 'followers_count') for user in self.users],
+                         [0, 1, 0, 1])
+
+    def test_user_list_query_count_is_constant(self):
+        for user in self.users[1:]:
+            self.follow(user)
+        with self.assertNumQueries(3):          # pagination COUNT + page joining stats + groups
+            response = self.client.get(reverse('user-list'))
+        self.assertEqual(sorted(user['followers'] for user in response.data['results']),
+                         [0, 1, 1, 1])
+
+    def test_rebuild_repairs_drift(self):
+        for user in self.users[1:]:
+            self.follow(user)
+        UserStats.objects.filter(pk=self.users[0].pk).update(following_count=7)
+        UserStats.objects.filter(pk=self.users[1].pk).delete()
+
+        call_command('rebuild_user_stats', stdout=open(os.devnull, 'w'))
+        self.assertEqual(UserStats.objects.get(pk=self.users[0].pk).following_count, 3)
+        self.assertEqual(UserStats.objects.get(pk=self.users[1].pk).followers_count, 1)
+
+
+class InstrumentationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        MetricsRegistry.reset()
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.client.force_authenticate(self.admin)
+        Post(user=self.admin, body="post").save()
+
+    def test_server_timing_and_metrics(self):
+        response = self.client.get(reverse('post-list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+        data = self.client.get(reverse('metrics')).data
+        metrics = data['views']['post-list']
+        self.assertEqual((metrics['requests'], metrics['max_queries']), (1, 2))
+        self.assertIsNone(data['pools']['redis'])           # locmem cache in tests
+        self.assertGreater(metrics['avg_serialize_ms'], 0)
+
+        self.client.force_authenticate(User.objects.create(username='reader'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_query_budget(self):
+        with override_settings(QUERY_BUDGETS={'post-list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('post-list'))
+
+            cache.clear()           # or the pre-rendered page is served without queries
+            with override_settings(QUERY_BUDGETS_STRICT=False), \
+                    self.assertLogs('core.instrumentation', 'WARNING'):
+                self.assertEqual(self.client.get(reverse('post-list')).status_code, 200)
+        self.assertEqual(MetricsRegistry.get_snapshot()['post-list']['over_budget'], 2)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTestCase(APITestCase):
+    # the 'replica' test database is a separate, empty one: reads served by it find no rows
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        ReplicaHealth.reset()
+        self.author = User.objects.create(username='author')
+        self.reader = User.objects.create(username='reader')
+        Post(user=self.author, body="post").save()
+
+    def get_count(self, user, url_name='post-list'):
+        self.client.force_authenticate(user)
+        return self.client.get(reverse(url_name)).json()['count']
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.get_count(self.reader), 0)
+        self.assertEqual(self.get_count(self.reader, 'user-list'), 0)
+        self.assertEqual(self.client.get(reverse('post-detail', args=[1])).status_code, 404)
+
+    def test_writer_reads_own_writes(self):
+        self.client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('post-list'),
+                                        {'user': self.author.id, 'body': "new post"})
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.get_count(self.author), 2)
+        self.assertEqual(self.get_count(self.author, 'user-list'), 2)
+        self.assertEqual(self.get_count(self.reader, 'user-list'), 0)
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        with patch.object(ReplicaHealth, 'get_lag', return_value=60.0):
+            self.assertEqual(self.get_count(self.reader, 'user-list'), 2)
+        # checked again after REPLICA_HEALTH_CHECK_INTERVAL only
+        self.assertEqual(self.get_count(self.reader, 'user-list'), 2)
+        ReplicaHealth.reset()
+        self.assertEqual(self.get_count(self.reader, 'user-list'), 0)
+
+
+class FollowUpsertTestCase(APITestCase):
+    def setUp(self):
+        self.users = User.objects.bulk_create([User(username=f"user-{i}") for i in range(4)])
+        self.client.force_authenticate(self.users[0])
+
+    def test_follow_unfollow_round_trip(self):
+        url = reverse('follow_user')
+        with self.assertNumQueries(5):      # savepoint + upsert + 2 stats queries + release
+            response = self.client.post(url, {'user_id': self.users[1].id}, format='json')
+        self.assertTrue(response.data['is_active'])
+
+        with self.assertNumQueries(4):      # savepoint + no-op upsert + release + existing row
+            self.client.post(url, {'user_id': self.users[1].id}, format='json')
+        response = self.client.post(reverse('unfollow_user'), {'user_id': self.users[1].id},
+                                    format='json')
+        self.assertFalse(response.data['is_active'])
+        self.client.post(url, {'user_id': self.users[1].id}, format='json')
+
+        self.assertEqual(Followers.objects.get().is_active, True)
+        self.assertEqual(UserStats.objects.get(pk=self.users[1].pk).followers_count, 1)
+        self.assertEqual(self.client.post(url, {'user_id': self.users[0].id},
+                                          format='json').status_code, 400)
+
+    def test_unfollow_is_idempotent(self):
+        url = reverse('unfollow_user')
+        response = self.client.post(url, {'user_id': self.users[2].id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['id'], response.data['is_active']), (None, False))
+
+        self.client.post(reverse('follow_user'), {'user_id': self.users[2].id}, format='json')
+        for _ in range(2):
+            response = self.client.post(url, {'user_id': self.users[2].id}, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.data['is_active'])
+        self.assertFalse(Followers.objects.filter(is_active=True).exists())
+        self.assertEqual(UserStats.objects.get(pk=self.users[2].pk).followers_count, 0)
+
+    def test_bulk_follow_reports_per_user(self):
+        self.client.post(reverse('follow_user'), {'user_id': self.users[1].id}, format='json')
+        response = self.client.post(reverse('bulk_follow_users'), {
+            'user_ids': [user.id for user in self.users] + [0, 424242]
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('bulk_follow_users'), {
+            'user_ids': [user.id for user in self.users] + [424242]
+        }, format='json')
+        self.assertEqual(response.data, {
+            'status': 'partial', 'followed': [user.id for user in self.users[2:]],
+            'already_following': [self.users[1].id], 'invalid': [self.users[0].id, 424242],
+        })
+        self.assertEqual(UserStats.objects.get(pk=self.users[0].pk).following_count, 3)
+
+
+class FollowGraphTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = User.objects.bulk_create([User(username=f"user-{i}") for i in range(5)])
+        self.ids = [user.id for user in self.users]
+
+    def follow(self, follower, user, is_active=True):
+        with self.captureOnCommitCallbacks(execute=True):
+            Followers.objects.update_or_create(user=user, following_user=follower,
+                                               defaults={'is_active': is_active})
+
+    def test_adjacency_sets_follow_changes(self):
+        first, *others = self.users
+        for user in others:
+            self.follow(first, user)
+        self.follow(others[0], first)
+        self.follow(others[1], first)
+
+        self.assertTrue(FollowGraph.is_following(first.id, others[0].id))
+        self.assertEqual(FollowGraph.get_mutual(first.id), {others[0].id, others[1].id})
+
+        self.follow(first, others[1], is_active=False)
+        with self.assertNumQueries(0):
+            self.assertFalse(FollowGraph.is_following(first.id, others[1].id))
+            self.assertFalse(FollowGraph.is_mutual(first.id, others[1].id))
+        self.assertEqual(FollowGraph.get_following(first.id), {others[0].id, *self.ids[3:]})
+
+    def test_iter_followers_in_chunks(self):
+        for follower in self.users[1:]:
+            self.follow(follower, self.users[0])
+
+        chunks = list(FollowGraph.iter_followers(self.users[0].id, chunk_size=2))
+        self.assertEqual(sorted(user_id for chunk in chunks for user_id in chunk), self.ids[1:])
+
+
+class TrendingTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='reader')
+        self.client.force_authenticate(self.user)
+        self.posts = [Post(user=self.user, body=f"post {i}") for i in range(3)]
+        for post in self.posts:
+            post.save()
+
+    def test_ranked_by_weighted_recent_activity(self):
+        first, second, third = self.posts
+        with self.captureOnCommitCallbacks(execute=True):
+            PostInteraction.objects.ingest(self.user.id, [
+                {'post': first.id, 'activity': Interaction.like.name},
+                {'post': first.id, 'activity': Interaction.like.name},
+                {'post': second.id, 'activity': Interaction.repost.name},
+            ])
+            like = PostInteraction(user=self.user, post=third, activity=Interaction.like.name)
+            like.save()
+            for _ in range(3):
+                Post(user=self.user, body="reply", parent=third).save()
+        with self.captureOnCommitCallbacks(execute=True):
+            like.delete()
+
+        url = reverse('retrieve_trending_posts')
+        response = self.client.get(url, {'window': '1h', 'page_size': 2})
+        self.assertEqual([post['id'] for post in response.data['results']],
+                         [third.id, second.id])      # 3 comments (6) > repost (4) > 2 likes (2)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual([post['id'] for post in self.client.get(response.data['next'])
+                          .data['results']], [first.id])
+        self.assertEqual(self.client.get(url, {'window': '2d'}).status_code, 400)
+
+    def test_liked_comments_count_towards_their_thread(self):
+        first, second, _ = self.posts
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = Post(user=self.user, body="reply", parent=first)
+            comment.save()
+            reply = Post(user=self.user, body="reply", parent=comment)
+            reply.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            PostInteraction.objects.ingest(self.user.id, [
+                {'post': reply.id, 'activity': Interaction.like.name},
+                {'post': second.id, 'activity': Interaction.share.name},
+            ])
+            PostInteraction(user=self.user, post=Post.objects.get(pk=comment.id),
+                            activity=Interaction.like.name).save()
+
+        self.assertEqual([post_id for post_id, _ in TrendingStore.get_entries('1h')],
+                         [first.id, second.id])      # no entries for the comments
+        response = self.client.get(reverse('retrieve_trending_posts'),
+                                   {'window': '1h', 'page_size': 2})
+        self.assertEqual([post['id'] for post in response.data['results']],
+                         [first.id, second.id])     # 2 comments (4) + 2 likes (2) > share (3)
+
+    @patch('blogging.trending.time.time', return_value=time.time())
+    def test_ranking_is_materialized_between_refreshes(self, _):
+        with self.captureOnCommitCallbacks(execute=True):
+            PostInteraction(user=self.user, post=self.posts[0],
+                            activity=Interaction.like.name).save()
+        self.assertEqual([post_id for post_id, _ in TrendingStore.get_entries('6h')],
+                         [self.posts[0].id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PostInteraction(user=self.user, post=self.posts[1],
+                            activity=Interaction.share.name).save()
+        self.assertEqual(len(TrendingStore.get_entries('6h')), 1)
+        self.assertEqual(len(TrendingStore.get_entries('1h')), 2)
+
+
+class SyntheticDatasetTestCase(TestCase):
+    def test_generated_counters_are_consistent(self):
+        call_command('generate_dataset', users=40, posts=3, seed=1, stdout=open(os.devnull, 'w'))
+
+        self.assertTrue(Post.objects.filter(parent__isnull=False).exists())
+        for post in Post.objects.with_engagement():
+            self.assertEqual([getattr(post, field) for field in Post.COUNTER_FIELDS],
+                             [getattr(post, ENGAGEMENT_ANNOTATIONS[field])
+                              for field in Post.COUNTER_FIELDS])
+        for stats in UserStats.objects.all():
+            self.assertEqual(stats.followers_count,
+                             Followers.objects.filter(user_id=stats.pk).count())
+        # ids were assigned by the command, new posts get the next ones
+        self.assertGreater(Post.objects.create(user=post.user, body='new').pk,
+                           Post.objects.exclude(body='new').order_by('-pk')[0].pk)
+
+    def test_benchmark_saves_results(self):
+        call_command('generate_dataset', users=30, seed=2, stdout=open(os.devnull, 'w'))
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('benchmark', requests=5, warmup=1, users=3, seed=2, output=output,
+                         host='testserver', scenarios=['timeline', 'posts'],
+                         stdout=open(os.devnull, 'w'))
+            with open(output) as results:
+                scenarios = json.load(results)['scenarios']
+            call_command('benchmark', requests=5, warmup=1, users=3, host='testserver',
+                         scenarios=['posts'], baseline=output, stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(sorted(scenarios), ['posts', 'timeline'])
+        self.assertEqual(scenarios['posts']['errors'], 0)
+
+
+class ArchivePostsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='author')
+        self.client.force_authenticate(self.user)
+        self.old = Post.objects.create(user=self.user, headline="old", body="old post")
+        comment = Post.objects.create(user=self.user, body="old comment", parent=self.old)
+        Post.objects.create(user=self.user, body="old reply", parent=comment)
+        for post in (self.old, comment):
+            PostInteraction(user=self.user, post=post, activity=Interaction.like.name).save()
+        self.deleted = Post.objects.create(user=self.user, body="deleted", is_deleted=True)
+        self.recent = Post.objects.create(user=self.user, body="recent")
+        # an old post commented on recently stays hot
+        self.commented = Post.objects.create(user=self.user, body="old, commented")
+
+        year_ago = timezone.now() - timedelta(days=400)
+        Post.objects.exclude(pk=self.recent.pk).update(created_at=year_ago, updated_at=year_ago)
+        PostInteraction.objects.update(created_at=year_ago)
+        Post.objects.create(user=self.user, body="new comment", parent=self.commented)
+
+    def test_cold_and_deleted_threads_are_archived(self):
+        call_command('archive_posts', batch_size=1, stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(sorted(Post.objects.values_list('body', flat=True)),
+                         ["new comment", "old, commented", "recent"])
+        self.assertEqual(ArchivedPost.objects.count(), 4)
+        self.assertEqual(ArchivedPostInteraction.objects.count(), 2)
+        self.assertFalse(PostInteraction.objects.exists())
+        archived = ArchivedPost.objects.get(pk=self.old.pk)
+        self.assertEqual((archived.likes_count, archived.comments_count), (1, 1))
+
+    def test_archived_posts_are_still_readable(self):
+        call_command('archive_posts', stdout=open(os.devnull, 'w'))
+
+        response = self.client.get(reverse('post-detail', args=[self.old.pk]))
+        self.assertEqual((response.status_code, response.data['likes']), (200, 1))
+        response = self.client.get(reverse('post-thread', args=[self.old.pk]))
+        self.assertEqual(response.data['replies'][0]['body'], "old comment")
+        self.assertEqual(response.data['replies'][0]['replies'][0]['body'], "old reply")
+        self.assertEqual(self.client.get(reverse('post-thread', args=[self.deleted.pk]))
+                         .status_code, 404)
+
+
+class ActivityBufferTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='fan')
+        self.post = Post(user=self.user, body="post")
+        self.post.save()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(ACTIVITY_WRITE_BEHIND=True)
+    def test_buffered_interactions_are_written_once(self):
+        response = self.client.post(reverse('postinteraction-list'),
+                                    {'post': self.post.id, 'activity': Interaction.like.name},
+                                    format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(PostInteraction.objects.exists())
+
+        # the worker crashes after claiming the batch, which is then delivered again
+        ActivityBuffer.claim('worker', 10)
+        self.assertEqual(ActivityBuffer.flush('worker', 10)[:2], (1, 1))
+        RedisInterface.push_to_list(ActivityBuffer.BUFFER_KEY, json.dumps({
+            'id': response.data['request_id'], 'user': self.user.id, 'post': self.post.id,
+            'activity': Interaction.like.name,
+        }))
+        self.assertEqual(ActivityBuffer.flush('worker', 10)[:2], (1, 0))
+
+        self.post.refresh_from_db()
+        self.assertEqual(PostInteraction.objects.count(), 1)
+        self.assertEqual(self.post.likes_count, 1)
+
+
+class AsyncViewsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='reader')
+        self.author = User.objects.create(username='author')
+        Followers(user=self.author, following_user=self.user).save()
+        for i in range(3):
+            Post(user=self.author, body=f"post {i}").save()
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    async def test_async_timeline_matches_sync_timeline(self):
+        url = reverse('retrieve_user_timeline')
+        expected = (await sync_to_async(self.client.get)(url, {'page_size': 2})).json()
+
+        for _ in range(2):          # page built in a thread, then read from the cache
+            response = await self.async_client.get(reverse('retrieve_user_timeline_async'),
+                                                   {'page_size': 2})
+            self.assertEqual(response.json()['posts'], expected['posts'])
+        self.assertEqual([post['body'] for post in expected['posts']], ['post 2', 'post 1'])
+
+    async def test_unchanged_timeline_is_not_modified(self):
+        url = reverse('retrieve_user_timeline_async')
+        response = await sync_to_async(self.client.get)(reverse('retrieve_user_timeline'))
+        headers = {'If-None-Match': response['ETag']}
+        self.assertEqual((await self.async_client.get(url, headers=headers)).status_code, 304)
+
+        post = await Post.objects.filter(user=self.author).afirst()
+        await sync_to_async(PostCache.invalidate)(post.id)      # e.g. post liked
+        response = await self.async_client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], headers['If-None-Match'])
+
+    async def test_bodies_read_from_lagging_replicas_are_not_cached(self):
+        url = reverse('retrieve_user_timeline_async')
+        with patch.object(ReplicaRouter, 'may_cache', return_value=False):
+            response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(await sync_to_async(ResponseCache.get_body)(response['ETag']))
+
+        response = await self.async_client.get(url)
+        self.assertIsNotNone(await sync_to_async(ResponseCache.get_body)(response['ETag']))
+
+    async def test_async_interaction_create(self):
+        post = await Post.objects.filter(user=self.author).afirst()
+        url = reverse('create_post_interaction_async')
+        response = await self.async_client.post(url, {'post': post.id, 'activity': 'like'},
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.post(url, {'post': post.id, 'activity': 'poke'},
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        with self.settings(ACTIVITY_WRITE_BEHIND=True):
+            response = await self.async_client.post(url, {'post': post.id, 'activity': 'share'},
+                                                    content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(await sync_to_async(ActivityBuffer.get_size)(), 1)
+
+    async def test_async_views_check_permissions(self):
+        url = reverse('retrieve_user_timeline_async')
+        with patch.object(AsyncTimelineView, 'permission_classes', [permissions.IsAdminUser]):
+            response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+        await sync_to_async(self.async_client.logout)()
+        self.assertEqual((await self.async_client.get(url)).status_code, 403)
+
+    async def test_async_views_check_throttles(self):
+        class OncePerMinute(UserRateThrottle):
+            rate = '1/min'
+
+        url = reverse('retrieve_user_timeline_async')
+        with patch.object(AsyncTimelineView, 'throttle_classes', [OncePerMinute]):
+            self.assertEqual((await self.async_client.get(url)).status_code, 200)
+            response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class RedisFallbackTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def assertExpiresIn(self, key, ttl):
+        expires_at = cache._expire_info[cache.make_key(key)]
+        self.assertAlmostEqual(expires_at - time.time(), ttl, delta=5)
+
+    def test_updates_keep_expiry(self):
+        RedisInterface.add_to_set('set', 1, 2, ttl=600)
+        RedisInterface.remove_from_set('set', 1)
+        RedisInterface.add_to_set('set', 3)
+        self.assertExpiresIn('set', 600)
+        self.assertEqual(cache.get('set'), {'2', '3'})
+
+        RedisInterface.add_to_sorted_set('sorted', {1: 1, 2: 2}, ttl=600)
+        RedisInterface.remove_from_sorted_set('sorted', 1)
+        RedisInterface.increment_sorted_sets({'sorted': {2: 1}})
+        self.assertExpiresIn('sorted', 600)
+        self.assertEqual(RedisInterface.get_sorted_set_vals('sorted'), [('2', 3)])
+
+    def test_sorted_set_offset_without_count(self):
+        RedisInterface.add_to_sorted_set('sorted', {1: 1, 2: 2, 3: 3})
+        self.assertEqual(RedisInterface.get_sorted_set_vals('sorted', offset=1),
+                         [('2', 2), ('1', 1)])
+
+
+class GetOrComputeTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        time.sleep(0.2)
+        return self.calls
+
+    def test_concurrent_misses_compute_once(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                RedisInterface.get_or_compute('key', self.compute, ttl=60)
+            ))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [1] * 10)
+
+    def test_expired_value_served_stale_while_rebuilding(self):
+        cache.set('key', ('stale', 0.1, time.time() - 1), 60)
+        token = RedisInterface.acquire_lock('key')
+
+        self.assertEqual(RedisInterface.get_or_compute('key', self.compute, ttl=60), 'stale')
+        self.assertEqual(self.calls, 0)
+
+        RedisInterface.release_lock('key', token)
+        self.assertEqual(RedisInterface.get_or_compute('key', self.compute, ttl=60), 1)
+
+
+class RedisPoolStatsTestCase(SimpleTestCase):
+    def test_pool_usage(self):
+        pool = redis.BlockingConnectionPool(max_connections=4)
+        pool.pool.get_nowait()
+        pool.make_connection()                  # in use, as handed out by get_connection()
+        pool.release(pool.make_connection())    # idle
+        self.assertEqual(RedisInterface.get_pool_usage(pool), (2, 1, 4))
+
+        other = redis.ConnectionPool(max_connections=6)
+        other.make_connection()
+        self.assertEqual(
+            RedisInterface.sum_pool_stats([RedisInterface.get_pool_usage(pool),
+                                           RedisInterface.get_pool_usage(other)]),
+            {'open': 3, 'in_use': 2, 'idle': 1, 'max_connections': 10, 'utilization': 0.2}
+        )
+
+
+class LocalCacheTestCase(SimpleTestCase):
+    def test_evicts_least_recently_used_over_byte_budget(self):
+        local_cache = LocalCache(max_bytes=300, ttl=60)
+        for key in ('a', 'b', 'c'):
+            local_cache.set(key, 'x' * 80)
+        local_cache.get('a')
+        local_cache.set('d', 'x' * 80)
+
+        self.assertEqual(local_cache.get('b'), MISSING)
+        self.assertEqual(local_cache.get('a'), 'x' * 80)
+        self.assertLessEqual(local_cache.get_stats()['bytes'], 300)
+        self.assertEqual(local_cache.get_stats()['evictions'], 1)
+
+    @override_settings(REDIS_LOCAL_CACHE_ENABLED=True)
+    def test_redis_interface_serves_hot_keys_locally(self):
+        cache.clear()
+        RedisInterface.local_cache_pid = None
+        RedisInterface.set_redis_val('key', 'value')
+
+        self.assertEqual(RedisInterface.get_redis_val('key'), 'value')
+        cache.delete('key')         # bypassing RedisInterface, so L1 isn't invalidated
+        self.assertEqual(RedisInterface.get_redis_val('key'), 'value')
+
+        RedisInterface.delete_redis_key('key')
+        self.assertIsNone(RedisInterface.get_redis_val('key'))
+        self.assertEqual(RedisInterface.get_stats()['local']['hits'], 1)
+        RedisInterface.local_cache_pid = None
+
+
+class PayloadCodecTestCase(SimpleTestCase):
+    rows = [{'id': i, 'body': 'lorem ipsum ' * i, 'parent': None} for i in range(100)]
+
+    def test_round_trip_compressed(self):
+        codec = PayloadCodec(('id', 'body', 'parent'))
+
+        self.assertEqual(codec.decode(codec.encode(self.rows[:1])), self.rows[:1])
+        self.assertEqual(codec.decode(codec.encode(self.rows)), self.rows)
+
+    def test_decode_many_skips_other_values(self):
+        codec = PayloadCodec(('id', 'body', 'parent'))
+        other = PayloadCodec(('id',)).encode([{'id': 1}])
+        values = [codec.encode([row]) for row in self.rows[:20]] + \
+            [codec.encode(self.rows[20:]), codec.encode([]), other, b'', {'id': 1}]
+
+        self.assertEqual(codec.decode_many(values), self.rows)
+        self.assertEqual(codec.decode_many([]), [])
+
+    def test_other_field_list_decodes_as_miss(self):
+        encoded = PayloadCodec(('id', 'body', 'parent')).encode(self.rows)
+
+        self.assertIsNone(PayloadCodec(('id', 'body')).decode(encoded))
+        self.assertIsNone(PayloadCodec(('id', 'body')).decode({'id': 1}))
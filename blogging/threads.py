@@ -0,0 +1,90 @@
+from django.db import connections
+from django.db.models import Count, F, Q, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
+from blogging.enums import ThreadOrdering
+from blogging.serializers import PostSerializer
+
+ORDERINGS = {
+    ThreadOrdering.recent.name: (F('created_at').desc(), F('id').desc()),
+    ThreadOrdering.likes.name: (F('likes_count').desc(), F('created_at').desc(), F('id').desc()),
+}
+
+
+class CommentThread:
+    """
+    Nested comment tree of a post (or of a comment and its replies).
+
+    The requested subtree is loaded with one query whatever its depth: a recursive CTE walks the
+    active replies down to `max_depth` (within the thread of the post, `root`), and each level is
+    paginated in SQL with a ROW_NUMBER() window per parent, listing up to `page_size` replies.
+    Further ones are fetched by requesting the thread of their parent with an `offset`.
+    """
+    @staticmethod
+    def get_subtree_ids(post, max_depth=None):
+        """
+        returns a subquery of the ids of the active replies of post, down to max_depth levels
+        """
+        queryset = type(post).objects.all()
+        table = connections[queryset.db].ops.quote_name(type(post)._meta.db_table)
+        depth_limit, params = '', [post.id, post.root_id or post.id]
+        if max_depth is not None:
+            depth_limit, params = 'AND subtree.depth < %s', [*params, max_depth]
+        return RawSQL(
+            f"WITH RECURSIVE subtree (id, depth) AS ("
+            f"SELECT id, 0 FROM {table} WHERE id = %s "
+            f"UNION ALL SELECT reply.id, subtree.depth + 1 FROM {table} reply "
+            f"JOIN subtree ON reply.parent_id = subtree.id "
+            f"WHERE reply.root_id = %s AND reply.is_active {depth_limit}"
+            f") SELECT id FROM subtree WHERE depth > 0", params
+        )
+
+    @classmethod
+    def get_replies(cls, post, ordering, page_size, offset=0, max_depth=None):
+        """
+        returns the replies of the subtree of post listed on their level's page (from the archive
+        for an archived post), annotated with their rank and their parent's replies count
+        """
+        partition = {'partition_by': [F('parent_id')]}
+        return type(post).objects.filter(
+            pk__in=cls.get_subtree_ids(post, max_depth), is_active=True
+        ).annotate(
+            rank=Window(RowNumber(), order_by=ORDERINGS[ordering], **partition),
+            siblings=Window(Count('id'), **partition),
+        ).filter(
+            Q(parent_id=post.id, rank__gt=offset, rank__lte=offset + page_size)
+            | (~Q(parent_id=post.id) & Q(rank__lte=page_size))
+        ).order_by('parent_id', 'rank')
+
+    @classmethod
+    def build(cls, post, ordering, page_size, offset=0, max_depth=None):
+        """
+        returns the post payload with its replies nested under `replies`, each level ordered
+        newest / most liked first and paginated (`replies_count`, `has_more`)
+        """
+        replies = []
+        if max_depth is None or max_depth > 0:
+            replies = list(cls.get_replies(post, ordering, page_size, offset, max_depth))
+
+        children, counts = {}, {}
+        for reply, payload in zip(replies, PostSerializer(replies, many=True,
+                                                          read_only=True).data):
+            children.setdefault(reply.parent_id, []).append(payload)
+            counts[reply.parent_id] = reply.siblings
+
+        def nest(payload, depth, start):
+            if max_depth is not None and depth >= max_depth:
+                # replies below max_depth aren't read, their stored counter is listed
+                count, page = payload['comment'], []
+            else:
+                count = counts.get(payload['id'], payload['comment'] if start else 0)
+                page = children.get(payload['id'], [])
+            return {
+                **payload,
+                'replies_count': count,
+                'has_more': start + len(page) < count,
+                'replies': [nest(reply, depth + 1, 0) for reply in page],
+            }
+
+        return nest(PostSerializer(post, read_only=True).data, 0, offset)
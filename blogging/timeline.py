@@ -0,0 +1,233 @@
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Q
+
+from blogging.constants import TIMELINE_MAX_LENGTH, TIMELINE_STORE_TTL, TIMELINE_PAGE_SIZE
+from blogging.graph import FollowGraph
+from blogging.models import Post
+from core.redis_helper import RedisInterface
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_score(dt):
+    """
+    exact integer microseconds since epoch, used as sorted set score and keyset cursor value
+    """
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+def from_score(score):
+    return EPOCH + timedelta(microseconds=int(score))
+
+
+class TimelineStore:
+    """
+    Bounded per-user home timeline of post ids (sorted set scored by post `updated_at`).
+
+    Posts are pushed into the timelines of the author's followers when saved (fan-out-on-write),
+    except for authors with more than FANOUT_FOLLOWER_LIMIT followers, whose posts are merged into
+    the timeline when it is read (fan-out-on-read). An author switches mode when saving a post
+    after crossing the limit, their latest posts being pushed into the timelines of their
+    followers when switching back to fan-out-on-write.
+
+    Timeline entries are (score, post_id) tuples, ordered on the (updated_at, id) keyset.
+    """
+    FAN_OUT_ON_READ_AUTHORS_KEY = 'timeline:fan-out-on-read-authors'
+
+    @staticmethod
+    def get_key(user_id):
+        return f"timeline:{user_id}"
+
+    @staticmethod
+    def get_warm_key(user_id):
+        return f"timeline:{user_id}:warm"
+
+    @staticmethod
+    def live_posts():
+        return Post.objects.filter(parent__isnull=True, is_active=True, is_deleted=False)
+
+    @classmethod
+    def push(cls, user_ids, entries):
+        RedisInterface.add_to_sorted_sets([cls.get_key(user_id) for user_id in user_ids], entries,
+                                          max_length=TIMELINE_MAX_LENGTH, ttl=TIMELINE_STORE_TTL)
+
+    @classmethod
+    def get_recipients(cls, author_id):
+        """
+        returns (user ids whose stored timelines hold author's posts, whether author is fanned
+        out on read). Timelines of followers of fan-out-on-read authors don't store their posts.
+        """
+        if FollowGraph.is_big(author_id):
+            RedisInterface.add_to_set(cls.FAN_OUT_ON_READ_AUTHORS_KEY, author_id)
+            return [author_id], True
+
+        followers = FollowGraph.get_followers(author_id)
+        if RedisInterface.are_set_members(cls.FAN_OUT_ON_READ_AUTHORS_KEY, author_id)[0]:
+            # back under the limit: the stored timelines of followers lack the author's posts,
+            # merged on read until now
+            RedisInterface.remove_from_set(cls.FAN_OUT_ON_READ_AUTHORS_KEY, author_id)
+            entries = cls.get_author_entries(author_id)
+            if entries:
+                cls.push(followers, entries)
+        return [author_id, *followers], False
+
+    @classmethod
+    def fan_out(cls, post):
+        """
+        pushes a live top-level post into the stored timelines, returns get_recipients() result
+        """
+        return cls.fan_out_many(post.user_id, [post])
+
+    @classmethod
+    def fan_out_many(cls, author_id, posts):
+        """
+        pushes live top-level posts of author into the stored timelines
+        """
+        recipients, fan_out_on_read = cls.get_recipients(author_id)
+        cls.push(recipients, {post.id: to_score(post.updated_at) for post in posts})
+        return recipients, fan_out_on_read
+
+    @classmethod
+    def remove(cls, post):
+        """
+        removes a post from the stored timelines, returns get_recipients() result
+        """
+        recipients, fan_out_on_read = cls.get_recipients(post.user_id)
+        RedisInterface.remove_from_sorted_sets([cls.get_key(user_id) for user_id in recipients],
+                                               post.id)
+        return recipients, fan_out_on_read
+
+    @classmethod
+    def get_author_entries(cls, author_id):
+        posts = cls.live_posts().filter(user_id=author_id) \
+            .order_by('-updated_at', '-id').values_list('id', 'updated_at')[:TIMELINE_MAX_LENGTH]
+        return {post_id: to_score(updated_at) for post_id, updated_at in posts}
+
+    @classmethod
+    def follow(cls, user_id, author_id):
+        """
+        merges author's latest posts into the (already built) stored timeline of user
+        """
+        if author_id in cls.get_fan_out_on_read_authors() or \
+                not RedisInterface.get_redis_val(cls.get_warm_key(user_id)):
+            return
+
+        entries = cls.get_author_entries(author_id)
+        if entries:
+            cls.push([user_id], entries)
+
+    @classmethod
+    def unfollow(cls, user_id, author_id):
+        """
+        removes author's latest posts from the (already built) stored timeline of user
+        """
+        if author_id in cls.get_fan_out_on_read_authors() or \
+                not RedisInterface.get_redis_val(cls.get_warm_key(user_id)):
+            return
+
+        post_ids = Post.objects.filter(user_id=author_id, parent__isnull=True) \
+            .order_by('-updated_at').values_list('id', flat=True)[:TIMELINE_MAX_LENGTH]
+        RedisInterface.remove_from_sorted_set(cls.get_key(user_id), *post_ids)
+
+    @classmethod
+    def rebuild(cls, user):
+        fan_out_on_read_authors = cls.get_fan_out_on_read_authors()
+        following_users = list(FollowGraph.get_following(user.id) - fan_out_on_read_authors)
+        following_users.append(user.id)
+
+        posts = cls.live_posts().filter(user_id__in=following_users) \
+            .order_by('-updated_at', '-id').values_list('id', 'updated_at')[:TIMELINE_MAX_LENGTH]
+
+        RedisInterface.delete_redis_key(cls.get_key(user.id))
+        entries = {post_id: to_score(updated_at) for post_id, updated_at in posts}
+        if entries:
+            cls.push([user.id], entries)
+        RedisInterface.set_redis_val(cls.get_warm_key(user.id), True, ttl=TIMELINE_STORE_TTL)
+
+    @classmethod
+    def get_fan_out_on_read_authors(cls):
+        return {int(user_id) for user_id in
+                RedisInterface.get_set_members(cls.FAN_OUT_ON_READ_AUTHORS_KEY)}
+
+    @classmethod
+    def get_stored_entries(cls, user_id, count, before=None, after=None):
+        if before:
+            bounds = {'max_score': before[0]}
+        elif after:
+            bounds = {'min_score': after[0], 'reverse': False}
+        else:
+            bounds = {}
+
+        # entries sharing the cursor's score are filtered out on (score, id) here, so keep
+        # reading until `count` entries past the cursor are found or the set is exhausted
+        entries, offset = [], 0
+        while len(entries) < count:
+            batch = RedisInterface.get_sorted_set_vals(cls.get_key(user_id), offset=offset,
+                                                       count=count, **bounds)
+            entries.extend(
+                entry for entry in ((int(score), int(post_id)) for post_id, score in batch)
+                if (before is None or entry < before) and (after is None or entry > after)
+            )
+            if len(batch) < count:
+                break
+            offset += len(batch)
+
+        return entries[:count]
+
+    @classmethod
+    def get_followed_fan_out_on_read_authors(cls, user):
+        fan_out_on_read_authors = cls.get_fan_out_on_read_authors() - {user.id}
+        if not fan_out_on_read_authors:
+            return []
+
+        return list(FollowGraph.get_following(user.id) & fan_out_on_read_authors)
+
+    @classmethod
+    def get_fan_out_on_read_entries(cls, authors, count, before=None, after=None):
+        if not authors:
+            return []
+
+        posts = cls.live_posts().filter(user_id__in=authors)
+
+        if before:
+            updated_at = from_score(before[0])
+            posts = posts.filter(Q(updated_at__lt=updated_at) |
+                                 Q(updated_at=updated_at, id__lt=before[1]))
+        if after:
+            updated_at = from_score(after[0])
+            posts = posts.filter(Q(updated_at__gt=updated_at) |
+                                 Q(updated_at=updated_at, id__gt=after[1]))
+
+        ordering = ('updated_at', 'id') if after else ('-updated_at', '-id')
+        posts = posts.order_by(*ordering).values_list('updated_at', 'id')[:count]
+        return [(to_score(updated_at), post_id) for updated_at, post_id in posts]
+
+    @classmethod
+    def get_entries(cls, user, count=TIMELINE_PAGE_SIZE, before=None, after=None, authors=None):
+        """
+        returns up to `count` timeline entries of user, newest first.
+        `before` / `after` are (score, post_id) cursors, selecting the entries closest to the
+        cursor that are older / newer than it. `authors` are the fan-out-on-read authors
+        followed by user, looked up if not provided.
+        """
+        if not RedisInterface.get_redis_val(cls.get_warm_key(user.id)):
+            cls.rebuild(user)
+
+        if authors is None:
+            authors = cls.get_followed_fan_out_on_read_authors(user)
+
+        entries = set(cls.get_stored_entries(user.id, count, before=before, after=after))
+        entries.update(cls.get_fan_out_on_read_entries(authors, count, before=before,
+                                                       after=after))
+
+        if after:
+            return sorted(entries)[:count][::-1]
+        return sorted(entries, reverse=True)[:count]
+
+    @classmethod
+    def get_post_ids(cls, user, count=TIMELINE_PAGE_SIZE):
+        """
+        returns ids of the latest `count` posts in user's home timeline, newest first
+        """
+        return [post_id for _, post_id in cls.get_entries(user, count)]
@@ -0,0 +1,117 @@
+import time
+
+from blogging.constants import TRENDING_BUCKET_SIZE, TRENDING_REFRESH_INTERVAL, \
+    TRENDING_WINDOWS, TRENDING_MAX_LENGTH
+from blogging.enums import Interaction
+from core.redis_helper import RedisInterface
+
+
+class TrendingStore:
+    """
+    Trending posts over sliding time windows (TRENDING_WINDOWS).
+
+    Interactions and comments add their weight (WEIGHTS) to the score of the top-level post of
+    their thread in the sorted set of the TRENDING_BUCKET_SIZE seconds bucket they were made
+    in. The ranking of a window is the union of the window's buckets, each bucket's scores
+    decayed by its age (halved every quarter of the window). Rankings are materialized in sorted
+    sets rebuilt at most once per TRENDING_REFRESH_INTERVAL, so reading a page of a ranking is a
+    single range read.
+    """
+    COMMENT = 'comment'
+    WEIGHTS = {
+        Interaction.like.name: 1,
+        COMMENT: 2,
+        Interaction.share.name: 3,
+        Interaction.repost.name: 4,
+    }
+
+    @staticmethod
+    def get_bucket(timestamp):
+        return int(timestamp // TRENDING_BUCKET_SIZE)
+
+    @staticmethod
+    def get_bucket_key(bucket):
+        return f"trending:bucket:{bucket}"
+
+    @staticmethod
+    def get_ranking_key(window, slot):
+        return f"trending:{window}:{slot}"
+
+    @staticmethod
+    def get_built_key(ranking_key):
+        return f"{ranking_key}:built"
+
+    @classmethod
+    def record(cls, events):
+        """
+        adds (post id, activity or COMMENT, created_at, sign) events to the buckets, sign being
+        -1 for removed interactions. Events older than the longest window are ignored.
+        """
+        oldest = cls.get_bucket(time.time() - max(TRENDING_WINDOWS.values()))
+        increments = {}
+        for post_id, activity, created_at, sign in events:
+            bucket = cls.get_bucket(created_at.timestamp())
+            if bucket < oldest:
+                continue
+
+            scores = increments.setdefault(cls.get_bucket_key(bucket), {})
+            scores[post_id] = scores.get(post_id, 0) + sign * cls.WEIGHTS[activity]
+
+        if increments:
+            RedisInterface.increment_sorted_sets(
+                increments, ttl=max(TRENDING_WINDOWS.values()) + TRENDING_BUCKET_SIZE
+            )
+
+    @classmethod
+    def get_weights(cls, window, now):
+        """
+        returns {bucket key: decay weight} of the buckets of window
+        """
+        seconds, half_life = TRENDING_WINDOWS[window], TRENDING_WINDOWS[window] / 4
+        weights = {}
+        for bucket in range(cls.get_bucket(now - seconds), cls.get_bucket(now) + 1):
+            age = max(now - (bucket + 0.5) * TRENDING_BUCKET_SIZE, 0)
+            weights[cls.get_bucket_key(bucket)] = 0.5 ** (age / half_life)
+        return weights
+
+    @classmethod
+    def build(cls, window, ranking_key, now):
+        RedisInterface.union_sorted_sets(ranking_key, cls.get_weights(window, now),
+                                         max_length=TRENDING_MAX_LENGTH,
+                                         ttl=2 * TRENDING_REFRESH_INTERVAL)
+        RedisInterface.set_redis_val(cls.get_built_key(ranking_key), 1,
+                                     2 * TRENDING_REFRESH_INTERVAL)
+
+    @classmethod
+    def get_ranking(cls, window):
+        """
+        returns the key of the current ranking of window, building it if needed. While another
+        worker builds it, the previous ranking is used.
+        """
+        now = time.time()
+        slot = int(now // TRENDING_REFRESH_INTERVAL)
+        ranking_key = cls.get_ranking_key(window, slot)
+        if RedisInterface.get_redis_val(cls.get_built_key(ranking_key)) is not None:
+            return ranking_key
+
+        token = RedisInterface.acquire_lock(ranking_key)
+        if token is None:
+            previous_key = cls.get_ranking_key(window, slot - 1)
+            if RedisInterface.get_redis_val(cls.get_built_key(previous_key)) is not None:
+                return previous_key
+            return ranking_key
+
+        try:
+            cls.build(window, ranking_key, now)
+        finally:
+            RedisInterface.release_lock(ranking_key, token)
+        return ranking_key
+
+    @classmethod
+    def get_entries(cls, window, offset=0, count=None):
+        """
+        returns (post id, score) pairs of the trending posts of window, highest score first
+        """
+        entries = RedisInterface.get_sorted_set_vals(cls.get_ranking(window), min_score=0,
+                                                     offset=offset, count=count)
+        return [(int(post_id), score) for post_id, score in entries if score > 0]
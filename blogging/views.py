@@ -1,41 +1,235 @@
+import asyncio
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from django.http import Http404
-from rest_framework import viewsets, status
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date
+from django.views import View
+from rest_framework import viewsets, status, exceptions, generics
 from rest_framework import permissions
+from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 
-from blogging.constants import TIMELINE_TTL
-from blogging.schemas import TimelineViewSchema, FollowUserViewSchema, PostInteractionViewSetSchema
+from blogging.buffer import ActivityBuffer
+from blogging.cache import TimelineCache, PostCache, ResponseCache
+from blogging.constants import INTERACTION_BATCH_MAX_SIZE, THREAD_PAGE_SIZE, THREAD_MAX_PAGE_SIZE, \
+    THREAD_MAX_DEPTH, TRENDING_WINDOWS, TRENDING_DEFAULT_WINDOW, TRENDING_PAGE_SIZE, \
+    TRENDING_MAX_PAGE_SIZE
+from blogging.enums import ThreadOrdering
+from blogging.schemas import TimelineViewSchema, FollowUserViewSchema, \
+    PostInteractionViewSetSchema, UnfollowUserViewSchema, BulkFollowUserViewSchema, \
+    ThreadViewSchema, PostSearchViewSchema, TrendingViewSchema
 from blogging.serializers import UserSerializer, PostSerializer, TimelineSerializer, \
-    FollowUserSerializer, PostInteractionSerializer
-from blogging.models import Post, Followers, PostInteraction
-from core.redis_helper import RedisInterface
+    FollowUserSerializer, PostInteractionSerializer, FollowRequestSerializer, \
+    BulkFollowRequestSerializer
+from blogging.models import Post, Followers, PostInteraction, ArchivedPost
+from blogging.pagination import TimelineCursorPagination, PostSearchPagination
+from blogging.threads import CommentThread
+from blogging.trending import TrendingStore
+from core.db_router import ReplicaReadsMixin, ReplicaRouter
+from core.instrumentation import MetricsRegistry
+from core.redis_helper import RedisInterface, AsyncRedisInterface
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class ConditionalGet:
+    """
+    Conditional GET (If-None-Match / If-Modified-Since) of responses identified by an ETag and a
+    Last-Modified timestamp computed from version stamps, without building their body. JSON
+    bodies are rendered once per ETag and served pre-rendered afterwards.
+    """
+    @staticmethod
+    def finalize(response, etag, last_modified):
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(last_modified)
+        # clients keep the response, but revalidate it on every use
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @staticmethod
+    def render(body):
+        return HttpResponse(body, content_type='application/json')
+
+    @classmethod
+    def respond(cls, request, etag, last_modified, get_data):
+        """
+        returns a 304 if the client's copy is current, otherwise the response body built from
+        get_data() (pre-rendered for JSON requests)
+        """
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            if request.accepted_renderer.format != 'json':
+                response = Response(get_data())
+            else:
+                body = ResponseCache.get_body(etag)
+                if body is None:
+                    body = JSONRenderer().render(get_data())
+                    if ReplicaRouter.may_cache(last_modified):
+                        ResponseCache.set_body(etag, body)
+                response = cls.render(body)
+        return cls.finalize(response, etag, last_modified)
+
+
+class UserViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows users to be viewed, created or edited.
+    Reads are served by a database replica when configured.
     """
-    queryset = User.objects.all().order_by('-date_joined')
+    queryset = User.objects.select_related('stats').prefetch_related('groups') \
+        .order_by('-date_joined')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows posts to be viewed, created
+    The list and detail reads are served by a database replica when configured. Archived posts
+    (see blogging.archive) are still retrieved, read only.
     """
     queryset = Post.objects.filter(parent__isnull=True).order_by('-created_at')
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        version = PostCache.get_list_version()
+        etag = ResponseCache.get_etag('posts', version, request.build_absolute_uri())
+        return ConditionalGet.respond(
+            request, etag, version // 10 ** 9,
+            lambda: super(PostViewSet, self).list(request, *args, **kwargs).data
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            post = generics.get_object_or_404(ArchivedPost, pk=kwargs['pk'],
+                                              parent__isnull=True)
+            return Response(PostSerializer(post, read_only=True).data)
+
+    @staticmethod
+    def get_int_param(request, name, default, maximum=None):
+        try:
+            value = int(request.query_params[name])
+        except (KeyError, ValueError):
+            return default
+
+        return max(0, min(value, maximum) if maximum is not None else value)
+
+    @action(detail=False, methods=['get'], schema=PostSearchViewSchema)
+    def search(self, request, format=None):
+        """
+        Full-text search of posts and comments (headline and body), most relevant first,
+        optionally filtered by author (`user`), creation date range (`since` / `until`) and `type`
+        (post / comment). Pages are navigated with the `next` cursor link.
+        """
+        text = request.query_params.get('q', '')
+        queryset, errors = Post.objects.filter(is_deleted=False).search(text), {}
+        if not text.strip():
+            errors['q'] = ["This field is required."]
+
+        filters = {'user': 'user_id', 'since': 'created_at__gte', 'until': 'created_at__lte'}
+        for param, lookup in filters.items():
+            value = request.query_params.get(param)
+            if not value:
+                continue
+
+            parsed = self.parse_search_filter(param, value)
+            if parsed is None:
+                errors[param] = [f'"{value}" is not a valid value.']
+            else:
+                queryset = queryset.filter(**{lookup: parsed})
+
+        post_type = request.query_params.get('type')
+        if post_type in ('post', 'comment'):
+            queryset = queryset.filter(parent__isnull=post_type == 'post')
+        elif post_type:
+            errors['type'] = [f'"{post_type}" is not a valid choice.']
+
+        if errors:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={
+                    'status': 'failed',
+                    'message': "invalid search request",
+                    'errors': errors
+                }
+            )
+
+        paginator = PostSearchPagination()
+        posts = paginator.paginate_queryset(queryset, request)
+        return Response({
+            'next': paginator.get_next_link(),
+            'results': [{**payload, 'rank': post.rank} for post, payload in
+                        zip(posts, PostSerializer(posts, many=True).data)],
+        })
+
+    @staticmethod
+    def parse_search_filter(param, value):
+        if param == 'user':
+            return int(value) if value.isdigit() else None
+
+        # dates are read as the start (since) / end (until) of the day
+        try:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                date = parse_date(value)
+                if date is None:
+                    return None
+                parsed = datetime.combine(date, time.min if param == 'since' else time.max)
+        except ValueError:
+            return None
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+    @action(detail=True, methods=['get'], schema=ThreadViewSchema)
+    def thread(self, request, pk=None, format=None):
+        """
+        Retrieves a post (or comment) with its nested replies, `page_size` replies per level
+        ordered by `ordering` (recent / likes). More replies of any comment are listed by
+        requesting its thread with an `offset`.
+        """
+        ordering = request.query_params.get('ordering', ThreadOrdering.recent.name)
+        if not ThreadOrdering.has_name(ordering):
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={
+                    'status': 'failed',
+                    'message': "invalid thread request",
+                    'errors': {'ordering': [f'"{ordering}" is not a valid choice.']}
+                }
+            )
+
+        try:
+            post = get_object_or_404(Post, pk=pk, is_deleted=False)
+        except Http404:
+            post = generics.get_object_or_404(ArchivedPost, pk=pk, is_deleted=False)
+        return Response(CommentThread.build(
+            post, ordering,
+            page_size=self.get_int_param(request, 'page_size', THREAD_PAGE_SIZE,
+                                         THREAD_MAX_PAGE_SIZE) or THREAD_PAGE_SIZE,
+            offset=self.get_int_param(request, 'offset', 0),
+            max_depth=self.get_int_param(request, 'depth', THREAD_MAX_DEPTH, THREAD_MAX_DEPTH),
+        ))
 
 
 class PostInteractionViewSet(viewsets.ViewSet):
     """
     API endpoint that allows posts interactions (like / share / repost) to be created,
-    with logged-in user being the user interacting with post / comment
+    with logged-in user being the user interacting with post / comment.
+    With settings.ACTIVITY_WRITE_BEHIND, interactions are buffered and acknowledged (202) right
+    away, and written by `manage.py flush_activity_buffer` workers.
     """
     schema = PostInteractionViewSetSchema
     queryset = PostInteraction.objects.all().order_by('-created_at')
@@ -43,6 +237,22 @@ class PostInteractionViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def create(self, request, format=None):
+        if settings.ACTIVITY_WRITE_BEHIND:
+            candidates, errors = PostInteraction.objects.validate_items([request.data])
+            if errors:
+                return Response(
+                    status=status.HTTP_400_BAD_REQUEST,
+                    data={
+                        'status': 'failed',
+                        'message': "invalid post interaction request",
+                        'errors': errors[0]
+                    }
+                )
+
+            request_id, = ActivityBuffer.push(request.user.id, candidates)
+            return Response(status=status.HTTP_202_ACCEPTED,
+                            data={'status': 'accepted', 'request_id': request_id})
+
         request_data = {
             **request.data,
             **{'user': request.user.id}
@@ -75,51 +285,136 @@ class PostInteractionViewSet(viewsets.ViewSet):
                 }
             )
 
+    @action(detail=False, methods=['post'])
+    def batch(self, request, format=None):
+        """
+        Creates a batch of interactions (a list of {"post": int, "activity": str} objects, or
+        {"interactions": [...]}) of the logged-in user in one transaction, reporting errors per
+        item. Valid items are created even if others in the batch are rejected.
+        In write-behind mode, well-formed items are only buffered (status 'accepted').
+        """
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('interactions')
+
+        if not isinstance(items, list) or not 0 < len(items) <= INTERACTION_BATCH_MAX_SIZE:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={
+                    'status': 'failed',
+                    'message': f"expected a list of 1 to {INTERACTION_BATCH_MAX_SIZE} "
+                               f"post interactions",
+                }
+            )
+
+        if settings.ACTIVITY_WRITE_BEHIND:
+            candidates, errors = PostInteraction.objects.validate_items(items)
+            accepted = iter(ActivityBuffer.push(request.user.id, candidates))
+            results = [
+                {'status': 'failed', 'errors': errors[index]} if index in errors else
+                {'status': 'accepted', 'request_id': next(accepted)}
+                for index in range(len(items))
+            ]
+            success_status = status.HTTP_202_ACCEPTED
+        else:
+            created, errors = PostInteraction.objects.ingest(request.user.id, items)
+            created = iter(PostInteractionSerializer(created, many=True).data)
+            results = [
+                {'status': 'failed', 'errors': errors[index]} if index in errors else
+                {'status': 'created', 'interaction': next(created)}
+                for index in range(len(items))
+            ]
+            success_status = status.HTTP_200_OK
+
+        return Response(
+            status=success_status if len(errors) < len(items) else status.HTTP_400_BAD_REQUEST,
+            data={
+                'status': 'failed' if len(errors) == len(items) else
+                'partial' if errors else 'success',
+                'results': results,
+            }
+        )
+
 
 class FollowUserView(APIView):
     """
-    Follows provided user_id, with logged-in user being the 'following' user
+    Follows provided user_id, with logged-in user being the 'following' user.
+    Following an already followed user is a no-op.
     """
     schema = FollowUserViewSchema
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, format=None):
-        followed_user = request.data.get('user_id')
-        following_user = request.user
+        serializer = FollowRequestSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={
+                    'status': 'failed',
+                    'message': "invalid follow request",
+                    'errors': serializer.errors
+                }
+            )
 
-        data = {
-            'user': followed_user,
-            'following_user': following_user.id
-        }
-        
-        serializer = FollowUserSerializer(data=data)
+        user_id = serializer.validated_data['user_id']
+        followers = Followers.objects.follow(request.user.id, [user_id]) or \
+            Followers.objects.filter(user_id=user_id, following_user_id=request.user.id)
+        if not followers:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={
+                    'status': 'failed',
+                    'message': "invalid follow request",
+                    'errors': {'user_id': [f'Invalid pk "{user_id}" - object does not exist.']}
+                }
+            )
 
-        follower = Followers.objects.filter(
-            user_id=followed_user,
-            following_user_id=following_user.id,
-            is_active=False
-        )
-        if follower.exists():
-            follower = follower.last()
-            follower.is_active = True
-            follower.save()
-            return Response(FollowUserSerializer(follower).data)
-        elif serializer.is_valid():
-            try:
-                serializer.save()
-                return Response(serializer.data)
-            except ValidationError as exc:
-                return Response(
-                    status=status.HTTP_400_BAD_REQUEST,
-                    data={
-                        'status': 'failed',
-                        'message': "invalid follow request",
-                        'errors': {
-                            'validation_errors': [str(exc)]
-                        }
-                    }
-                )
-        else:
+        return Response(FollowUserSerializer(followers[0]).data)
+
+
+class UnfollowUserView(APIView):
+    """
+    Unfollows provided user_id, with logged-in user being the 'following' user.
+    Unfollowing a user not followed (never or no longer) is a no-op, answered with the same
+    inactive follow.
+    """
+    schema = UnfollowUserViewSchema
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, format=None):
+        serializer = FollowRequestSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={
+                    'status': 'failed',
+                    'message': "invalid unfollow request",
+                    'errors': serializer.errors
+                }
+            )
+
+        user_id = serializer.validated_data['user_id']
+        followers = Followers.objects.unfollow(request.user.id, [user_id]) or \
+            Followers.objects.filter(user_id=user_id, following_user_id=request.user.id)
+        if not followers:
+            # never followed, answered as an unfollow (unsaved inactive follow, without id)
+            followers = [Followers(user_id=user_id, following_user_id=request.user.id,
+                                   is_active=False)]
+
+        return Response(FollowUserSerializer(followers[0]).data)
+
+
+class BulkFollowUserView(APIView):
+    """
+    Follows a list of user ids (`{"user_ids": [int]}`) at once, with logged-in user being the
+    'following' user, reporting which were newly followed, already followed or invalid.
+    """
+    schema = BulkFollowUserViewSchema
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, format=None):
+        serializer = BulkFollowRequestSerializer(data=request.data)
+        if not serializer.is_valid():
             return Response(
                 status=status.HTTP_400_BAD_REQUEST,
                 data={
@@ -129,12 +424,35 @@ class FollowUserView(APIView):
                 }
             )
 
+        user_ids = set(serializer.validated_data['user_ids'])
+        followed = {follower.user_id for follower in
+                    Followers.objects.follow(request.user.id, user_ids)}
+        already_following = set()
+        if user_ids - followed:
+            already_following = set(Followers.objects.filter(
+                following_user_id=request.user.id, user_id__in=user_ids - followed, is_active=True
+            ).values_list('user_id', flat=True))
+        invalid = user_ids - followed - already_following
+
+        return Response({
+            'status': 'partial' if invalid else 'success',
+            'followed': sorted(followed),
+            'already_following': sorted(already_following),
+            'invalid': sorted(invalid),
+        })
 
-class TimelineView(APIView):
+
+class TimelineView(ReplicaReadsMixin, APIView):
     """
     Retrieve timeline of logged-in user.
-    It consists of basic user profile details and a list of posts (chronologically arranged) from
-    different accounts whom the user is following. (default cache TTL is 60 seconds)
+    It consists of basic user profile details and a page of latest posts (chronologically
+    arranged) from different accounts whom the user is following, read from the user's fan-out
+    timeline store. Pages are navigated with the `next` / `previous` cursor links.
+    Cached pages are invalidated when posts, interactions or follows affecting them change.
+    Responses carry an ETag / Last-Modified derived from the timeline's and posts' version stamps,
+    unchanged pages are answered with a 304 to conditional requests.
+    Posts are read from a database replica when configured, pages (cached for long) are built
+    from the primary.
     """
     schema = TimelineViewSchema
     permission_classes = [permissions.IsAuthenticated]
@@ -146,17 +464,260 @@ class TimelineView(APIView):
         except User.DoesNotExist:
             raise Http404
 
+    @staticmethod
+    def get_page(user, request, refresh=False):
+        paginator = TimelineCursorPagination()
+        page_key = TimelineCache.get_page_key(user.id, paginator.get_page_cache_key(request))
+
+        def build():
+            with ReplicaRouter.primary_reads():
+                post_ids = paginator.paginate_timeline(user, request)
+            links = {'next': paginator.get_next_link(), 'previous': paginator.get_previous_link()}
+            return post_ids, paginator.fan_out_on_read_authors, links
+
+        return TimelineCache.get_or_build_page(page_key, build, refresh=refresh)
+
     def get(self, request, format=None):
         # user = self.get_user(pk)
         user = request.user
 
-        redis_conn = RedisInterface()
         update_cache = request.GET.get('update_cache', '')
+        page = self.get_page(user, request, refresh=update_cache.lower() == 'true')
+        etag, last_modified = TimelineCache.get_page_stamp(
+            user, TimelineCursorPagination().get_page_cache_key(request), page
+        )
+
+        def get_data():
+            serializer = TimelineSerializer(user, context={'post_ids': page['post_ids']})
+            return {
+                **serializer.data,
+                'next': page['next'],
+                'previous': page['previous'],
+            }
+
+        return ConditionalGet.respond(request, etag, last_modified, get_data)
+
+
+class TrendingView(APIView):
+    """
+    Retrieve the posts trending over the last hour, 6 hours or day (`window`), ranked by their
+    recent likes, comments, shares and reposts, most recent activity weighing more.
+    Pages are navigated with the `next` link.
+    """
+    schema = TrendingViewSchema
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, format=None):
+        window = request.query_params.get('window', TRENDING_DEFAULT_WINDOW)
+        if window not in TRENDING_WINDOWS:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={
+                    'status': 'failed',
+                    'message': f"window must be one of {', '.join(TRENDING_WINDOWS)}",
+                }
+            )
+
+        offset = PostViewSet.get_int_param(request, 'offset', 0)
+        page_size = PostViewSet.get_int_param(request, 'page_size', TRENDING_PAGE_SIZE,
+                                              TRENDING_MAX_PAGE_SIZE) or TRENDING_PAGE_SIZE
+        entries = TrendingStore.get_entries(window, offset, page_size + 1)
+
+        # posts deleted or deactivated since they were ranked are left out
+        scores = dict(entries[:page_size])
+        payloads = TimelineSerializer.get_payloads(list(scores))
+        next_link = None
+        if len(entries) > page_size:
+            next_link = replace_query_param(request.build_absolute_uri(), 'offset',
+                                            offset + page_size)
+        return Response({
+            'window': window,
+            'results': [{**payloads[post_id], 'trending_score': score}
+                        for post_id, score in scores.items() if post_id in payloads],
+            'next': next_link,
+        })
+
+
+class MetricsView(APIView):
+    """
+    Request metrics of this server process, per view: request and error counts, average DB
+    queries / time / connections opened and serialization time, cache lookups, latency
+    percentiles and query budget. Also the usage of the process' redis connection pools.
+    DELETE resets the views metrics (e.g. between load tests).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response({
+            'views': MetricsRegistry.get_snapshot(),
+            'cache': RedisInterface.get_stats(),
+            'pools': {
+                'redis': RedisInterface.get_pool_stats(),
+                'redis_async': AsyncRedisInterface.get_pool_stats(),
+            },
+        })
+
+    def delete(self, request, format=None):
+        MetricsRegistry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncAPIView(View):
+    """
+    Base of the async (ASGI) views. DRF's APIView can't serve coroutines, so requests are
+    wrapped in a DRF Request authenticated with the default authentication classes and checked
+    against permission_classes and throttle_classes as by APIView (in a thread), and responses
+    are rendered with DRF's JSONRenderer.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+
+    # the policy checks of APIView, run by check_policies()
+    get_permissions = APIView.get_permissions
+    check_permissions = APIView.check_permissions
+    permission_denied = APIView.permission_denied
+    get_throttles = APIView.get_throttles
+    check_throttles = APIView.check_throttles
+    throttled = APIView.throttled
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # like APIView, csrf is only enforced by SessionAuthentication
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    @staticmethod
+    def render(data, status_code=status.HTTP_200_OK):
+        return HttpResponse(JSONRenderer().render(data), status=status_code,
+                            content_type='application/json')
+
+    def check_policies(self, request):
+        # authenticates the user, as APIView.initial()
+        request.user
+        self.check_permissions(request)
+        self.check_throttles(request)
+
+    def render_exception(self, request, exc):
+        """
+        renders a policy check failure like APIView.handle_exception()
+        """
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            authenticators = request.authenticators
+            auth_header = authenticators and authenticators[0].authenticate_header(request)
+            if auth_header:
+                exc.auth_header = auth_header
+            else:
+                exc.status_code = status.HTTP_403_FORBIDDEN
+
+        response = self.render({'detail': exc.detail}, exc.status_code)
+        if getattr(exc, 'auth_header', None):
+            response['WWW-Authenticate'] = exc.auth_header
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = '%d' % exc.wait
+        return response
+
+    async def initialize(self, request):
+        """
+        returns (DRF request, None) for requests passing the authentication, permission and
+        throttle checks, (None, error response) otherwise
+        """
+        request = Request(
+            request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        )
+        try:
+            await sync_to_async(self.check_policies)(request)
+        except exceptions.APIException as exc:
+            return None, self.render_exception(request, exc)
+        return request, None
+
+
+class AsyncTimelineView(AsyncAPIView):
+    """
+    Async variant of TimelineView, with the same response.
+    Cached pages, version stamps, pre-rendered bodies and post payloads are read with an asyncio
+    redis client, and posts missing from the cache are hydrated with the async ORM. The
+    fan-out-on-read authors check of a cached page, the read of its version stamps and of its
+    cached post payloads run concurrently.
+    Pages that aren't cached (and the follow sets they merge) are built by the same code as
+    TimelineView, in a thread: building is single-flight, holding a lock on the page key while
+    it reads the timeline store, the follow graph and the database.
+    """
+    async def get(self, request):
+        request, error = await self.initialize(request)
+        if error:
+            return error
+
+        user = request.user
+        refresh = request.query_params.get('update_cache', '').lower() == 'true'
+        page_cache_key = TimelineCursorPagination().get_page_cache_key(request)
+
+        page = None if refresh else await TimelineCache.aget_page(user.id, page_cache_key)
+        if page is not None:
+            is_current, stamp, payloads = await asyncio.gather(
+                TimelineCache.ais_current(page),
+                TimelineCache.aget_page_stamp(user, page_cache_key, page),
+                PostCache.aget_many(page['post_ids'])
+            )
+            if not is_current:
+                page = None
+
+        if page is None:
+            page = await sync_to_async(TimelineView.get_page)(user, request, refresh)
+            stamp, payloads = await asyncio.gather(
+                TimelineCache.aget_page_stamp(user, page_cache_key, page),
+                PostCache.aget_many(page['post_ids'])
+            )
+
+        etag, last_modified = stamp
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            body = await ResponseCache.aget_body(etag)
+            if body is None:
+                payloads = await TimelineSerializer.ahydrate(page['post_ids'], payloads)
+                serializer = TimelineSerializer(user, context={'post_ids': page['post_ids'],
+                                                               'payloads': payloads})
+                body = JSONRenderer().render({
+                    **serializer.data,
+                    'next': page['next'],
+                    'previous': page['previous'],
+                })
+                if ReplicaRouter.may_cache(last_modified):
+                    await sync_to_async(ResponseCache.set_body)(etag, body)
+            response = ConditionalGet.render(body)
+        return ConditionalGet.finalize(response, etag, last_modified)
+
+
+class AsyncPostInteractionView(AsyncAPIView):
+    """
+    Async variant of the PostInteractionViewSet create action. Interactions are validated and
+    inserted by PostInteraction.objects.ingest() in a thread, as the async ORM can't run the
+    transaction ingest() writes the interactions and counters in, or in write-behind mode
+    buffered with an asyncio redis client.
+    """
+    async def post(self, request):
+        request, error = await self.initialize(request)
+        if error:
+            return error
+
+        if settings.ACTIVITY_WRITE_BEHIND:
+            candidates, errors = PostInteraction.objects.validate_items([request.data])
+        else:
+            created, errors = await sync_to_async(PostInteraction.objects.ingest)(
+                request.user.id, [request.data]
+            )
 
-        if redis_conn.get_redis_val(key=user.id) and not update_cache.lower() == 'true':
-            return Response(redis_conn.get_redis_val(key=user.id))
+        if errors:
+            return self.render({
+                'status': 'failed',
+                'message': "invalid post interaction request",
+                'errors': errors[0]
+            }, status.HTTP_400_BAD_REQUEST)
 
-        serializer = TimelineSerializer(user)
+        if settings.ACTIVITY_WRITE_BEHIND:
+            request_id, = await ActivityBuffer.apush(request.user.id, candidates)
+            return self.render({'status': 'accepted', 'request_id': request_id},
+                               status.HTTP_202_ACCEPTED)
 
-        redis_conn.set_redis_val(key=user.id, value=serializer.data, ttl=TIMELINE_TTL)
-        return Response(serializer.data)
+        return self.render(PostInteractionSerializer(created[0]).data)
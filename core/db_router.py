@@ -0,0 +1,237 @@
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS, DatabaseError, OperationalError
+from rest_framework.permissions import SAFE_METHODS
+
+from core.instrumentation import current_metrics
+from core.redis_helper import RedisInterface
+
+routing_state = contextvars.ContextVar('routing_state', default=None)
+
+# seconds behind the primary of a postgres replica, 0 when it has replayed everything received
+POSTGRES_LAG_SQL = "SELECT COALESCE(CASE WHEN pg_last_wal_receive_lsn() = " \
+                   "pg_last_wal_replay_lsn() THEN 0 ELSE " \
+                   "EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END, 0)"
+
+
+class RoutingState:
+    """
+    Routing of the request being handled: whether its reads may go to a replica (set by
+    ReplicaReadsMixin), the replica picked for it, and whether it wrote to the primary
+    """
+    def __init__(self):
+        self.replica_reads = False
+        self.replica = None
+        self.wrote = False
+
+
+class ReplicaHealth:
+    """
+    Per process health of the replicas, checked at most every REPLICA_HEALTH_CHECK_INTERVAL
+    seconds: a replica is healthy while it accepts connections and lags behind the primary by
+    at most REPLICA_MAX_LAG seconds
+    """
+    checks = {}                   # alias: (healthy, checked at)
+
+    @staticmethod
+    def get_lag(connection):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(POSTGRES_LAG_SQL)
+                return float(cursor.fetchone()[0])
+            cursor.execute('SELECT 1')
+            return 0.0
+
+    @classmethod
+    def check(cls, alias):
+        # not counted in the request's queries / query budget
+        token = current_metrics.set(None)
+        try:
+            return cls.get_lag(connections[alias]) <= settings.REPLICA_MAX_LAG
+        except DatabaseError:
+            return False
+        finally:
+            current_metrics.reset(token)
+
+    @classmethod
+    def is_healthy(cls, alias):
+        healthy, checked_at = cls.checks.get(alias, (None, 0.0))
+        if time.monotonic() - checked_at >= settings.REPLICA_HEALTH_CHECK_INTERVAL:
+            healthy = cls.check(alias)
+            cls.checks[alias] = (healthy, time.monotonic())
+        return healthy
+
+    @classmethod
+    def mark_down(cls, alias):
+        cls.checks[alias] = (False, time.monotonic())
+
+    @classmethod
+    def reset(cls):
+        cls.checks.clear()
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads of views opted in with ReplicaReadsMixin to a healthy
+    replica (settings.DATABASE_REPLICAS, one picked per request), and everything else to the
+    primary.
+
+    Reads stick to the primary for the rest of a request once it wrote (or locked rows with
+    select_for_update()), and for REPLICA_STICKY_SECONDS after any request of the same user that
+    wrote (see ReplicaRoutingMiddleware), so users read their own writes.
+    """
+    @staticmethod
+    def get_pin_key(user_id):
+        return f"db:primary:{user_id}"
+
+    @classmethod
+    def pin(cls, user_id):
+        RedisInterface.set_redis_val(cls.get_pin_key(user_id), 1, settings.REPLICA_STICKY_SECONDS)
+
+    @classmethod
+    def is_pinned(cls, user_id):
+        return RedisInterface.get_redis_val(cls.get_pin_key(user_id)) is not None
+
+    @staticmethod
+    def pick_replica():
+        replicas = [alias for alias in settings.DATABASE_REPLICAS
+                    if ReplicaHealth.is_healthy(alias)]
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    @staticmethod
+    @contextmanager
+    def primary_reads():
+        """
+        sends the reads of the block to the primary, e.g. for results cached for long
+        """
+        state = routing_state.get()
+        replica_reads = state is not None and state.replica_reads
+        if state is not None:
+            state.replica_reads = False
+        try:
+            yield
+        finally:
+            if state is not None:
+                state.replica_reads = replica_reads
+
+    @classmethod
+    def reads_from_replica(cls):
+        state = routing_state.get()
+        return state is not None and state.replica not in (None, DEFAULT_DB_ALIAS)
+
+    @classmethod
+    def may_cache(cls, changed_at):
+        """
+        whether data last changed at changed_at (timestamp, s) may be cached by the current
+        request: not if it was read from a replica that may not have replayed the change yet
+        """
+        # + 1 as changed_at may be truncated to whole seconds
+        return not cls.reads_from_replica() or \
+            time.time() - changed_at > settings.REPLICA_MAX_LAG + 1
+
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if state is None or not state.replica_reads or state.wrote:
+            return DEFAULT_DB_ALIAS
+
+        if state.replica is None:
+            state.replica = self.pick_replica()
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the primary's data
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadsMixin:
+    """
+    APIView mixin letting the ORM reads of the view's safe (GET / HEAD / OPTIONS) requests go to
+    a replica, for the actions in replica_actions (viewsets) or all of them when it's None.
+    Authentication reads the session and user from the primary beforehand. Requests failing
+    on a replica's connection are retried on the primary, the replica being marked down.
+    """
+    replica_actions = None
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except OperationalError:
+            state = routing_state.get()
+            if not ReplicaRouter.reads_from_replica():
+                raise
+
+            ReplicaHealth.mark_down(state.replica)
+            state.replica = DEFAULT_DB_ALIAS
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = routing_state.get()
+        if state is None or not settings.DATABASE_REPLICAS or request.method not in SAFE_METHODS:
+            return
+        if self.replica_actions is not None and \
+                getattr(self, 'action', None) not in self.replica_actions:
+            return
+
+        user = request.user
+        state.replica_reads = not (user.is_authenticated and ReplicaRouter.is_pinned(user.pk))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Holds the RoutingState of each request, and pins users whose requests wrote to the primary
+    for REPLICA_STICKY_SECONDS (ReplicaRouter)
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def pin_writer(request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            ReplicaRouter.pin(user.pk)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        state = RoutingState()
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        if state.wrote and settings.DATABASE_REPLICAS:
+            self.pin_writer(request)
+        return response
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        if state.wrote and settings.DATABASE_REPLICAS:
+            await sync_to_async(self.pin_writer)(request)
+        return response
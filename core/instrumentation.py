@@ -0,0 +1,238 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 1000            # latest request durations kept per view for percentiles
+
+current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    """
+    DB, cache and serialization figures of the request being handled.
+
+    The metrics of a request are held in a context variable, so they follow the request into
+    the threads of sync_to_async() calls of async views.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.new_connections = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.local_hits = 0
+        self.serialize_time = 0.0
+        self.serialize_depth = 0
+
+    @staticmethod
+    def execute_wrapper(execute, sql, params, many, context):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            metrics.queries += 1
+            metrics.db_time += time.perf_counter() - start
+
+    @classmethod
+    def install(cls, connection):
+        if cls.execute_wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(cls.execute_wrapper)
+
+    @staticmethod
+    def record_cache(hits=0, misses=0, local_hits=0):
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.cache_hits += hits
+            metrics.cache_misses += misses
+            metrics.local_hits += local_hits
+
+    def get_server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'connect;desc="{self.new_connections} new DB connections"',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses, '
+            f'{self.local_hits} local hits"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'total;dur={self.duration * 1000:.1f}',
+        ])
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    RequestMetrics.install(connection)
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.new_connections += 1
+
+
+class InstrumentedSerializerMixin:
+    """
+    DRF serializer mixin adding the time spent in to_representation() (outermost calls only,
+    including the queries they run) to the request's serialization time
+    """
+    def to_representation(self, instance):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return super().to_representation(instance)
+
+        metrics.serialize_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serialize_depth -= 1
+            if not metrics.serialize_depth:
+                metrics.serialize_time += time.perf_counter() - start
+
+
+class MetricsRegistry:
+    """
+    Per-view aggregates of the request metrics of this process, served by the metrics endpoint
+    """
+    views = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def record(cls, view_name, metrics, status_code, over_budget):
+        with cls.lock:
+            view = cls.views.get(view_name)
+            if view is None:
+                view = cls.views[view_name] = {
+                    'requests': 0, 'errors': 0, 'over_budget': 0, 'queries': 0, 'max_queries': 0,
+                    'new_connections': 0, 'db_ms': 0.0, 'serialize_ms': 0.0, 'cache_hits': 0,
+                    'cache_misses': 0, 'local_hits': 0, 'durations': deque(maxlen=LATENCY_SAMPLES),
+                }
+            view['requests'] += 1
+            view['errors'] += status_code >= 500
+            view['over_budget'] += over_budget
+            view['queries'] += metrics.queries
+            view['max_queries'] = max(view['max_queries'], metrics.queries)
+            view['new_connections'] += metrics.new_connections
+            view['db_ms'] += metrics.db_time * 1000
+            view['serialize_ms'] += metrics.serialize_time * 1000
+            view['cache_hits'] += metrics.cache_hits
+            view['cache_misses'] += metrics.cache_misses
+            view['local_hits'] += metrics.local_hits
+            view['durations'].append(metrics.duration * 1000)
+
+    @staticmethod
+    def get_percentile(durations, percentile):
+        return durations[min(len(durations) - 1, int(len(durations) * percentile))]
+
+    @classmethod
+    def get_snapshot(cls):
+        """
+        returns {view name: averages (incl. DB connections opened per request), percentiles of the
+        latest LATENCY_SAMPLES durations (ms), maximum query count, counters and query budget}
+        """
+        budgets = settings.QUERY_BUDGETS
+        snapshot = {}
+        with cls.lock:
+            for view_name, view in cls.views.items():
+                durations, requests = sorted(view['durations']), view['requests']
+                snapshot[view_name] = {
+                    'requests': requests,
+                    'errors': view['errors'],
+                    'query_budget': budgets.get(view_name),
+                    'over_budget': view['over_budget'],
+                    'avg_queries': round(view['queries'] / requests, 2),
+                    'max_queries': view['max_queries'],
+                    'avg_new_connections': round(view['new_connections'] / requests, 2),
+                    'avg_db_ms': round(view['db_ms'] / requests, 2),
+                    'avg_serialize_ms': round(view['serialize_ms'] / requests, 2),
+                    'cache_hits': view['cache_hits'],
+                    'cache_misses': view['cache_misses'],
+                    'local_hits': view['local_hits'],
+                    'p50_ms': round(cls.get_percentile(durations, 0.5), 2),
+                    'p95_ms': round(cls.get_percentile(durations, 0.95), 2),
+                    'p99_ms': round(cls.get_percentile(durations, 0.99), 2),
+                }
+        return snapshot
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.views.clear()
+
+
+class InstrumentationMiddleware:
+    """
+    Measures each request (DB queries and time, DB connections opened, RedisInterface cache
+    lookups, serialization time, total time), reports it in a Server-Timing response header and
+    aggregates it per view in MetricsRegistry.
+
+    Views exceeding their settings.QUERY_BUDGETS query count (keyed by url name) are logged, or
+    fail with QueryBudgetExceeded when settings.QUERY_BUDGETS_STRICT is set (as in tests).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        for connection in connections.all(initialized_only=True):
+            # connections opened before this module was loaded
+            RequestMetrics.install(connection)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finalize(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finalize(request, response, metrics)
+
+    @staticmethod
+    def finalize(request, response, metrics):
+        metrics.duration = time.perf_counter() - metrics.started
+        response.headers['Server-Timing'] = metrics.get_server_timing()
+
+        match = request.resolver_match
+        if match is None:
+            return response
+
+        budget = settings.QUERY_BUDGETS.get(match.view_name)
+        over_budget = budget is not None and metrics.queries > budget
+        MetricsRegistry.record(match.view_name, metrics, response.status_code, over_budget)
+        if over_budget:
+            message = f"{match.view_name} ran {metrics.queries} queries, its budget is {budget}"
+            if settings.QUERY_BUDGETS_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
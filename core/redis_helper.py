@@ -1,15 +1,715 @@
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+import weakref
+
+import redis.asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from core.instrumentation import RequestMetrics
+from core.local_cache import LocalCache, MISSING
+
+LOCK_TIMEOUT = 10                 # seconds a rebuild lock is held at most
+LOCK_WAIT_TIMEOUT = 2             # seconds a cache miss waits for another worker's rebuild
+LOCK_POLL_INTERVAL = 0.05
+
+LOCAL_CACHE_CHANNEL = 'local-cache-invalidation'
 
 
 class RedisInterface:
-    @staticmethod
-    def set_redis_val(key, value, ttl=None):
+    """
+    Cache access helpers on top of the django cache (redis).
+
+    With settings.REDIS_LOCAL_CACHE_ENABLED, plain key/value reads are also served from a short
+    lived in-process LRU (L1). Every write and delete through this interface drops the key from
+    L1 in all workers, over redis pub/sub.
+    """
+    local_cache = None
+    local_cache_pid = None
+    process_id = uuid.uuid4().hex
+    stats = {'hits': 0, 'misses': 0}
+    stats_lock = threading.Lock()
+
+    @classmethod
+    def get_local_cache(cls):
+        if not settings.REDIS_LOCAL_CACHE_ENABLED:
+            return None
+
+        if cls.local_cache_pid != os.getpid():
+            # (re)created lazily in each worker process, as listener threads don't survive forks
+            cls.local_cache = LocalCache(max_bytes=settings.REDIS_LOCAL_CACHE_MAX_BYTES,
+                                         ttl=settings.REDIS_LOCAL_CACHE_TTL)
+            cls.local_cache_pid = os.getpid()
+            cls.start_invalidation_listener(cls.local_cache)
+
+        return cls.local_cache
+
+    @classmethod
+    def start_invalidation_listener(cls, local_cache):
+        client = cls.get_redis_client()
+        if client is None:
+            return
+
+        def listen():
+            while True:
+                try:
+                    pubsub = client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(cache.make_key(LOCAL_CACHE_CHANNEL))
+                    for message in pubsub.listen():
+                        data = json.loads(message['data'])
+                        if data['sender'] != cls.process_id:
+                            local_cache.delete(*data['keys'])
+                except Exception:
+                    # connection dropped, entries may have been missed while disconnected
+                    local_cache.clear()
+                    time.sleep(1)
+
+        threading.Thread(target=listen, name='local-cache-invalidation', daemon=True).start()
+
+    @classmethod
+    def invalidate_local(cls, keys):
+        local_cache = cls.get_local_cache()
+        if local_cache is None or not keys:
+            return
+
+        local_cache.delete(*keys)
+        client = cls.get_redis_client()
+        if client is not None:
+            client.publish(cache.make_key(LOCAL_CACHE_CHANNEL),
+                           json.dumps({'sender': cls.process_id, 'keys': list(keys)}))
+
+    @classmethod
+    def record_lookups(cls, hits, misses, local_hits=0):
+        """
+        counts lookups answered by redis (hits / misses) and by L1 (local_hits), in the process
+        wide stats and in the metrics of the current request
+        """
+        if hits or misses:
+            with cls.stats_lock:
+                cls.stats['hits'] += hits
+                cls.stats['misses'] += misses
+        RequestMetrics.record_cache(hits, misses, local_hits)
+
+    @classmethod
+    def get_stats(cls):
+        """
+        hit / miss counters of redis (L2) and of the in-process cache (L1) if enabled
+        """
+        with cls.stats_lock:
+            stats = {'redis': dict(cls.stats)}
+
+        local_cache = cls.get_local_cache()
+        if local_cache is not None:
+            stats['local'] = local_cache.get_stats()
+        return stats
+
+    @classmethod
+    def set_redis_val(cls, key, value, ttl=None):
         cache.set(key, value, ttl)
+        cls.invalidate_local([key])
+
+    @classmethod
+    def get_redis_val(cls, key):
+        local_cache = cls.get_local_cache()
+        if local_cache is not None:
+            value = local_cache.get(key)
+            if value is not MISSING:
+                cls.record_lookups(0, 0, local_hits=1)
+                return value
+
+        value = cache.get(key)
+        cls.record_lookups(int(value is not None), int(value is None))
+        if value is not None and local_cache is not None:
+            local_cache.set(key, value)
+        return value
+
+    @classmethod
+    def delete_redis_key(cls, key):
+        deleted = cache.delete(key)
+        cls.invalidate_local([key])
+        return deleted
+
+    @staticmethod
+    def add_redis_val(key, value, ttl=None):
+        """
+        sets key only if it doesn't exist yet, returns whether it was set
+        """
+        return cache.add(key, value, ttl)
+
+    @classmethod
+    def set_redis_vals(cls, mapping, ttl=None, raw=False):
+        """
+        sets key: value pairs. raw bytes values are stored as is in redis, skipping the pickle
+        serializer of the cache backend, and are to be read with get_redis_vals(raw=True).
+        """
+        client = cls.get_redis_client() if raw else None
+        if client is None:
+            cache.set_many(mapping, ttl)
+        else:
+            pipe = client.pipeline(transaction=False)
+            for key, value in mapping.items():
+                pipe.set(cache.make_key(key), value, ex=ttl)
+            pipe.execute()
+        cls.invalidate_local(list(mapping))
+
+    @classmethod
+    def get_raw_vals(cls, keys):
+        """
+        returns {key: value} of the keys found, values being read as stored in redis
+        """
+        client = cls.get_redis_client()
+        if client is None:
+            return cache.get_many(keys)
+
+        values = client.mget([cache.make_key(key) for key in keys])
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    @classmethod
+    def get_redis_vals(cls, keys, raw=False):
+        values, remaining = {}, keys
+        local_cache = cls.get_local_cache()
+        if local_cache is not None:
+            remaining = []
+            for key in keys:
+                value = local_cache.get(key)
+                if value is MISSING:
+                    remaining.append(key)
+                else:
+                    values[key] = value
+            cls.record_lookups(0, 0, local_hits=len(values))
+
+        if remaining:
+            found = cls.get_raw_vals(remaining) if raw else cache.get_many(remaining)
+            cls.record_lookups(len(found), len(remaining) - len(found))
+            if local_cache is not None:
+                for key, value in found.items():
+                    local_cache.set(key, value)
+            values.update(found)
+        return values
+
+    @classmethod
+    def delete_redis_keys(cls, keys):
+        deleted = cache.delete_many(keys)
+        cls.invalidate_local(keys)
+        return deleted
 
     @staticmethod
-    def get_redis_val(key):
-        return cache.get(key)
+    def get_lock_key(key):
+        return f"{key}:lock"
+
+    @classmethod
+    def acquire_lock(cls, key, timeout=LOCK_TIMEOUT):
+        """
+        returns a token if the lock on key was acquired, None if another worker holds it
+        """
+        token = uuid.uuid4().hex
+        return token if cache.add(cls.get_lock_key(key), token, timeout) else None
+
+    @classmethod
+    def release_lock(cls, key, token):
+        lock_key = cls.get_lock_key(key)
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+    @classmethod
+    def compute_and_set(cls, key, compute, ttl, stale_ttl):
+        start = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - start
+        cls.set_redis_val(key, (value, delta, time.time() + ttl), ttl + stale_ttl)
+        return value
+
+    @classmethod
+    def get_or_compute(cls, key, compute, ttl, stale_ttl=None, beta=1.0, refresh=False):
+        """
+        returns the value cached at key, computing and caching it with compute() when missing.
+
+        - single flight: only the worker holding the key's lock runs compute(), concurrent misses
+          wait for its result (up to LOCK_WAIT_TIMEOUT, then compute themselves)
+        - stale while revalidate: values are kept stale_ttl (defaults to ttl) seconds past their
+          ttl, and served while one worker recomputes them
+        - probabilistic early expiration: the closer a value is to its expiry (scaled by how long
+          it took to compute and beta), the likelier a read is to recompute it ahead of time
+        """
+        stale_ttl = ttl if stale_ttl is None else stale_ttl
+        entry = None if refresh else cls.get_redis_val(key)
+
+        if entry is not None:
+            value, delta, expiry = entry
+            if time.time() - delta * beta * math.log(1 - random.random()) < expiry:
+                return value
+
+            token = cls.acquire_lock(key)
+            if token is None:
+                return value
+
+            try:
+                return cls.compute_and_set(key, compute, ttl, stale_ttl)
+            finally:
+                cls.release_lock(key, token)
+
+        token = cls.acquire_lock(key)
+        if token is None and not refresh:
+            deadline = time.monotonic() + LOCK_WAIT_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                entry = cache.get(key)
+                if entry is not None:
+                    return entry[0]
+
+        try:
+            return cls.compute_and_set(key, compute, ttl, stale_ttl)
+        finally:
+            if token is not None:
+                cls.release_lock(key, token)
+
+    @staticmethod
+    def get_pool_usage(pool):
+        """
+        returns (open connections, idle connections, maximum connections) of a redis connection
+        pool, read from its internals as redis-py doesn't expose them
+        """
+        if hasattr(pool, '_connections'):
+            # BlockingConnectionPool: the queue holds idle connections and None placeholders
+            queue = pool.pool.queue if hasattr(pool.pool, 'queue') else pool.pool._queue
+            idle = sum(connection is not None for connection in list(queue))
+            return len(pool._connections), idle, pool.max_connections
+        return pool._created_connections, len(pool._available_connections), pool.max_connections
+
+    @staticmethod
+    def sum_pool_stats(usages):
+        open_count, idle, max_connections = (sum(values) for values in zip(*usages))
+        return {
+            'open': open_count,
+            'in_use': open_count - idle,
+            'idle': idle,
+            'max_connections': max_connections,
+            'utilization': round((open_count - idle) / max_connections, 3),
+        }
+
+    @classmethod
+    def get_pool_stats(cls):
+        """
+        connection usage of this process' redis connection pool, None without redis
+        """
+        client = cls.get_redis_client()
+        if client is None:
+            return None
+
+        return cls.sum_pool_stats([cls.get_pool_usage(client.connection_pool)])
+
+    @staticmethod
+    def set_fallback_val(key, value, ttl=None):
+        """
+        writes value at key when the cache backend isn't redis. As redis commands updating a key,
+        the key keeps its expiry unless a ttl is given.
+        """
+        if ttl is None:
+            # only the locmem cache exposes the expiry of its keys
+            expires_at = getattr(cache, '_expire_info', {}).get(cache.make_key(key))
+            ttl = None if expires_at is None else max(expires_at - time.time(), 0)
+        cache.set(key, value, ttl)
 
     @staticmethod
-    def delete_redis_key(key):
-        return cache.delete(key)
+    def get_redis_client():
+        """
+        raw redis client behind the django-redis cache backend, or None if the configured cache
+        backend isn't redis (e.g. locmem cache when running locally / in tests)
+        """
+        try:
+            return get_redis_connection('default')
+        except NotImplementedError:
+            return None
+
+    @classmethod
+    def add_to_sorted_set(cls, key, mapping, max_length=None, ttl=None):
+        """
+        adds {member: score} pairs to the sorted set at key, keeping only the max_length members
+        with the highest score
+        """
+        cls.add_to_sorted_sets([key], mapping, max_length=max_length, ttl=ttl)
+
+    @classmethod
+    def add_to_sorted_sets(cls, keys, mapping, max_length=None, ttl=None):
+        """
+        same as add_to_sorted_set, for many keys at once (single round trip on redis)
+        """
+        client = cls.get_redis_client()
+        if client is None:
+            for key in keys:
+                members = cache.get(key) or {}
+                members.update({str(member): score for member, score in mapping.items()})
+                if max_length is not None and len(members) > max_length:
+                    members = dict(sorted(members.items(), key=lambda item: item[1],
+                                          reverse=True)[:max_length])
+                cls.set_fallback_val(key, members, ttl)
+            return
+
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            raw_key = cache.make_key(key)
+            pipe.zadd(raw_key, mapping)
+            if max_length is not None:
+                pipe.zremrangebyrank(raw_key, 0, -(max_length + 1))
+            if ttl is not None:
+                pipe.expire(raw_key, ttl)
+        pipe.execute()
+
+    @classmethod
+    def get_sorted_set_vals(cls, key, max_score='+inf', min_score='-inf', offset=0, count=None,
+                            reverse=True):
+        """
+        returns (member, score) pairs of the sorted set at key with min_score <= score <=
+        max_score, highest score first (lowest first if reverse is False)
+        """
+        client = cls.get_redis_client()
+        if client is None:
+            members = cache.get(key) or {}
+            max_score, min_score = float(max_score), float(min_score)
+            entries = sorted(
+                ((member, score) for member, score in members.items()
+                 if min_score <= score <= max_score),
+                key=lambda item: item[1], reverse=reverse
+            )
+            return entries[offset:offset + count] if count is not None else entries[offset:]
+
+        raw_key = cache.make_key(key)
+        # redis needs both start and num, num -1 meaning up to the last member
+        num = count if count is not None else -1
+        if reverse:
+            entries = client.zrevrangebyscore(raw_key, max_score, min_score, start=offset,
+                                              num=num, withscores=True)
+        else:
+            entries = client.zrangebyscore(raw_key, min_score, max_score, start=offset, num=num,
+                                           withscores=True)
+        return [(member.decode(), score) for member, score in entries]
+
+    @classmethod
+    def remove_from_sorted_set(cls, key, *members):
+        client = cls.get_redis_client()
+        if client is None:
+            entries = cache.get(key)
+            if entries is not None:
+                for member in members:
+                    entries.pop(str(member), None)
+                cls.set_fallback_val(key, entries)
+            return
+
+        if members:
+            client.zrem(cache.make_key(key), *members)
+
+    @classmethod
+    def remove_from_sorted_sets(cls, keys, *members):
+        """
+        same as remove_from_sorted_set, for many keys at once (single round trip on redis)
+        """
+        client = cls.get_redis_client()
+        if client is None:
+            for key in keys:
+                cls.remove_from_sorted_set(key, *members)
+            return
+
+        if members:
+            pipe = client.pipeline(transaction=False)
+            for key in keys:
+                pipe.zrem(cache.make_key(key), *members)
+            pipe.execute()
+
+    @classmethod
+    def increment_sorted_sets(cls, increments, ttl=None):
+        """
+        adds {key: {member: delta}} increments to the scores of sorted set members (members are
+        added with score delta if missing), single round trip on redis
+        """
+        client = cls.get_redis_client()
+        if client is None:
+            for key, mapping in increments.items():
+                members = cache.get(key) or {}
+                for member, delta in mapping.items():
+                    members[str(member)] = members.get(str(member), 0) + delta
+                cls.set_fallback_val(key, members, ttl)
+            return
+
+        pipe = client.pipeline(transaction=False)
+        for key, mapping in increments.items():
+            raw_key = cache.make_key(key)
+            for member, delta in mapping.items():
+                pipe.zincrby(raw_key, delta, member)
+            if ttl is not None:
+                pipe.expire(raw_key, ttl)
+        pipe.execute()
+
+    @classmethod
+    def union_sorted_sets(cls, destination, weights, max_length=None, ttl=None):
+        """
+        stores at destination the union of the sorted sets of {key: weight}, member scores being
+        the weighted sums of their scores, keeping only the max_length highest scored members
+        """
+        client = cls.get_redis_client()
+        if client is None:
+            members = {}
+            for key, weight in weights.items():
+                for member, score in (cache.get(key) or {}).items():
+                    members[member] = members.get(member, 0) + score * weight
+            if max_length is not None and len(members) > max_length:
+                members = dict(sorted(members.items(), key=lambda item: item[1],
+                                      reverse=True)[:max_length])
+            cache.set(destination, members, ttl)
+            return
+
+        raw_key = cache.make_key(destination)
+        pipe = client.pipeline(transaction=False)
+        pipe.zunionstore(raw_key, {cache.make_key(key): weight for key, weight in weights.items()})
+        if max_length is not None:
+            pipe.zremrangebyrank(raw_key, 0, -(max_length + 1))
+        if ttl is not None:
+            pipe.expire(raw_key, ttl)
+        pipe.execute()
+
+    @classmethod
+    def add_to_set(cls, key, *members, ttl=None):
+        client = cls.get_redis_client()
+        if client is None:
+            members = (cache.get(key) or set()) | {str(member) for member in members}
+            cls.set_fallback_val(key, members, ttl or None)
+            return
+
+        if members:
+            pipe = client.pipeline(transaction=True)
+            pipe.sadd(cache.make_key(key), *members)
+            if ttl:
+                pipe.expire(cache.make_key(key), ttl)
+            pipe.execute()
+
+    @classmethod
+    def remove_from_set(cls, key, *members):
+        client = cls.get_redis_client()
+        if client is None:
+            entries = cache.get(key)
+            if entries is not None:
+                cls.set_fallback_val(key, entries - {str(member) for member in members})
+            return
+
+        if members:
+            client.srem(cache.make_key(key), *members)
+
+    @classmethod
+    def replace_set(cls, key, members, ttl=None, chunk_size=10000):
+        """
+        atomically replaces the members of set at key
+        """
+        members = [str(member) for member in members]
+        client = cls.get_redis_client()
+        if client is None:
+            cache.set(key, set(members), ttl)
+            return
+
+        pipe = client.pipeline(transaction=True)
+        pipe.delete(cache.make_key(key))
+        for i in range(0, len(members), chunk_size):
+            pipe.sadd(cache.make_key(key), *members[i:i + chunk_size])
+        if ttl and members:
+            pipe.expire(cache.make_key(key), ttl)
+        pipe.execute()
+
+    @classmethod
+    def get_set_members(cls, key):
+        client = cls.get_redis_client()
+        if client is None:
+            return set(cache.get(key) or set())
+
+        return {member.decode() for member in client.smembers(cache.make_key(key))}
+
+    @classmethod
+    def are_set_members(cls, key, *members):
+        """
+        returns whether each of members belongs to set at key, in one round trip
+        """
+        client = cls.get_redis_client()
+        if client is None:
+            entries = cache.get(key) or set()
+            return [str(member) in entries for member in members]
+
+        return [bool(found) for found in client.smismember(cache.make_key(key), members)]
+
+    @classmethod
+    def get_sets_intersection(cls, *keys):
+        client = cls.get_redis_client()
+        if client is None:
+            return set.intersection(*(set(cache.get(key) or set()) for key in keys))
+
+        return {member.decode() for member in client.sinter([cache.make_key(key) for key in keys])}
+
+    @classmethod
+    def scan_set(cls, key, count=1000):
+        """
+        yields the members of set at key in chunks of about count members, without blocking
+        redis on large sets. Members added or removed meanwhile may be missed or repeated.
+        """
+        client = cls.get_redis_client()
+        if client is None:
+            members = sorted(cache.get(key) or set())
+            for i in range(0, len(members), count):
+                yield members[i:i + count]
+            return
+
+        cursor = None
+        while cursor != 0:
+            cursor, members = client.sscan(cache.make_key(key), cursor or 0, count=count)
+            if members:
+                yield [member.decode() for member in members]
+
+    @classmethod
+    def push_to_list(cls, key, *values):
+        client = cls.get_redis_client()
+        if client is None:
+            cls.set_fallback_val(key, (cache.get(key) or []) + list(values))
+            return
+
+        if values:
+            client.rpush(cache.make_key(key), *values)
+
+    @classmethod
+    def move_list_vals(cls, source, destination, count):
+        """
+        atomically moves up to count values from the head of source to the tail of destination,
+        returns the moved values
+        """
+        client = cls.get_redis_client()
+        if client is None:
+            values = cache.get(source) or []
+            moved, remaining = values[:count], values[count:]
+            cls.set_fallback_val(source, remaining)
+            cls.set_fallback_val(destination, (cache.get(destination) or []) + moved)
+            return moved
+
+        pipe = client.pipeline(transaction=True)
+        for _ in range(count):
+            pipe.lmove(cache.make_key(source), cache.make_key(destination), 'LEFT', 'RIGHT')
+        return [value.decode() for value in pipe.execute() if value is not None]
+
+    @classmethod
+    def get_list_vals(cls, key, count):
+        """
+        returns the first count values of the list at key
+        """
+        client = cls.get_redis_client()
+        if client is None:
+            return (cache.get(key) or [])[:count]
+
+        return [value.decode() for value in client.lrange(cache.make_key(key), 0, count - 1)]
+
+    @classmethod
+    def trim_list(cls, key, count):
+        """
+        removes the first count values of the list at key
+        """
+        client = cls.get_redis_client()
+        if client is None:
+            cls.set_fallback_val(key, (cache.get(key) or [])[count:])
+            return
+
+        client.ltrim(cache.make_key(key), count, -1)
+
+    @classmethod
+    def get_list_length(cls, key):
+        client = cls.get_redis_client()
+        if client is None:
+            return len(cache.get(key) or [])
+
+        return client.llen(cache.make_key(key))
+
+
+class AsyncRedisInterface:
+    """
+    asyncio counterparts of the RedisInterface helpers used by the async views.
+
+    Commands go through a redis.asyncio client (one per event loop) using the key format and
+    serializer of the django-redis cache backend, so values are shared with RedisInterface. Plain
+    key/value reads go through the same L1 cache. Without a redis cache backend, the sync helpers
+    run in a thread instead.
+    """
+    clients = weakref.WeakKeyDictionary()       # event loop -> client
+
+    @classmethod
+    def get_redis_client(cls):
+        if RedisInterface.get_redis_client() is None:
+            return None
+
+        loop = asyncio.get_running_loop()
+        client = cls.clients.get(loop)
+        if client is None:
+            pool = redis.asyncio.BlockingConnectionPool.from_url(
+                settings.CACHES['default']['LOCATION'],
+                **settings.CACHES['default']['OPTIONS'].get('CONNECTION_POOL_KWARGS', {})
+            )
+            client = cls.clients[loop] = redis.asyncio.Redis(connection_pool=pool)
+        return client
+
+    @classmethod
+    def get_pool_stats(cls):
+        """
+        connection usage of the pools of the clients of all event loops, None without redis
+        """
+        pools = [client.connection_pool for client in list(cls.clients.values())]
+        if not pools:
+            return None
+
+        return RedisInterface.sum_pool_stats([RedisInterface.get_pool_usage(pool)
+                                              for pool in pools])
+
+    @classmethod
+    async def get_redis_val(cls, key):
+        client = cls.get_redis_client()
+        if client is None:
+            return await sync_to_async(RedisInterface.get_redis_val)(key)
+
+        return (await cls.get_redis_vals([key])).get(key)
+
+    @classmethod
+    async def get_redis_vals(cls, keys, raw=False):
+        client = cls.get_redis_client()
+        if client is None:
+            return await sync_to_async(RedisInterface.get_redis_vals)(keys, raw)
+
+        values, remaining = {}, keys
+        local_cache = RedisInterface.get_local_cache()
+        if local_cache is not None:
+            remaining = []
+            for key in keys:
+                value = local_cache.get(key)
+                if value is MISSING:
+                    remaining.append(key)
+                else:
+                    values[key] = value
+            RedisInterface.record_lookups(0, 0, local_hits=len(values))
+
+        if remaining:
+            found = {
+                key: value if raw else cache.client.decode(value) for key, value in
+                zip(remaining, await client.mget([cache.make_key(key) for key in remaining]))
+                if value is not None
+            }
+            RedisInterface.record_lookups(len(found), len(remaining) - len(found))
+            if local_cache is not None:
+                for key, value in found.items():
+                    local_cache.set(key, value)
+            values.update(found)
+        return values
+
+    @classmethod
+    async def push_to_list(cls, key, *values):
+        client = cls.get_redis_client()
+        if client is None:
+            return await sync_to_async(RedisInterface.push_to_list)(key, *values)
+
+        if values:
+            await client.rpush(cache.make_key(key), *values)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+import sys
 from os.path import join
 from pathlib import Path
 from dotenv import load_dotenv
@@ -19,6 +20,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 load_dotenv(join(BASE_DIR, '.env'))
 
+TESTING = sys.argv[1:2] == ['test']
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -47,11 +50,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -83,34 +88,134 @@ REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', '')
 
 REDIS_URL = "redis://{}:{}".format(REDIS_HOST, REDIS_PORT)
 
-CACHES = {
-    "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
-        "LOCATION": REDIS_URL,
-        "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
-        "KEY_PREFIX": "local_cache",
-    }
+# redis connection pool of each worker process (also used by the async views' client, see
+# core.redis_helper.AsyncRedisInterface): requests wait up to `timeout` seconds for one of the
+# `max_connections` connections instead of opening more. Timeouts are in seconds.
+REDIS_CONNECTION_POOL_KWARGS = {
+    'max_connections': int(os.getenv('REDIS_MAX_CONNECTIONS', 50)),
+    'timeout': float(os.getenv('REDIS_POOL_TIMEOUT', 2)),
+    'socket_timeout': float(os.getenv('REDIS_SOCKET_TIMEOUT', 1)),
+    'socket_connect_timeout': float(os.getenv('REDIS_SOCKET_CONNECT_TIMEOUT', 1)),
+    'socket_keepalive': True,
+    'retry_on_timeout': True,
+    # idle connections are pinged before reuse after this many seconds
+    'health_check_interval': int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30)),
 }
+
+# redis, or locmem to run (and test / benchmark) without a redis server, the sorted sets and sets
+# of the timeline, trending and follow graph stores being emulated with plain cache values
+# (see core.redis_helper.RedisInterface)
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem' if TESTING else 'redis')
+
+if CACHE_BACKEND == 'locmem':
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "KEY_PREFIX": "local_cache",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                "CONNECTION_POOL_CLASS": "redis.BlockingConnectionPool",
+                "CONNECTION_POOL_KWARGS": REDIS_CONNECTION_POOL_KWARGS,
+            },
+            "KEY_PREFIX": "local_cache",
+        }
+    }
 CACHE_TTL = 60 * 1
 
+# optional in-process L1 cache in front of redis (see core.redis_helper.RedisInterface)
+REDIS_LOCAL_CACHE_ENABLED = os.getenv('REDIS_LOCAL_CACHE_ENABLED', 'false').lower() == 'true'
+REDIS_LOCAL_CACHE_MAX_BYTES = int(os.getenv('REDIS_LOCAL_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+REDIS_LOCAL_CACHE_TTL = int(os.getenv('REDIS_LOCAL_CACHE_TTL', 5))          # seconds
+
+# buffer /api/activity/ writes in redis, drained by `manage.py flush_activity_buffer` workers
+ACTIVITY_WRITE_BEHIND = os.getenv('ACTIVITY_WRITE_BEHIND', 'false').lower() == 'true'
+
+# most DB queries a request to each view (url name) may run, including the 2 queries of session
+# authentication, see core.instrumentation.InstrumentationMiddleware
+QUERY_BUDGETS = {
+    'user-list': 5,
+    'user-detail': 4,
+    'post-list': 8,
+    'post-detail': 4,
+    'post-thread': 5,
+    'post-search': 3,
+    'postinteraction-list': 9,
+    'postinteraction-batch': 6,
+    'retrieve_user_timeline': 8,
+    'retrieve_user_timeline_async': 8,
+    'create_post_interaction_async': 9,
+    'retrieve_trending_posts': 3,
+    'follow_user': 7,
+    'unfollow_user': 7,
+    'bulk_follow_users': 8,
+    'metrics': 2,
+}
+# fail requests over budget instead of logging a warning (always on when running tests)
+QUERY_BUDGETS_STRICT = TESTING or os.getenv('QUERY_BUDGETS_STRICT', 'false').lower() == 'true'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# postgresql, or sqlite3 to run (and test / benchmark) without a database server, DB_NAME being
+# the path of the sqlite file
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite3' if TESTING else 'postgresql')
+
 DATABASES = {
-    # 'default': {
-    #     'ENGINE': 'django.db.backends.sqlite3',
-    #     'NAME': BASE_DIR / 'db.sqlite3',
-    # }
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'microblog',
-        'USER': 'dbuser',
-        'PASSWORD': 'dbpassword',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.getenv('DB_NAME', 'microblog'),
+        'USER': os.getenv('DB_USER', 'dbuser'),
+        'PASSWORD': os.getenv('DB_PASSWORD', 'dbpassword'),
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+        # connections are kept open across requests for this many seconds (0: closed after each
+        # request), and checked before being reused by a new request
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true',
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),        # seconds
+        },
     }
 }
+if DB_ENGINE == 'sqlite3':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': DATABASES['default']['CONN_HEALTH_CHECKS'],
+    }
+
+# read replicas of the default database, as comma separated hosts sharing its name and
+# credentials, e.g. DATABASE_REPLICA_HOSTS=replica-1,replica-2 (see core.db_router.ReplicaRouter)
+DATABASE_REPLICA_HOSTS = [host.strip() for host in
+                          os.getenv('DATABASE_REPLICA_HOSTS', '').split(',') if host.strip()]
+for index, host in enumerate(DATABASE_REPLICA_HOSTS):
+    DATABASES[f'replica_{index}'] = {**DATABASES['default'], 'HOST': host,
+                                     'TEST': {'MIRROR': 'default'}}
+
+# aliases of the databases reads are routed to, tests opt in with override_settings()
+DATABASE_REPLICAS = [] if TESTING else [f'replica_{index}'
+                                        for index in range(len(DATABASE_REPLICA_HOSTS))]
+if TESTING:
+    # a separate (empty) sqlite database standing in for a replica, so tests see where reads go
+    DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3',
+                            'NAME': BASE_DIR / 'replica.sqlite3'}
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+# seconds reads of a user stick to the primary after a request of theirs wrote to it
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+# replicas lagging more seconds behind the primary aren't read from
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 2))
+REPLICA_HEALTH_CHECK_INTERVAL = int(os.getenv('REPLICA_HEALTH_CHECK_INTERVAL', 10))   # seconds
 
 
 # Password validation
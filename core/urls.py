@@ -30,7 +30,15 @@ urlpatterns = [
     path('api/', include(router.urls)),
     # path('api/timeline/<int:pk>/', views.TimelineView.as_view()),
     path('api/timeline/', views.TimelineView.as_view(), name='retrieve_user_timeline'),
+    path('api/async/timeline/', views.AsyncTimelineView.as_view(),
+         name='retrieve_user_timeline_async'),
+    path('api/async/activity/', views.AsyncPostInteractionView.as_view(),
+         name='create_post_interaction_async'),
+    path('api/trending/', views.TrendingView.as_view(), name='retrieve_trending_posts'),
     path('api/follow/', views.FollowUserView.as_view(), name='follow_user'),
+    path('api/follow/bulk/', views.BulkFollowUserView.as_view(), name='bulk_follow_users'),
+    path('api/unfollow/', views.UnfollowUserView.as_view(), name='unfollow_user'),
+    path('api/metrics/', views.MetricsView.as_view(), name='metrics'),
     path('admin/', admin.site.urls),
     path('docs/', include_docs_urls(title='Blogging API', public=False)),
 ]